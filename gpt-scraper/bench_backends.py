@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# bench_backends.py - speed, cold start, memory and fp32 agreement of each embedding backend
+
+"""Compare the embed_backends.py backends on chunks from the crawled pages.
+
+Each backend runs in a fresh process, so cold start (import, load and a
+first encode) and peak RSS are its own; peak RSS comes from wait4() like
+bench_crawler.py. ONNX exports are made before the timed run, as they
+are once per model in real use. Every backend encodes the same chunks,
+and its vectors are compared with the fp32 PyTorch vectors by cosine
+similarity: the mean says how close it is overall, the minimum whether
+any chunk drifts far enough to change what a query retrieves.
+
+    python bench_backends.py --chunks 2000
+    python bench_backends.py --backend torch --backend onnx-int8 --threads 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from embed_backends import BACKENDS, prepare
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+BATCH_SIZE = 32
+
+
+def measure(args):
+    """Child process: load one backend, encode the chunks, save vectors and print timings as JSON"""
+    started = time.perf_counter()
+    from embed_backends import load_model
+
+    model = load_model(args.model, args.measure, args.threads or None)
+    with open(args.chunks_file, "r") as f:
+        chunks = json.load(f)
+    model.encode(chunks[:1], show_progress_bar=False)
+    cold_start = time.perf_counter() - started
+
+    start = time.perf_counter()
+    vectors = model.encode(chunks, batch_size=BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True)
+    elapsed = time.perf_counter() - start
+    np.save(args.vectors_out, vectors.astype(np.float32))
+    print(json.dumps({"cold_start": cold_start, "seconds": elapsed}))
+    return True
+
+def load_chunks(model_name, path, limit):
+    from chunker import Chunker
+    from embed_backends import load_model
+    from page_store import open_corpus
+
+    chunker = Chunker.for_model(load_model(model_name, "torch"))
+    corpus = open_corpus(path)
+    chunks = []
+    for page in corpus.iter_pages():
+        if page is not None and page.url:
+            chunks.extend(chunker.chunk(page.text))
+        if len(chunks) >= limit:
+            break
+    corpus.close()
+    return chunks[:limit]
+
+def run_backend(backend, args, chunks_file, workdir):
+    vectors_out = os.path.join(workdir, f"{backend}.npy")
+    command = [sys.executable, os.path.abspath(__file__), "--measure", backend, "--model", args.model,
+               "--chunks-file", chunks_file, "--vectors-out", vectors_out, "--threads", str(args.threads)]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    output = proc.stdout.read()
+    _, status, usage = os.wait4(proc.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        print(f"❌ {backend} failed")
+        return None, None
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["peak_rss_mb"] = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return timings, np.load(vectors_out)
+
+def cosines(reference, vectors):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (reference * vectors).sum(axis=1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends on crawled pages")
+    parser.add_argument('--model', default=MODEL_NAME, help='SentenceTransformer name or path')
+    parser.add_argument('--corpus', default=None, help='Page store or utm_pages directory (default: whichever exists)')
+    parser.add_argument('--chunks', type=int, default=1000, help='Chunks to embed')
+    parser.add_argument('--backend', action='append', choices=BACKENDS, help='Backend to run; repeatable (default: all)')
+    parser.add_argument('--threads', type=int, default=0, help='Intra-op threads per backend (0 = library default)')
+    parser.add_argument('--save', help='Write results as JSON')
+    parser.add_argument('--measure', choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument('--chunks-file', help=argparse.SUPPRESS)
+    parser.add_argument('--vectors-out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        return measure(args)
+
+    chunks = load_chunks(args.model, args.corpus, args.chunks)
+    if not chunks:
+        print("❌ No pages found")
+        return False
+    backends = args.backend or list(BACKENDS)
+    if "torch" not in backends:
+        backends.insert(0, "torch")  # The fp32 reference
+    print(f"📊 {len(chunks)} chunks, {os.cpu_count()} cores, backends: {', '.join(backends)}")
+
+    results = []
+    reference = None
+    with tempfile.TemporaryDirectory(prefix="bench_backends_") as workdir:
+        chunks_file = os.path.join(workdir, "chunks.json")
+        with open(chunks_file, "w") as f:
+            json.dump(chunks, f)
+        for backend in backends:
+            prepare(args.model, backend)  # One-time ONNX export/quantization stays out of the cold start
+            timings, vectors = run_backend(backend, args, chunks_file, workdir)
+            if timings is None:
+                continue
+            if backend == "torch":
+                reference = vectors
+            similarity = cosines(reference, vectors) if reference is not None else None
+            results.append({
+                "backend": backend,
+                "chunks_per_second": round(len(chunks) / timings["seconds"], 1),
+                "cold_start_seconds": round(timings["cold_start"], 2),
+                "peak_rss_mb": round(timings["peak_rss_mb"], 1),
+                "mean_cosine": round(float(similarity.mean()), 6) if similarity is not None else None,
+                "min_cosine": round(float(similarity.min()), 6) if similarity is not None else None,
+            })
+            print(f"✅ {backend}: {results[-1]['chunks_per_second']} chunks/sec")
+
+    columns = [("chunks/s", "chunks_per_second"), ("cold start s", "cold_start_seconds"), ("RSS MB", "peak_rss_mb"),
+               ("mean cos", "mean_cosine"), ("min cos", "min_cosine")]
+    print(f"\n{'backend':<12}" + "".join(f"{title:>14}" for title, _ in columns))
+    for result in results:
+        print(f"{result['backend']:<12}" + "".join(f"{'-' if result[key] is None else result[key]:>14}"
+                                                  for _, key in columns))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"model": args.model, "chunks": len(chunks), "results": results}, f, indent=2)
+        print(f"\n💾 Saved results to {args.save}")
+    return len(results) == len(backends)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# bench_crawler.py - crawl throughput against the synthetic site, for reproducible before/after numbers
+
+"""Run utm-crawler.py end to end against synthetic_site.py and report
+pages/sec, CPU seconds, peak RSS, body bytes read and fetch latency
+percentiles.
+
+Each run gets a fresh synthetic site (same seed, so the same pages and
+the same failures) and a fresh scratch directory, so runs do not share
+frontier.db or page files. The crawler reaches the fake hosts through
+HTTP_PROXY, so any version of utm-crawler.py can be measured unchanged:
+
+    python bench_crawler.py --save before.json
+    # ...make the change...
+    python bench_crawler.py --compare before.json
+
+    python bench_crawler.py --run "24 threads=--engine threads" \\
+                            --run "async 500=--engine async --concurrency 500"
+
+CPU and peak RSS come from wait4() on the crawler, so they include its
+parse worker processes (peak RSS is the largest single process). Bytes
+read and latency percentiles come from the crawler's crawl_metrics.json
+when the version under test writes one.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from synthetic_site import add_site_arguments, seed_urls, site_config, start_server
+
+CRAWLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "utm-crawler.py")
+DEFAULT_RUNS = ["threads=--engine threads", "async=--engine async --concurrency 200"]
+TIMEOUT = 900  # Seconds before a run is killed
+
+
+def parse_run(spec):
+    name, _, args = spec.partition("=")
+    return name.strip(), args.strip()
+
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def run_crawler(crawler, name, extra_args, args):
+    """One crawl against a fresh synthetic site; returns a result dict"""
+    server, site = start_server(site_config(args))
+    proxy = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix="bench_crawl_")
+    with open(os.path.join(workdir, "queued_urls.txt"), "w") as f:
+        f.write("\n".join(seed_urls()) + "\n")
+
+    env = dict(os.environ, HTTP_PROXY=proxy, http_proxy=proxy, NO_PROXY="", no_proxy="")
+    command = [sys.executable, crawler] + shlex.split(extra_args)
+    log_path = os.path.join(workdir, "crawl.log")
+    print(f"🏁 [{name}] {' '.join(command[1:])}")
+
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    timer = threading.Timer(args.timeout, proc.kill)
+    timer.start()
+    try:
+        # wait4 rather than proc.wait() to get the run's own CPU time and peak RSS
+        _, status, usage = os.wait4(proc.pid, 0)
+    finally:
+        timer.cancel()
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    server.shutdown()
+    server.server_close()
+
+    pages = count_lines(os.path.join(workdir, "scraped_urls.txt"))
+    metrics = {}
+    metrics_path = os.path.join(workdir, "crawl_metrics.json")
+    if os.path.exists(metrics_path):
+        with open(metrics_path, "r") as f:
+            metrics = json.load(f)
+    fetch = metrics.get("fetch_seconds") or {}
+
+    result = {
+        "name": name,
+        "args": extra_args,
+        "exit_code": proc.returncode,
+        "pages": pages,
+        "requests": site.requests,
+        "wall_seconds": round(wall, 2),
+        "pages_per_second": round(pages / wall, 2) if wall else 0.0,
+        "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 2),
+        "cpu_ms_per_page": round(1000 * (usage.ru_utime + usage.ru_stime) / pages, 2) if pages else None,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        "peak_rss_mb": round(usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "mb_read": round(metrics["bytes_total"] / 1e6, 1) if "bytes_total" in metrics else None,
+        "fetch_p50_ms": round(fetch["p50"] * 1000, 1) if fetch.get("p50") is not None else None,
+        "fetch_p99_ms": round(fetch["p99"] * 1000, 1) if fetch.get("p99") is not None else None,
+    }
+    if proc.returncode != 0:
+        print(f"⚠️ [{name}] exited with {proc.returncode}; log kept in {log_path}")
+        with open(log_path, "r", errors="replace") as f:
+            for line in f.readlines()[-10:]:
+                print(f"   {line.rstrip()}")
+    elif args.keep:
+        print(f"📁 [{name}] scratch directory kept: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def format_value(value):
+    return "-" if value is None else str(value)
+
+
+def print_table(results, baseline=None):
+    columns = [("pages", "pages"), ("pages/s", "pages_per_second"), ("wall s", "wall_seconds"),
+               ("CPU s", "cpu_seconds"), ("CPU ms/page", "cpu_ms_per_page"), ("RSS MB", "peak_rss_mb"),
+               ("MB read", "mb_read"), ("p50 ms", "fetch_p50_ms"), ("p99 ms", "fetch_p99_ms")]
+    width = max(len(r["name"]) for r in results) + 2
+    print(f"\n{'run':<{width}}" + "".join(f"{title:>13}" for title, _ in columns))
+    before_by_name = {r["name"]: r for r in baseline["results"]} if baseline else {}
+    for result in results:
+        print(f"{result['name']:<{width}}" + "".join(f"{format_value(result[key]):>13}" for _, key in columns))
+        before = before_by_name.get(result["name"])
+        if before:
+            cells = []
+            for _, key in columns:
+                old, new = before.get(key), result.get(key)
+                cells.append(f"{(new - old) / old:+.1%}" if old and new is not None else "-")
+            print(f"{'  vs before':<{width}}" + "".join(f"{cell:>13}" for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark utm-crawler.py against a synthetic UTM site")
+    parser.add_argument('--crawler', default=CRAWLER, help='utm-crawler.py to run (e.g. from an older checkout)')
+    parser.add_argument('--run', action='append', metavar='NAME=ARGS',
+                        help=f'Named crawler configuration; repeatable (default: {DEFAULT_RUNS})')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per configuration; the fastest is reported')
+    parser.add_argument('--timeout', type=int, default=TIMEOUT, help='Seconds before a run is killed')
+    parser.add_argument('--save', help='Write results as JSON')
+    parser.add_argument('--compare', help='JSON from an earlier --save to compare against')
+    parser.add_argument('--keep', action='store_true', help='Keep scratch directories')
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    site = {key: getattr(args, key) for key in
+            ("pages", "fanout", "page_size", "latency_ms", "slow_rate", "error_rate", "rate_limit_rate",
+             "binary_rate", "seed")}
+    print(f"🌐 Synthetic site: {site}")
+
+    results = []
+    for name, extra_args in map(parse_run, args.run or DEFAULT_RUNS):
+        runs = [run_crawler(args.crawler, name, extra_args, args) for _ in range(args.repeat)]
+        best = max(runs, key=lambda r: r["pages_per_second"])
+        results.append(best)
+        print(f"✅ [{name}] {best['pages']} pages in {best['wall_seconds']}s ({best['pages_per_second']} pages/s)")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("site") != site:
+            print(f"⚠️ Baseline was measured on a different site: {baseline.get('site')}")
+    print_table(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"site": site, "crawler": args.crawler, "results": results}, f, indent=2)
+        print(f"\n💾 Saved results to {args.save}")
+    return all(r["exit_code"] == 0 for r in results)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# bench_embed.py - chunks/sec of plain model.encode() vs the bucketed multi-process EmbeddingEngine
+
+import argparse
+import os
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from chunker import Chunker
+from embed_engine import TOKENS_PER_BATCH, EmbeddingEngine
+from page_store import open_corpus
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def load_chunks(model, path, limit):
+    chunker = Chunker.for_model(model)
+    corpus = open_corpus(path)
+    chunks = []
+    for page in corpus.iter_pages():
+        if page is not None and page.url:
+            chunks.extend(chunker.chunk(page.text))
+        if len(chunks) >= limit:
+            break
+    corpus.close()
+    return chunks[:limit]
+
+def bench(name, encode, chunks, repeat):
+    best = float("inf")
+    vectors = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        vectors = encode(chunks)
+        best = min(best, time.perf_counter() - start)
+    rate = len(chunks) / best
+    print(f"⏱️ {name:<16} {rate:>8.1f} chunks/sec ({best:.1f}s for {len(chunks)} chunks)")
+    return rate, np.asarray(vectors)
+
+def min_cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput on crawled pages")
+    parser.add_argument('--model', default=MODEL_NAME, help='SentenceTransformer name or path')
+    parser.add_argument('--corpus', default=None, help='Page store or utm_pages directory (default: whichever exists)')
+    parser.add_argument('--chunks', type=int, default=2000, help='Chunks to embed')
+    parser.add_argument('--batch-size', type=int, default=32, help='batch_size for the plain model.encode() run')
+    parser.add_argument('--tokens-per-batch', type=int, default=TOKENS_PER_BATCH, help='Engine padded-token budget')
+    parser.add_argument('--workers', type=int, action='append',
+                        help=f'Engine worker processes; repeatable (default: 0 and {os.cpu_count()})')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per configuration; the best is reported')
+    args = parser.parse_args()
+
+    model = SentenceTransformer(args.model, device="cpu")
+    chunks = load_chunks(model, args.corpus, args.chunks)
+    if not chunks:
+        print("❌ No pages found")
+        return
+    print(f"📊 {len(chunks)} chunks, {os.cpu_count()} cores")
+
+    baseline, reference = bench("model.encode", lambda c: model.encode(c, batch_size=args.batch_size,
+                                                                      show_progress_bar=False), chunks, args.repeat)
+    for workers in args.workers or sorted({0, os.cpu_count() or 1}):
+        engine = EmbeddingEngine(model, args.model, workers, args.tokens_per_batch)
+        engine.encode(chunks[:workers * 4])  # Start and load the workers outside the timing
+        rate, vectors = bench(f"engine x{workers}", engine.encode, chunks, args.repeat)
+        engine.close()
+        print(f"🚀 {rate / baseline:.1f}x plain encode; min cosine to plain vectors {min_cosine(reference, vectors):.6f}")
+
+if __name__ == "__main__":
+    main()
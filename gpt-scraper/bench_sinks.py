@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# bench_sinks.py - rows/sec of each vector sink on synthetic embedded chunks
+
+"""Load the same synthetic rows (random unit vectors, chunk-sized text,
+uuid5 ids) through each vector_sinks.py sink with the pipeline's upload
+threads and report rows/sec.
+
+Postgres runs go to a scratch table (dropped afterwards) in DATABASE_URL
+or --dsn, e.g. a local Postgres with pgvector, once per COPY format.
+The Supabase sink writes to a real table, so it only runs when asked
+for with --sink supabase --table <scratch table>.
+
+    python bench_sinks.py --rows 20000
+    python bench_sinks.py --dsn postgresql://localhost/postgres --sink postgres-binary --sink postgres-text
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from uploader import chunk_id
+from vector_sinks import DATABASE_URL_ENV, open_sink
+
+DEFAULT_SINKS = ["parquet", "postgres-binary", "postgres-text"]
+DIM = 384
+BENCH_TABLE = "utmgpt_chunks_bench"
+
+
+def make_rows(count, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    words = random.Random(seed)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vocabulary = ["student", "course", "campus", "Mississauga", "registration", "deadline", "tuition", "library",
+                  "program", "faculty", "research", "residence", "exam", "schedule", "\ttab", "line\nbreak"]
+    return [{
+        "id": chunk_id(f"{i:064x}"),
+        "content": " ".join(words.choice(vocabulary) for _ in range(180)),
+        "url": f"https://www.utm.utoronto.ca/page/{i % 5000}",
+        "embedding": vectors[i],
+    } for i in range(count)]
+
+
+def run_sink(name, rows, args, workdir):
+    kind, _, copy_format = name.partition("-")
+    options = {}
+    if kind == "postgres":
+        options = {"table": BENCH_TABLE, "copy_format": copy_format or "binary",
+                   "dead_letter": os.path.join(workdir, "failed.jsonl")}
+    elif kind == "parquet":
+        options = {"directory": os.path.join(workdir, name)}
+    elif kind == "supabase":
+        options = {"table": args.table, "dead_letter": os.path.join(workdir, "failed.jsonl")}
+    sink = open_sink(kind, rows[0]["embedding"].shape[0], **options)
+    batches = [rows[i:i + args.batch_size] for i in range(0, len(rows), args.batch_size)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        stored = sum(len(batch) for batch, ok in zip(batches, pool.map(sink.upload, batches)) if ok)
+    sink.close()  # Includes the parquet flush
+    elapsed = time.perf_counter() - start
+    if kind == "postgres":
+        with sink.psycopg.connect(sink.dsn, autocommit=True) as conn:
+            conn.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    return stored, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector sinks on synthetic embedded chunks")
+    parser.add_argument('--rows', type=int, default=20000, help='Rows to load per sink')
+    parser.add_argument('--dim', type=int, default=DIM, help='Vector dimension')
+    parser.add_argument('--batch-size', type=int, default=50, help='Rows per upload (the pipeline uses BATCH_UPLOAD)')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent uploads (the pipeline uses UPLOAD_WORKERS)')
+    parser.add_argument('--sink', action='append',
+                        choices=["parquet", "postgres-binary", "postgres-text", "supabase"],
+                        help=f'Sink to run; repeatable (default: {DEFAULT_SINKS}, postgres only with a DSN)')
+    parser.add_argument('--dsn', default=None, help=f'Postgres connection string (default: ${DATABASE_URL_ENV})')
+    parser.add_argument('--table', default=BENCH_TABLE, help='Scratch table for --sink supabase')
+    args = parser.parse_args()
+
+    if args.dsn:
+        os.environ[DATABASE_URL_ENV] = args.dsn
+    sinks = args.sink or [name for name in DEFAULT_SINKS
+                          if not name.startswith("postgres") or os.getenv(DATABASE_URL_ENV)]
+    if "supabase" in sinks:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+    rows = make_rows(args.rows, args.dim)
+    print(f"📊 {len(rows)} rows of {args.dim} floats, batches of {args.batch_size}, {args.workers} workers")
+
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="bench_sinks_") as workdir:
+        for name in sinks:
+            stored, elapsed = run_sink(name, rows, args, workdir)
+            ok = ok and stored == len(rows)
+            print(f"⏱️ {name:<16} {stored / elapsed:>10.0f} rows/sec ({stored} rows in {elapsed:.1f}s)")
+    return ok
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# bench_text_normalize.py - MB/s of the old per-character clean_text() vs text_normalize.py on the real corpus
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from page_store import open_corpus
+from text_normalize import clean_text, normalize_many
+
+
+# clean_text() as it was in utm_embed_and_upload.py and debug_files.py, kept verbatim for comparison
+def legacy_clean_text(text):
+    text = text.replace('\u0000', '')
+    text = ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
+    return ' '.join(text.split())
+
+def load_texts(path, limit):
+    corpus = open_corpus(path)
+    texts = []
+    for page in corpus.iter_pages():
+        if page is not None:
+            texts.append(page.text)
+        if limit and len(texts) >= limit:
+            break
+    corpus.close()
+    return texts
+
+def bench(name, run, texts, megabytes, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(texts)
+        best = min(best, time.perf_counter() - start)
+    rate = megabytes / best
+    print(f"⏱️ {name:<14} {rate:>9.1f} MB/s ({best * 1000:.0f} ms for {len(texts)} pages)")
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_text() on crawled pages")
+    parser.add_argument('--corpus', default=None, help='Page store or utm_pages directory (default: whichever exists)')
+    parser.add_argument('--limit', type=int, default=0, help='Only use the first N pages (0 = all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per version; the best is reported')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processes for the normalize_many() pool run (0 skips it)')
+    args = parser.parse_args()
+
+    texts = load_texts(args.corpus, args.limit)
+    if not texts:
+        print("❌ No pages found")
+        return
+    megabytes = sum(len(text.encode("utf-8")) for text in texts) / 1e6
+    print(f"📊 {len(texts)} pages, {megabytes:.1f} MB of text")
+
+    before = bench("legacy", lambda batch: [legacy_clean_text(t) for t in batch], texts, megabytes, args.repeat)
+    after = bench("text_normalize", normalize_many, texts, megabytes, args.repeat)
+    print(f"🚀 Speedup: {after / before:.1f}x")
+
+    if args.workers:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            normalize_many(texts[:args.workers], pool)  # Start the workers outside the timing
+            pooled = bench(f"pool x{args.workers}", lambda batch: normalize_many(batch, pool), texts, megabytes,
+                           args.repeat)
+        print(f"🚀 Pool speedup over legacy: {pooled / before:.1f}x (includes pickling pages to and from workers)")
+
+    differences = [i for i, text in enumerate(texts) if legacy_clean_text(text) != clean_text(text)]
+    print(f"🔍 {len(texts) - len(differences)}/{len(texts)} pages normalize identically")
+    for i in differences[:20]:
+        print(f"   page #{i}: legacy {len(legacy_clean_text(texts[i]))} chars, new {len(clean_text(texts[i]))} chars")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# bench_url_filter.py - links/sec of the old is_valid() chain vs the compiled url_rules.toml filter
+
+import argparse
+import time
+import tomllib
+from urllib.parse import urlparse
+from url_rules import RULES_FILE, UrlRules
+
+
+# The filter as it was in utm-crawler.py before url_rules.toml, kept verbatim for comparison
+def legacy_is_valid(link):
+    link_lower = link.lower()
+    parsed = urlparse(link)
+
+    # Allow UTM-specific domains
+    is_utm_domain = (parsed.netloc.endswith('.utm.utoronto.ca') or
+                     parsed.netloc == 'utm.utoronto.ca')
+
+    # Allow UofT calendar domains for course information
+    is_calendar_domain = parsed.netloc in ['artsci.calendar.utoronto.ca', 'calendar.utoronto.ca']
+
+    # For calendar domains, check if it's UTM-related content
+    utm_related_calendar = False
+    if is_calendar_domain:
+        # Check for UTM campus indicators in the URL
+        utm_indicators = ['/utm', 'utm.', 'mississauga', 'campus/utm']
+        utm_related_calendar = any(indicator in link_lower for indicator in utm_indicators)
+
+        # Also allow course pages that might be relevant to UTM students
+        if '/course/' in link_lower:
+            utm_related_calendar = True
+
+    return (
+        (is_utm_domain or utm_related_calendar)
+        and "#" not in link
+        and not any(ext in link_lower for ext in [".pdf", ".jpg", ".jpeg", ".png", ".svg", ".zip", ".doc", ".docx", ".mp3", ".csv", ".xls", ".xlsx", ".ppt", ".pptx", ".txt", ".rtf", ".odt", ".ods", ".odp", ".gif", ".bmp", ".tiff", ".webp", ".ico", ".mp4", ".avi", ".mov", ".wmv", ".flv", ".webm", ".mkv", ".wav", ".flac", ".aac", ".ogg", ".wma", ".m4a", ".tar", ".gz", ".rar", ".7z", ".bz2", ".exe", ".msi", ".dmg", ".deb", ".rpm", ".apk", ".ipa", ".swf", ".fla", ".psd", ".ai", ".eps", ".indd", ".sketch", ".fig", ".xml", ".json", ".yaml", ".yml", ".sql", ".db", ".sqlite", ".mdb", ".accdb", ".log", ".tmp", ".bak", ".old", ".orig", ".backup"])
+        and not link_lower.endswith(".pdf")
+        and "download?inline" not in link_lower
+        and not link_lower.endswith(".doc")
+        and ".docx" not in link_lower
+        and link.startswith("http")
+        and not link.startswith("https://www.utm.utoronto.ca/~w3pkota")
+        and not link.startswith("https://www.utm.utoronto.ca/milsteinlab")
+        and not link.startswith("http://library.utm.utoronto.ca/calendar-field_date")
+        and not link.startswith("https://library.utm.utoronto.ca/calendar-field_date")
+        and not link.startswith("http://library.utm.utoronto.ca/book-collection-displays")
+        and not link.startswith("http://www.utm.utoronto.ca/mscsm")
+        and not link.startswith("https://library2.utm.utoronto.ca")
+        # Filter out non-UTM campus content
+        and "scarborough" not in link_lower
+        and "/utsc" not in link_lower
+        and "st-george" not in link_lower
+        and "/stg" not in link_lower
+    )
+
+# Links the scraped/queued files cannot contain, since they only hold accepted URLs: rejected links and
+# extensions outside the last path segment. Always included in the verdict check.
+EDGE_CASES = [
+    "https://www.utm.utoronto.ca/registrar/forms?file=a.pdf",
+    "https://www.utm.utoronto.ca/files/a.pdf/view",
+    "https://www.utm.utoronto.ca/a.txt/",
+    "https://www.utm.utoronto.ca/.old/x",
+    "https://www.utm.utoronto.ca/media/Report.PDF",
+    "https://www.utm.utoronto.ca/data.json?v=2",
+    "https://www.utm.utoronto.ca/page.html",
+    "https://www.utm.utoronto.ca/news#latest",
+    "https://www.utm.utoronto.ca/sites/download?inline=1",
+    "https://www.utm.utoronto.ca/~w3pkota/index.html",
+    "https://library2.utm.utoronto.ca/",
+    "https://www.utsc.utoronto.ca/",
+    "https://www.utm.utoronto.ca/scarborough-partnership",
+    "https://utm.utoronto.ca/",
+    "https://evilutm.utoronto.ca/",
+    "https://www.utoronto.ca/",
+    "ftp://www.utm.utoronto.ca/",
+    "mailto:someone@utm.utoronto.ca",
+    "https://artsci.calendar.utoronto.ca/course/csc108h1",
+    "https://artsci.calendar.utoronto.ca/section/Mississauga",
+    "https://artsci.calendar.utoronto.ca/section/MISSISSAUGA",
+    "https://artsci.calendar.utoronto.ca/COURSE/CSC108H5",
+    "https://artsci.calendar.utoronto.ca/section/Economics",
+    "https://calendar.utoronto.ca/utm-programs",
+]
+
+def legacy_filter(link):
+    """Old per-link path in worker(): a domain pre-check (first urlparse) then is_valid (second urlparse)"""
+    parsed = urlparse(link)
+    is_utm_domain = (parsed.netloc.endswith('.utm.utoronto.ca') or
+                     parsed.netloc == 'utm.utoronto.ca')
+    is_calendar_domain = parsed.netloc in ['artsci.calendar.utoronto.ca', 'calendar.utoronto.ca']
+    return (is_utm_domain or is_calendar_domain) and legacy_is_valid(link)
+
+def uppercased_rules(path=RULES_FILE):
+    """url_rules.toml with its case-insensitive lists in upper case; must give the same verdicts"""
+    with open(path, "rb") as f:
+        rules = tomllib.load(f)
+    allow, deny = rules["allow"], rules["deny"]
+    for table, key in ((allow, "calendar_indicators"), (deny, "substrings"), (deny, "extensions")):
+        table[key] = [s.upper() for s in table.get(key, [])]
+    return UrlRules(rules)
+
+def load_links(filenames):
+    links = []
+    for filename in filenames:
+        with open(filename, "r") as f:
+            links.extend(line.strip() for line in f if line.strip())
+    return links
+
+def bench(name, check, links, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for link in links:
+            check(link)
+        best = min(best, time.perf_counter() - start)
+    rate = len(links) / best
+    print(f"⏱️ {name:<10} {rate:>12,.0f} links/sec ({best * 1000:.1f} ms for {len(links)} links)")
+    return rate
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crawler link filtering")
+    parser.add_argument('files', nargs='*', default=["scraped_urls.txt", "queued_urls.txt"],
+                        help='Text files with one URL per line')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per filter; the best is reported')
+    args = parser.parse_args()
+
+    links = load_links(args.files)
+    rules = UrlRules.load()
+    print(f"📊 {len(links)} links from {', '.join(args.files)}")
+
+    before = bench("legacy", legacy_filter, links, args.repeat)
+    after = bench("compiled", rules.is_valid, links, args.repeat)
+    print(f"🚀 Speedup: {after / before:.1f}x")
+
+    checked = links + EDGE_CASES
+    differences = [link for link in checked if legacy_filter(link) != rules.is_valid(link)]
+    rejected = sum(1 for link in checked if not legacy_filter(link))
+    print(f"🔍 {len(checked) - len(differences)}/{len(checked)} links get the same verdict "
+          f"(including {len(EDGE_CASES)} edge cases; {rejected} rejected by the legacy filter)")
+    for link in differences[:20]:
+        print(f"   legacy={legacy_filter(link)!s:<5} compiled={rules.is_valid(link)!s:<5} {link}")
+
+    # The legacy lists were lowercase literals; rules written in any case must match the same links
+    upper = uppercased_rules()
+    case_differences = [link for link in checked if upper.is_valid(link) != rules.is_valid(link)]
+    print(f"🔠 {len(checked) - len(case_differences)}/{len(checked)} links get the same verdict "
+          f"with the rules in upper case")
+    for link in case_differences[:20]:
+        print(f"   lower={rules.is_valid(link)!s:<5} upper={upper.is_valid(link)!s:<5} {link}")
+
+if __name__ == "__main__":
+    main()
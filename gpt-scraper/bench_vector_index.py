@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# bench_vector_index.py - recall and latency of IVF search against exact search at k=15
+
+"""Build vector_index.py indexes over real or synthetic vectors and
+compare, per query, exact float32 search with exact float16 search and
+IVF search at each nprobe: recall@k against the exact float32 top k,
+and p50/p95 latency.
+
+Vectors come from an existing index (--index), or are synthetic:
+clustered unit vectors, which is closer to real text embeddings than
+uniform noise (where no ANN index can do well). Queries are stored
+vectors with noise added, so each has near neighbours the way a
+question about an indexed page does.
+
+    python bench_vector_index.py --rows 100000
+    python bench_vector_index.py --index vector_index --nprobe 4 --nprobe 16 --nprobe 64
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from vector_index import NPROBE, TOP_K, VectorIndex, build_index, normalize
+
+DIM = 384
+DEFAULT_NPROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def make_vectors(count, dim, clusters, spread, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((clusters, dim), dtype=np.float32))
+    members = rng.integers(0, clusters, size=count)
+    return normalize(centers[members] + spread * rng.standard_normal((count, dim), dtype=np.float32))
+
+
+def make_queries(vectors, count, noise, seed=1):
+    rng = np.random.default_rng(seed)
+    picked = np.asarray(vectors[rng.choice(len(vectors), size=count, replace=False)], dtype=np.float32)
+    return normalize(picked + noise * rng.standard_normal(picked.shape, dtype=np.float32))
+
+
+def timed_search(index, queries, k, nprobe):
+    """Rows found and per-query latencies (ms), one query at a time as a server would send them"""
+    rows = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        rows[i] = index.search(query, k, nprobe)[1][0]
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return rows, latencies
+
+
+def recall(found, truth):
+    return np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+
+
+def report(label, found, truth, latencies):
+    print(f"⏱️ {label:<16} recall@{truth.shape[1]} {recall(found, truth):6.3f}   "
+          f"p50 {np.percentile(latencies, 50):7.2f} ms   p95 {np.percentile(latencies, 95):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark exact and IVF search of the local vector index")
+    parser.add_argument('--index', default=None, help='Take vectors from this index (default: synthetic)')
+    parser.add_argument('--rows', type=int, default=100000, help='Synthetic vectors')
+    parser.add_argument('--clusters', type=int, default=500, help='Clusters in the synthetic vectors')
+    parser.add_argument('--spread', type=float, default=0.1, help='Per-dimension noise around each cluster centre')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.03, help='Noise added to stored vectors to make queries')
+    parser.add_argument('-k', type=int, default=TOP_K)
+    parser.add_argument('--lists', type=int, default=None, help='IVF lists (default: about 4*sqrt(rows))')
+    parser.add_argument('--nprobe', type=int, action='append', help=f'Repeatable (default: {DEFAULT_NPROBES})')
+    args = parser.parse_args()
+
+    if args.index:
+        source = VectorIndex(args.index)
+        vectors = np.asarray(source.vectors, dtype=np.float32)
+        source.close()
+    else:
+        vectors = make_vectors(args.rows, DIM, args.clusters, args.spread)
+    queries = make_queries(vectors, min(args.queries, len(vectors)), args.noise)
+    names = [str(i) for i in range(len(vectors))]
+    print(f"📊 {len(vectors)} vectors of {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    with tempfile.TemporaryDirectory(prefix="bench_vector_index_") as workdir:
+        indexes = {}
+        for dtype in ("float32", "float16"):
+            path = os.path.join(workdir, dtype)
+            start = time.perf_counter()
+            nlist = build_index(path, names, names, names, vectors, dtype, args.lists)
+            built = time.perf_counter() - start
+            start = time.perf_counter()
+            indexes[dtype] = VectorIndex(path)
+            opened = (time.perf_counter() - start) * 1000
+            size = os.path.getsize(os.path.join(path, "vectors.npy")) / 1e6
+            print(f"🏗️ {dtype}: built in {built:.1f}s ({nlist} lists), {size:.0f} MB of vectors, "
+                  f"opened in {opened:.1f} ms")
+
+        truth, latencies = timed_search(indexes["float32"], queries, args.k, None)
+        report("exact float32", truth, truth, latencies)
+        found, latencies = timed_search(indexes["float16"], queries, args.k, None)
+        report("exact float16", found, truth, latencies)
+        for nprobe in args.nprobe or DEFAULT_NPROBES:
+            found, latencies = timed_search(indexes["float32"], queries, args.k, nprobe)
+            report(f"ivf nprobe={nprobe}" + (" *" if nprobe == NPROBE else ""), found, truth, latencies)
+        found, latencies = timed_search(indexes["float16"], queries, args.k, NPROBE)
+        report(f"ivf16 nprobe={NPROBE}", found, truth, latencies)
+        for index in indexes.values():
+            index.close()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
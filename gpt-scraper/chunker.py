@@ -0,0 +1,147 @@
+"""Token-budgeted chunking of page text for the embedding model.
+
+all-MiniLM-L6-v2 reads at most 256 word-pieces and silently drops the
+rest, so a fixed word count is the wrong unit: a page of course codes
+and URLs overflows 200 words' worth of tokens, while plain prose leaves
+much of the window unused. Chunker measures text with the model's own
+tokenizer and packs each chunk up to the budget instead.
+
+A page is split into segments: lines (the extractors put every block
+element on its own line), then sentences within long lines. All of a
+page's segments are tokenized in one batch call to the fast tokenizer,
+which returns character offsets, so token counts are exact and an
+over-long segment can be cut at a token boundary without re-tokenizing.
+Segments are packed greedily, and a chunk closes early at a heading-like
+line once it is reasonably full, so sections start new chunks. A chunk
+that closed on size begins the next one with up to `overlap` tokens of
+its trailing sentences. Chunk text is normalized like clean_text().
+
+The chunker keeps its own copy of the model's tokenizer behind a lock:
+a Rust tokenizer raises "Already borrowed" when two threads use it at
+once, and model.encode() in the embed stage uses the original.
+
+Without a fast tokenizer (e.g. a model loaded without one) words and
+punctuation marks are counted instead, which slightly underestimates
+word-pieces.
+"""
+
+import copy
+import re
+from threading import Lock
+
+from text_normalize import clean_text
+
+DEFAULT_MAX_TOKENS = 256  # all-MiniLM-L6-v2's max_seq_length, used when the model does not say
+CHUNK_OVERLAP = 32  # Tokens of trailing sentences repeated at the start of the next chunk
+MIN_FILL = 0.5  # A chunk only closes early at a heading once it holds this fraction of the budget
+HEADING_MAX_WORDS = 12  # Longest line treated as a heading
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
+PRE_TOKEN = re.compile(r"\w+|[^\w\s]")  # Roughly BERT's pre-tokenization, for the no-tokenizer fallback
+
+
+def is_heading(line):
+    """Short line without closing punctuation, like a title or section heading"""
+    return len(line.split()) <= HEADING_MAX_WORDS and not line.endswith((".", "!", "?", ",", ";", ":"))
+
+
+class Chunker:
+    def __init__(self, tokenizer=None, max_tokens=DEFAULT_MAX_TOKENS, overlap=CHUNK_OVERLAP):
+        if tokenizer is not None and not getattr(tokenizer, "is_fast", False):
+            tokenizer = None  # Offsets need a fast (Rust) tokenizer
+        self.tokenizer = tokenizer
+        self.lock = Lock()
+        specials = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 2  # [CLS] and [SEP]
+        self.budget = max(16, max_tokens - specials)
+        self.overlap = min(overlap, self.budget // 2)
+
+    @classmethod
+    def for_model(cls, model, target_tokens=None, overlap=CHUNK_OVERLAP):
+        """Chunker using a SentenceTransformer's tokenizer, capped at its max_seq_length"""
+        max_tokens = getattr(model, "max_seq_length", None) or DEFAULT_MAX_TOKENS
+        if target_tokens:
+            max_tokens = min(max_tokens, target_tokens)
+        tokenizer = getattr(model, "tokenizer", None)
+        return cls(copy.deepcopy(tokenizer) if tokenizer is not None else None, max_tokens, overlap)
+
+    def segments(self, text):
+        """(text, is_heading) for each line of the page, long lines split into sentences"""
+        segments = []
+        for line in text.splitlines():
+            line = clean_text(line)
+            if not line:
+                continue
+            if is_heading(line):
+                segments.append((line, True))
+            else:
+                segments.extend((sentence, False) for sentence in SENTENCE_END.split(line))
+        return segments
+
+    def token_spans(self, texts):
+        """Character (start, end) of every token in each text, in one batch call"""
+        if not texts:
+            return []
+        if self.tokenizer is None:
+            return [[m.span() for m in PRE_TOKEN.finditer(text)] for text in texts]
+        with self.lock:
+            encoded = self.tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                                     return_attention_mask=False, return_token_type_ids=False, verbose=False)
+        return encoded["offset_mapping"]
+
+    def split_long(self, text, spans):
+        """Cut a segment over the budget into pieces at word starts; yields (text, tokens)"""
+        start = 0
+        while len(spans) - start > self.budget:
+            end = start + self.budget
+            cut = end
+            # Back off to a token that starts a word so word-pieces of one word stay together
+            while cut > start + 1 and not text[spans[cut][0] - 1].isspace():
+                cut -= 1
+            if cut == start + 1:
+                cut = end
+            yield text[spans[start][0]:spans[cut][0]].strip(), cut - start
+            start = cut
+        if start < len(spans):
+            yield text[spans[start][0]:].strip(), len(spans) - start
+
+    def chunk(self, text):
+        """Chunks of at most the token budget, preferring sentence and heading boundaries"""
+        segments = self.segments(text)
+        pieces = []  # (text, tokens, is_heading)
+        for (segment, heading), spans in zip(segments, self.token_spans([s for s, _ in segments])):
+            if len(spans) > self.budget:
+                pieces.extend((part, count, False) for part, count in self.split_long(segment, spans))
+            elif spans:
+                pieces.append((segment, len(spans), heading))
+
+        chunks = []
+        current = []  # (text, tokens, is_heading) in the chunk being built
+        size = 0
+        for piece in pieces:
+            _, count, heading = piece
+            full = size + count > self.budget
+            if current and (full or (heading and size >= MIN_FILL * self.budget)):
+                carry = []
+                # A heading left at the end belongs with the text after it
+                if full and len(current) > 1 and current[-1][2] and current[-1][1] + count <= self.budget:
+                    carry = [current.pop()]
+                elif full and not heading:
+                    # Overlap: repeat trailing sentences, as long as the new piece still fits after them
+                    carried = 0
+                    for previous in reversed(current):
+                        carried += previous[1]
+                        if carried > self.overlap or carried + count > self.budget:
+                            break
+                        carry.insert(0, previous)
+                chunks.append(" ".join(t for t, _, _ in current))
+                current = carry
+                size = sum(c for _, c, _ in current)
+            current.append(piece)
+            size += count
+        if current:
+            chunks.append(" ".join(t for t, _, _ in current))
+        return chunks
+
+    def count_tokens(self, texts):
+        """Tokens in each text (without special tokens)"""
+        return [len(spans) for spans in self.token_spans(list(texts))]
@@ -0,0 +1,263 @@
+"""Live crawl metrics: counters, per-host latency histograms and a /metrics endpoint.
+
+CrawlMetrics is updated by the fetch threads (or the event loop) and read
+two ways: serve() answers GET /metrics in Prometheus text format and
+GET /metrics.json with the same numbers as JSON, and write_snapshot()
+saves that JSON to crawl_metrics.json for runs nobody is scraping.
+Frontier depth and per-host queue/in-flight gauges are read from the
+frontier and scheduler at scrape time, so the hot path only touches a few
+counters under one lock.
+"""
+
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+METRICS_FILE = "crawl_metrics.json"
+METRICS_PORT = 9108
+RATE_WINDOW = 60  # Seconds averaged for pages/sec and bytes/sec
+
+# Upper bounds in seconds; fetches time out at 15s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside its bucket, like Prometheus histogram_quantile"""
+        if not self.count:
+            return None
+        target = q * self.count
+        lower, previous = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= target:
+                if bound == float("inf"):
+                    return self.buckets[-1]
+                return round(lower + (bound - lower) * (target - previous) / (total - previous), 4)
+            lower, previous = bound, total
+        return None
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 4) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class CrawlMetrics:
+    def __init__(self, frontier_counts=None, host_stats=None):
+        self.lock = Lock()
+        self.started = time.time()
+        self.frontier_counts = frontier_counts  # () -> {status: count}
+        self.host_stats = host_stats  # () -> {host: (queued, in_flight, limit, rate)}
+        self.pages = Counter()  # outcome -> count (stored, alias, unchanged, not_modified, ...)
+        self.responses = Counter()  # HTTP status or error kind -> count
+        self.bytes_total = 0
+        self.fetch_latency = {}  # host -> Histogram
+        self.parse_latency = {}
+        # Per-second [pages, bytes] ring for the windowed rates
+        self.window = [[0, 0, 0] for _ in range(RATE_WINDOW)]  # [second, pages, bytes]
+
+    def _tick(self, pages, nbytes):
+        now = int(time.time())
+        slot = self.window[now % RATE_WINDOW]
+        if slot[0] != now:
+            slot[:] = [now, 0, 0]
+        slot[1] += pages
+        slot[2] += nbytes
+
+    def observe_fetch(self, host, seconds, status, nbytes=0):
+        """One finished request: its latency, HTTP status (or error kind) and body size"""
+        with self.lock:
+            histogram = self.fetch_latency.get(host)
+            if histogram is None:
+                histogram = self.fetch_latency[host] = Histogram()
+            histogram.observe(seconds)
+            self.responses[str(status)] += 1
+            self.bytes_total += nbytes
+            self._tick(0, nbytes)
+
+    def observe_parse(self, host, seconds):
+        """Parse stage latency, including any wait for a free parse worker"""
+        with self.lock:
+            histogram = self.parse_latency.get(host)
+            if histogram is None:
+                histogram = self.parse_latency[host] = Histogram()
+            histogram.observe(seconds)
+
+    def count_page(self, outcome):
+        with self.lock:
+            self.pages[outcome] += 1
+            if outcome in ("stored", "alias"):
+                self._tick(1, 0)
+
+    def rates(self):
+        """(pages/sec, bytes/sec) over the last RATE_WINDOW seconds"""
+        now = int(time.time())
+        with self.lock:
+            recent = [slot for slot in self.window if now - RATE_WINDOW < slot[0] <= now]
+            span = min(RATE_WINDOW, max(1.0, time.time() - self.started))
+            return sum(s[1] for s in recent) / span, sum(s[2] for s in recent) / span
+
+    def _gauges(self):
+        frontier = self.frontier_counts() if self.frontier_counts else {}
+        hosts = self.host_stats() if self.host_stats else {}
+        return frontier, hosts
+
+    def snapshot(self):
+        """All metrics as a JSON-serializable dict"""
+        frontier, hosts = self._gauges()
+        pages_per_sec, bytes_per_sec = self.rates()
+        with self.lock:
+            per_host = {}
+            for host in set(self.fetch_latency) | set(self.parse_latency) | set(hosts):
+                fetch, parse = self.fetch_latency.get(host), self.parse_latency.get(host)
+                queued, in_flight, limit, rate = hosts.get(host, (0, 0, 0, 0))
+                per_host[host] = {
+                    "queued": queued,
+                    "in_flight": in_flight,
+                    "concurrency_limit": limit,
+                    "rate_limit": rate,
+                    "fetch_seconds": fetch.summary() if fetch else None,
+                    "parse_seconds": parse.summary() if parse else None,
+                }
+            fetch_all, parse_all = Histogram(), Histogram()
+            for histogram in self.fetch_latency.values():
+                fetch_all.merge(histogram)
+            for histogram in self.parse_latency.values():
+                parse_all.merge(histogram)
+            return {
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "pages_per_second": round(pages_per_sec, 2),
+                "bytes_per_second": round(bytes_per_sec),
+                "bytes_total": self.bytes_total,
+                "frontier": frontier,
+                "in_flight": sum(h[1] for h in hosts.values()),
+                "pages": dict(self.pages),
+                "fetch_seconds": fetch_all.summary(),
+                "parse_seconds": parse_all.summary(),
+                "responses": dict(self.responses),
+                "hosts": per_host,
+            }
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        frontier, hosts = self._gauges()
+        pages_per_sec, bytes_per_sec = self.rates()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        def histograms(name, help_text, by_host):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for host, histogram in sorted(by_host.items()):
+                host_label = _label(host)
+                for bound, total in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{host="{host_label}",le="{le}"}} {total}')
+                lines.append(f'{name}_sum{{host="{host_label}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{host="{host_label}"}} {histogram.count}')
+
+        with self.lock:
+            metric("crawl_pages_total", "counter", "Fetched pages by outcome",
+                   [({"outcome": k}, v) for k, v in sorted(self.pages.items())])
+            metric("crawl_responses_total", "counter", "Responses by HTTP status or error kind",
+                   [({"status": k}, v) for k, v in sorted(self.responses.items())])
+            metric("crawl_bytes_total", "counter", "Response body bytes read", [({}, self.bytes_total)])
+            histograms("crawl_fetch_seconds", "Request latency per host", self.fetch_latency)
+            histograms("crawl_parse_seconds", "Parse stage latency per host, including queueing for a worker",
+                       self.parse_latency)
+        metric("crawl_pages_per_second", "gauge", f"Pages stored per second over the last {RATE_WINDOW}s",
+               [({}, round(pages_per_sec, 3))])
+        metric("crawl_bytes_per_second", "gauge", f"Bytes read per second over the last {RATE_WINDOW}s",
+               [({}, round(bytes_per_sec))])
+        metric("crawl_frontier_urls", "gauge", "Frontier URLs by status",
+               [({"status": k}, v) for k, v in sorted(frontier.items())])
+        metric("crawl_in_flight", "gauge", "Requests in flight", [({}, sum(h[1] for h in hosts.values()))])
+        metric("crawl_host_queued", "gauge", "URLs waiting per host",
+               [({"host": host}, s[0]) for host, s in sorted(hosts.items())])
+        metric("crawl_host_in_flight", "gauge", "Requests in flight per host",
+               [({"host": host}, s[1]) for host, s in sorted(hosts.items())])
+        metric("crawl_host_concurrency_limit", "gauge", "Current AIMD concurrency limit per host",
+               [({"host": host}, s[2]) for host, s in sorted(hosts.items())])
+        metric("crawl_host_rate_limit", "gauge", "Current requests/sec limit per host",
+               [({"host": host}, s[3]) for host, s in sorted(hosts.items())])
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path=METRICS_FILE):
+        """Atomically replace the JSON snapshot file"""
+        snapshot = self.snapshot()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        return snapshot
+
+
+def serve(metrics, port=METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread; returns the server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = metrics.render_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(metrics.snapshot(), indent=2, sort_keys=True).encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # Keep scrapes out of the crawl log
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -1,36 +1,38 @@
 import os
-import json
 import hashlib
+from page_store import open_corpus
+from sentence_transformers import SentenceTransformer
+from chunker import Chunker
+from index_manifest import INDEX_MANIFEST, IndexManifest
+from url_canon import canonicalize
+from uploader import chunk_id
 
 def fingerprint(text, url):
     return hashlib.sha256((text + url).encode("utf-8")).hexdigest()
 
-def clean_text(text):
-    text = text.replace('\u0000', '')
-    text = ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
-    return ' '.join(text.split())
-
-def chunk_text(text, max_words=200):
-    text = clean_text(text)
-    words = text.split()
-    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+def make_chunker():
+    # Same model and chunk settings as utm_embed_and_upload.py, so chunk ids match the manifest
+    return Chunker.for_model(SentenceTransformer("all-MiniLM-L6-v2"))
 
 def debug_files():
-    input_folder = "utm_pages"
-    seen_file = "seen.json"
-
-    # Load seen hashes
-    if os.path.exists(seen_file):
-        with open(seen_file, "r") as f:
-            seen_hashes = set(json.load(f))
-        print(f"📊 Loaded {len(seen_hashes)} seen hashes")
+    input_folder = None  # page_store/ if it exists, else utm_pages/
+    manifest_file = INDEX_MANIFEST
+    chunker = make_chunker()
+
+    # Load the chunk ids of every indexed page
+    if os.path.exists(manifest_file):
+        manifest = IndexManifest(manifest_file)
+        indexed = manifest.entries()
+        manifest.close()
+        print(f"📊 Loaded {len(indexed)} indexed pages")
     else:
-        seen_hashes = set()
-        print("❌ No seen.json file found")
+        indexed = {}
+        print(f"❌ No {manifest_file} file found")
 
-    # Get all files
-    all_filenames = sorted(os.listdir(input_folder))
-    total_files = len(all_filenames)
+    # Get all page ids
+    corpus = open_corpus(input_folder)
+    all_page_ids = corpus.ids()
+    total_files = len(all_page_ids)
     print(f"📁 Total files: {total_files}")
 
     # Check files around index 30394
@@ -40,57 +42,57 @@ def debug_files():
     print(f"\n🔍 Checking files {start_check} to {end_check}:")
 
     for i in range(start_check, min(end_check, total_files)):
-        if i >= len(all_filenames):
+        if i >= len(all_page_ids):
             break
 
-        filename = all_filenames[i]
-        print(f"\n📄 File {i}: {filename}")
-
-        path = os.path.join(input_folder, filename)
-
-        if not os.path.exists(path):
-            print(f"   ❌ File doesn't exist!")
-            continue
+        page_id = all_page_ids[i]
+        print(f"\n📄 File {i}: page {page_id}")
 
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
-                lines = content.splitlines()
-
-                if not lines:
-                    print(f"   ⚠️  Empty file")
-                    continue
-
-                if not lines[0].startswith("URL:"):
-                    print(f"   ⚠️  No URL header: {lines[0][:50]}...")
-                    continue
-
-                url = lines[0][5:].strip()
-                body = "\n".join(lines[2:])
-
-                print(f"   🔗 URL: {url}")
-                print(f"   📝 Body length: {len(body)} chars")
-
-                if len(body.strip()) == 0:
-                    print(f"   ⚠️  Empty body")
-                    continue
-
-                chunks = chunk_text(body)
-                print(f"   📦 Generated {len(chunks)} chunks")
-
-                new_chunks = 0
-                seen_chunks = 0
-
-                for chunk in chunks:
-                    hash_id = fingerprint(chunk, url)
-                    if hash_id in seen_hashes:
-                        seen_chunks += 1
-                    else:
-                        new_chunks += 1
-                        if new_chunks <= 2:  # Show first 2 new chunks
-                            print(f"   ✨ NEW chunk: {chunk[:100]}...")
-
-                print(f"   📊 New: {new_chunks}, Already seen: {seen_chunks}")
+            page = corpus.get(page_id)
+            if page is None:
+                print(f"   ❌ Page doesn't exist!")
+                continue
+
+            if not page.text and not page.url:
+                print(f"   ⚠️  Empty file")
+                continue
+
+            if not page.url:
+                print(f"   ⚠️  No URL header: {page.text[:50]}...")
+                continue
+
+            url = page.url
+            body = page.text
+
+            print(f"   🔗 URL: {url}")
+            print(f"   📝 Body length: {len(body)} chars")
+            entry = indexed.get(canonicalize(url)) or indexed.get(url)
+            if entry is None:
+                print(f"   🆕 Not indexed yet")
+            elif entry.content_hash != page.content_hash:
+                print(f"   ✏️  Changed since it was indexed")
+
+            if len(body.strip()) == 0:
+                print(f"   ⚠️  Empty body")
+                continue
+
+            chunks = chunker.chunk(body)
+            print(f"   📦 Generated {len(chunks)} chunks")
+
+            stored = set(entry.chunk_ids) if entry else set()
+            new_chunks = 0
+            seen_chunks = 0
+
+            for chunk in chunks:
+                if chunk_id(fingerprint(chunk, url)) in stored:
+                    seen_chunks += 1
+                else:
+                    new_chunks += 1
+                    if new_chunks <= 2:  # Show first 2 new chunks
+                        print(f"   ✨ NEW chunk: {chunk[:100]}...")
+
+            print(f"   📊 New: {new_chunks}, Already seen: {seen_chunks}")
 
         except Exception as e:
             print(f"   ❌ Error reading file: {e}")
@@ -101,40 +103,38 @@ def debug_files():
     check_indices = [30500, 31000, 32000, 33000, 34000]
 
     for i in check_indices:
-        if i >= len(all_filenames):
+        if i >= len(all_page_ids):
             print(f"📄 File {i}: Index out of range")
             continue
 
-        filename = all_filenames[i]
-        path = os.path.join(input_folder, filename)
-
-        if not os.path.exists(path):
-            print(f"📄 File {i}: {filename} - DOESN'T EXIST")
-            continue
+        page_id = all_page_ids[i]
 
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                content = f.read()
-                lines = content.splitlines()
+            page = corpus.get(page_id)
+            if page is None:
+                print(f"📄 File {i}: page {page_id} - DOESN'T EXIST")
+                continue
 
-                if not lines or not lines[0].startswith("URL:"):
-                    print(f"📄 File {i}: {filename} - INVALID FORMAT")
-                    continue
+            if not page.url:
+                print(f"📄 File {i}: page {page_id} - INVALID FORMAT")
+                continue
 
-                url = lines[0][5:].strip()
-                body = "\n".join(lines[2:])
-                chunks = chunk_text(body)
+            url = page.url
+            chunks = chunker.chunk(page.text)
 
-                new_chunks = 0
-                for chunk in chunks:
-                    hash_id = fingerprint(chunk, url)
-                    if hash_id not in seen_hashes:
-                        new_chunks += 1
+            entry = indexed.get(canonicalize(url)) or indexed.get(url)
+            stored = set(entry.chunk_ids) if entry else set()
+            new_chunks = 0
+            for chunk in chunks:
+                if chunk_id(fingerprint(chunk, url)) not in stored:
+                    new_chunks += 1
 
-                print(f"📄 File {i}: {filename} - {len(chunks)} chunks, {new_chunks} new")
+            print(f"📄 File {i}: page {page_id} - {len(chunks)} chunks, {new_chunks} new")
 
         except Exception as e:
-            print(f"📄 File {i}: {filename} - ERROR: {e}")
+            print(f"📄 File {i}: page {page_id} - ERROR: {e}")
+
+    corpus.close()
 
 if __name__ == "__main__":
     print("🚀 Starting file diagnostics...")
@@ -1,66 +1,41 @@
 #!/usr/bin/env python3
-# dedupe_queue.py - CLI tool for managing queued URLs
+# dedupe_queue.py - CLI tool for managing queued URLs in the crawl frontier
 
 import argparse
 import sys
+from frontier import open_frontier, DONE, FAILED, IN_FLIGHT, QUEUED
+from url_canon import url_key
 
-def dedupe_queue():
+def dedupe_queue(frontier):
     """Remove URLs from queue that are already scraped"""
-    scraped_file = "scraped_urls.txt"
-    queued_file = "queued_urls.txt"
-
-    try:
-        # Load scraped URLs into a set
-        with open(scraped_file, "r") as f:
-            scraped_urls = set(line.strip() for line in f if line.strip())
-    except FileNotFoundError:
-        print(f"❌ Error: {scraped_file} not found")
-        return False
-
-    try:
-        # Load queued URLs into a list
-        with open(queued_file, "r") as f:
-            queued_urls = [line.strip() for line in f if line.strip()]
-    except FileNotFoundError:
-        print(f"❌ Error: {queued_file} not found")
-        return False
-
-    # Remove any queued URLs that are already scraped
-    deduped_queue = [url for url in queued_urls if url not in scraped_urls]
-    removed_count = len(queued_urls) - len(deduped_queue)
-
-    # Overwrite queued file with clean list
-    with open(queued_file, "w") as f:
-        for url in deduped_queue:
-            f.write(url + "\n")
+    # Keys of every URL that is not queued; a queued URL matching one (or another queued URL) is a duplicate
+    known = set()
+    for status in (DONE, IN_FLIGHT, FAILED):
+        known.update(url_key(url) for url in frontier.iter_status(status))
+
+    # Remove any queued URLs that are already scraped, or queued twice under another spelling
+    queued = 0
+    duplicates = []
+    for url in frontier.iter_status(QUEUED):
+        queued += 1
+        key = url_key(url)
+        if key in known:
+            duplicates.append(url)
+        else:
+            known.add(key)
+    removed_count = frontier.drop_queued(duplicates)
 
     print(f"✅ Removed {removed_count} duplicate URLs from queue.")
-    print(f"📄 Queue is now {len(deduped_queue)} URLs long.")
+    print(f"📄 Queue is now {queued - removed_count} URLs long.")
     return True
 
-def remove_urls_starting_with(prefix):
+def remove_urls_starting_with(frontier, prefix):
     """Remove URLs from queue that start with specific prefix"""
-    queued_file = "queued_urls.txt"
-
-    try:
-        # Load queued URLs into a list
-        with open(queued_file, "r") as f:
-            queued_urls = [line.strip() for line in f if line.strip()]
-    except FileNotFoundError:
-        print(f"❌ Error: {queued_file} not found")
-        return False
-
-    # Remove URLs starting with the prefix
-    filtered_queue = [url for url in queued_urls if not url.startswith(prefix)]
-    removed_count = len(queued_urls) - len(filtered_queue)
-
-    # Overwrite queued file with filtered list
-    with open(queued_file, "w") as f:
-        for url in filtered_queue:
-            f.write(url + "\n")
+    queued = list(frontier.iter_status(QUEUED))
+    removed_count = frontier.drop_queued([url for url in queued if url.startswith(prefix)])
 
     print(f"✅ Removed {removed_count} URLs starting with '{prefix}' from queue.")
-    print(f"📄 Queue is now {len(filtered_queue)} URLs long.")
+    print(f"📄 Queue is now {len(queued) - removed_count} URLs long.")
     return True
 
 def main():
@@ -72,17 +47,20 @@ def main():
 
     # Remove URLs command
     remove_parser = subparsers.add_parser('remove', help='Remove URLs starting with specific prefix')
-    remove_parser.add_argument('prefix', help='URL prefix to remove (e.g., https://example.com/path)')
+    remove_parser.add_argument('prefix', help='URL prefix to remove (canonical form, e.g. https://www.utm.utoronto.ca/path)')
 
     args = parser.parse_args()
 
-    if args.command == 'dedupe':
-        return dedupe_queue()
-    elif args.command == 'remove':
-        return remove_urls_starting_with(args.prefix)
-    else:
+    if args.command is None:
         parser.print_help()
         return False
+    frontier = open_frontier()
+    if args.command == 'dedupe':
+        success = dedupe_queue(frontier)
+    else:
+        success = remove_urls_starting_with(frontier, args.prefix)
+    frontier.close()
+    return success
 
 if __name__ == "__main__":
     success = main()
@@ -0,0 +1,88 @@
+"""Inference backends for the embedding model.
+
+load_model(name, backend) returns a SentenceTransformer running on:
+
+- "torch": the stock fp32 PyTorch model;
+- "onnx": the same weights as an ONNX Runtime graph;
+- "onnx-int8": that graph with dynamic int8 quantization of the weights.
+
+Both ONNX graphs are made once per model under onnx_models/ (taken from
+the model repo when it ships one, else exported from the PyTorch weights)
+and loaded from there afterwards.
+
+All three return the same interface (encode, tokenizer, max_seq_length),
+so the chunker, the engine and the cache do not care which one is used.
+The ONNX backends need `pip install "optimum[onnxruntime]"`.
+bench_backends.py measures speed, cold start, memory and agreement with
+the fp32 vectors so a backend can be chosen on evidence.
+"""
+
+import os
+import platform
+import re
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_MODELS = "onnx_models"  # Local ONNX exports, one directory per model
+ONNX_FILE = "onnx/model.onnx"
+INT8_FILE = "onnx/model_qint8.onnx"
+
+
+def int8_config():
+    """sentence-transformers' dynamic quantization preset for this CPU"""
+    return "arm64" if platform.machine().lower() in ("arm64", "aarch64") else "avx2"
+
+
+def cache_name(model_name, backend):
+    """Name the embedding cache files vectors under: vectors differ slightly between backends"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def onnx_kwargs(threads):
+    if not threads:
+        return {}
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    return {"session_options": options}
+
+
+def export_dir(model_name):
+    return os.path.join(ONNX_MODELS, re.sub(r"[^\w.-]+", "_", model_name))
+
+
+def prepare(model_name, backend, threads=None):
+    """Export the ONNX graph (and int8 variant) for a backend if not done yet; returns the path to load"""
+    if backend == "torch":
+        return model_name
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    path = export_dir(model_name)
+    if not os.path.exists(os.path.join(path, ONNX_FILE)):
+        print(f"🔧 Exporting {model_name} to ONNX in {path}...")
+        # Uses the repo's own model.onnx when it ships one, else exports from the PyTorch weights
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=onnx_kwargs(threads))
+        model.save(path)
+    if backend == "onnx-int8" and not os.path.exists(os.path.join(path, INT8_FILE)):
+        print(f"🔧 Quantizing {model_name} to int8 ({int8_config()}) in {path}...")
+        model = SentenceTransformer(path, device="cpu", backend="onnx",
+                                    model_kwargs={"file_name": ONNX_FILE, **onnx_kwargs(threads)})
+        export_dynamic_quantized_onnx_model(model, int8_config(), path, file_suffix="qint8")
+    return path
+
+
+def load_model(model_name, backend="torch", threads=None):
+    """SentenceTransformer for model_name on the given backend; threads caps intra-op threads"""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        file_name = ONNX_FILE if backend == "onnx" else INT8_FILE
+        return SentenceTransformer(prepare(model_name, backend, threads), device="cpu", backend="onnx",
+                                   model_kwargs={"file_name": file_name, **onnx_kwargs(threads)})
+    raise ValueError(f"Unknown embedding backend {backend!r} (choose from {', '.join(BACKENDS)})")
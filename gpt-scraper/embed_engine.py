@@ -0,0 +1,116 @@
+"""Multi-process, length-bucketed sentence embedding for CPU indexing runs.
+
+SentenceTransformer.encode() in one process runs one batch at a time on
+torch's intra-op threads, which leave most cores idle on BERT-sized
+batches, and a fixed batch_size pads every chunk to the longest one in
+its batch. EmbeddingEngine.encode() takes the same texts and returns the
+same vectors, but:
+
+- measures every text in tokens with one batch call to the fast tokenizer
+  and sorts by length, so each batch holds chunks of similar length;
+- sizes each batch to a padded-token budget (batch size x longest chunk)
+  rather than a fixed count: many short chunks or a few long ones;
+- sends the batches to a pool of worker processes, each with its own
+  copy of the model and an even share of the cores as torch (or ONNX
+  Runtime) threads.
+
+Workers use the spawn start method: forking a process that has already
+started torch's thread pools can deadlock. With workers=0 batches are
+encoded in the calling process, still bucketed, which is the better
+choice on a GPU.
+"""
+
+import copy
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+import numpy as np
+
+TOKENS_PER_BATCH = 8192  # Padded tokens per forward pass (32 full 256-token chunks)
+MAX_BATCH = 256  # Cap on texts per batch however short they are
+
+worker_model = None
+
+
+def init_worker(model_name, threads, backend):
+    """Process pool initializer: load the model once and take a share of the cores"""
+    global worker_model
+    from embed_backends import load_model
+
+    worker_model = load_model(model_name, backend, threads)
+
+
+def encode_batch(texts):
+    return worker_model.encode(texts, batch_size=len(texts), show_progress_bar=False, convert_to_numpy=True)
+
+
+class EmbeddingEngine:
+    def __init__(self, model, model_name, workers=None, tokens_per_batch=TOKENS_PER_BATCH, backend="torch"):
+        """model: the loaded SentenceTransformer (tokenizer, dimension, in-process encoding);
+        workers load model_name on the same backend (see embed_backends.py)"""
+        self.model = model
+        self.tokens_per_batch = tokens_per_batch
+        self.max_length = getattr(model, "max_seq_length", None) or 512
+        tokenizer = getattr(model, "tokenizer", None)
+        # Own copy, like chunker.py: a Rust tokenizer cannot be used from two threads at once
+        self.tokenizer = copy.deepcopy(tokenizer) if getattr(tokenizer, "is_fast", False) else None
+        self.lock = Lock()
+        cores = os.cpu_count() or 1
+        self.workers = cores if workers is None else workers
+        self.pool = None
+        if self.workers:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=init_worker,
+                                            initargs=(model_name, max(1, cores // self.workers), backend))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def token_lengths(self, texts):
+        """Tokens each text is encoded with, special tokens included, capped at max_seq_length"""
+        if self.tokenizer is None:
+            lengths = [len(text.split()) + 2 for text in texts]
+        else:
+            with self.lock:
+                encoded = self.tokenizer(texts, return_attention_mask=False, return_token_type_ids=False,
+                                         verbose=False)
+            lengths = [len(ids) for ids in encoded["input_ids"]]
+        return [min(length, self.max_length) for length in lengths]
+
+    def batches(self, texts):
+        """Index lists, shortest texts first, each within the padded-token budget"""
+        lengths = self.token_lengths(texts)
+        order = sorted(range(len(texts)), key=lengths.__getitem__)
+        batches = []
+        current = []
+        for i in order:
+            # Sorted ascending, so the newest text is the longest in the batch
+            if current and (len(current) >= MAX_BATCH or (len(current) + 1) * lengths[i] > self.tokens_per_batch):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False):
+        """Vectors for texts, in input order; batch_size and show_progress_bar are accepted for
+        compatibility with SentenceTransformer.encode and ignored (the token budget sizes batches)"""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        batches = self.batches(texts)
+        if self.pool is None:
+            results = [self.model.encode([texts[i] for i in batch], batch_size=len(batch), show_progress_bar=False,
+                                         convert_to_numpy=True) for batch in batches]
+        else:
+            results = self.pool.map(encode_batch, [[texts[i] for i in batch] for batch in batches])
+        out = None
+        for batch, vectors in zip(batches, results):
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+            out[batch] = vectors
+        return out
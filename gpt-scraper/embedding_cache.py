@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# embedding_cache.py - content-addressed cache of chunk embeddings, so identical chunks are encoded once
+
+"""Local cache of embedding vectors keyed by chunk text and model.
+
+The key is SHA-256 of the model name and the normalized chunk text, not
+the URL, so a boilerplate chunk repeated on thousands of pages, or an
+unchanged chunk after a recrawl, re-chunk or switch of destination, is
+encoded once and then read back.
+
+Each model gets a directory under embedding_cache/ with three files:
+vectors.f32 (float32 rows, appended), keys.bin (the 32-byte key of each
+row, appended in the same order) and meta.json (model name, dimension).
+On open, vectors.f32 is memory-mapped and the first 8 bytes of every key
+are sorted into a NumPy index, so a batch of lookups is one
+searchsorted call, confirmed against the full key. Rows added during a
+run are held in memory only until the next commit(), which merges them
+into the mapped vectors and the sorted index.
+
+Vectors are appended before their keys and commit() fsyncs both, so a
+crash leaves at most some unreferenced rows or a partial key, which the
+next open trims to the shorter of the two files.
+
+    python embedding_cache.py stats
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from threading import Lock
+
+import numpy as np
+
+from text_normalize import clean_text
+
+EMBEDDING_CACHE = "embedding_cache"
+KEY_SIZE = 32
+VECTOR_DTYPE = np.float32
+
+
+def _prefixes(keys):
+    """First 8 bytes of each key as one uint64, the sorted part of the index"""
+    return np.ascontiguousarray(keys[:, :8]).view("<u8").ravel()
+
+
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{clean_text(text)}".encode("utf-8")).digest()
+
+
+def model_dir(path, model_name):
+    return os.path.join(path, re.sub(r"[^\w.-]+", "_", model_name))
+
+
+class EmbeddingCache:
+    def __init__(self, model_name, dim, path=EMBEDDING_CACHE):
+        self.model_name = model_name
+        self.dim = dim
+        self.path = model_dir(path, model_name)
+        self.lock = Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.encoded = 0  # Vectors computed and added (a text repeated in one batch counts once)
+        os.makedirs(self.path, exist_ok=True)
+
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["dim"] != dim:
+                raise ValueError(f"{self.path} holds {meta['dim']}-d vectors, model gives {dim}-d")
+        else:
+            with open(meta_path, "w") as f:
+                json.dump({"model": model_name, "dim": dim}, f)
+        self._open()
+
+    def _open(self):
+        vectors_path = os.path.join(self.path, "vectors.f32")
+        keys_path = os.path.join(self.path, "keys.bin")
+        row_bytes = self.dim * np.dtype(VECTOR_DTYPE).itemsize
+        sizes = [os.path.getsize(p) if os.path.exists(p) else 0 for p in (vectors_path, keys_path)]
+        rows = min(sizes[0] // row_bytes, sizes[1] // KEY_SIZE)
+
+        self.vector_file = open(vectors_path, "ab")
+        self.key_file = open(keys_path, "ab")
+        # Trim whatever a crash left beyond the last complete row
+        self.vector_file.truncate(rows * row_bytes)
+        self.key_file.truncate(rows * KEY_SIZE)
+
+        self.vectors = self._map(rows)
+        if rows:
+            self.keys = np.fromfile(keys_path, dtype=np.uint8, count=rows * KEY_SIZE).reshape(rows, KEY_SIZE)
+        else:
+            self.keys = np.zeros((0, KEY_SIZE), dtype=np.uint8)
+        prefixes = _prefixes(self.keys)
+        self.order = np.argsort(prefixes, kind="stable")
+        self.sorted_prefixes = prefixes[self.order]
+        self.pending = {}  # key -> vector added since the last commit(), in file order
+
+    def _map(self, rows):
+        if not rows:
+            return np.zeros((0, self.dim), dtype=VECTOR_DTYPE)
+        return np.memmap(os.path.join(self.path, "vectors.f32"), dtype=VECTOR_DTYPE, mode="r",
+                         shape=(rows, self.dim))
+
+    def _merge_pending(self):
+        """Move committed pending rows into the mapped vectors and the sorted index"""
+        start = len(self.keys)
+        new_keys = np.frombuffer(b"".join(self.pending), dtype=np.uint8).reshape(len(self.pending), KEY_SIZE)
+        new_prefixes = _prefixes(new_keys)
+        new_order = np.argsort(new_prefixes, kind="stable")
+        new_prefixes = new_prefixes[new_order]
+        # Insert after equal prefixes, so the index stays as a stable sort of all rows would order it
+        positions = np.searchsorted(self.sorted_prefixes, new_prefixes, side="right")
+        self.sorted_prefixes = np.insert(self.sorted_prefixes, positions, new_prefixes)
+        self.order = np.insert(self.order, positions, new_order + start)
+        self.keys = np.concatenate([self.keys, new_keys])
+        self.vectors = self._map(len(self.keys))
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
+
+    def _find(self, keys):
+        """Row index in the mmapped vectors for each key, or -1"""
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not len(self.keys) or not keys:
+            return rows
+        wanted = np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), KEY_SIZE)
+        prefixes = np.ascontiguousarray(wanted[:, :8]).view("<u8").ravel()
+        positions = np.searchsorted(self.sorted_prefixes, prefixes)
+        found = positions < len(self.sorted_prefixes)
+        candidates = self.order[np.minimum(positions, len(self.order) - 1)]
+        found &= (self.keys[candidates] == wanted).all(axis=1)
+        rows[found] = candidates[found]
+        return rows
+
+    def lookup(self, texts):
+        """(keys, vectors) for the texts; vectors[i] is None on a miss"""
+        keys = [cache_key(self.model_name, text) for text in texts]
+        with self.lock:
+            rows = self._find(keys)
+            vectors = []
+            for key, row in zip(keys, rows):
+                if row >= 0:
+                    vectors.append(self.vectors[row])
+                else:
+                    vectors.append(self.pending.get(key))
+            self.lookups += len(keys)
+            self.hits += sum(vector is not None for vector in vectors)
+        return keys, vectors
+
+    def put(self, keys, vectors):
+        """Add freshly computed vectors (durable after commit())"""
+        vectors = np.asarray(vectors, dtype=VECTOR_DTYPE).reshape(len(keys), self.dim)
+        with self.lock:
+            new = [i for i, key in enumerate(keys) if key not in self.pending]
+            new = [i for i, row in zip(new, self._find([keys[i] for i in new])) if row < 0]
+            self.encoded += len(new)
+            if not new:
+                return
+            for i in new:
+                self.pending[keys[i]] = vectors[i].copy()
+            self.vector_file.write(vectors[new].tobytes())
+            self.key_file.write(b"".join(keys[i] for i in new))
+
+    def commit(self):
+        with self.lock:
+            for f in (self.vector_file, self.key_file):
+                f.flush()
+                os.fsync(f.fileno())
+            if self.pending:
+                self._merge_pending()
+
+    def close(self):
+        self.commit()
+        with self.lock:
+            self.vector_file.close()
+            self.key_file.close()
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+def encode_cached(model, cache, texts, **encode_args):
+    """model.encode(texts) through the cache: only misses are encoded, each distinct text once"""
+    keys, vectors = cache.lookup(texts)
+    missing = {}  # key -> text, first occurrence only
+    for key, text, vector in zip(keys, texts, vectors):
+        if vector is None and key not in missing:
+            missing[key] = text
+    if missing:
+        computed = model.encode(list(missing.values()), **encode_args)
+        computed = np.asarray(computed, dtype=VECTOR_DTYPE)
+        cache.put(list(missing), computed)
+        by_key = dict(zip(missing, computed))
+        vectors = [by_key[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+    return np.stack(vectors) if vectors else np.zeros((0, cache.dim), dtype=VECTOR_DTYPE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the embedding cache")
+    parser.add_argument('--cache', default=EMBEDDING_CACHE, help='Embedding cache directory')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+    subparsers.add_parser('stats', help='Show cached vectors per model')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    if not os.path.isdir(args.cache):
+        print(f"❌ No embedding cache at {args.cache}")
+        return False
+    for name in sorted(os.listdir(args.cache)):
+        meta_path = os.path.join(args.cache, name, "meta.json")
+        if not os.path.exists(meta_path):
+            continue
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        keys_path = os.path.join(args.cache, name, "keys.bin")
+        rows = os.path.getsize(keys_path) // KEY_SIZE if os.path.exists(keys_path) else 0
+        size = sum(os.path.getsize(os.path.join(args.cache, name, f)) for f in os.listdir(os.path.join(args.cache, name)))
+        print(f"📊 {meta['model']}: {rows} vectors of {meta['dim']} floats, {size / 1e6:.1f} MB")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,105 @@
+"""Pluggable HTML extraction backends for the crawler.
+
+Each backend parses a page once and returns (text, links): the text of
+the main content with <nav>, <header>, <footer>, <script>, <style> and
+similar regions removed, and every <a href> on the page resolved against
+the page URL. Links are taken from the whole document, because menus are
+how the crawler finds most pages, even though their text is dropped.
+
+Backends, fastest first: selectolax, lxml, bs4 (html.parser). "auto"
+picks the first one that is installed.
+"""
+
+from urllib.parse import urljoin
+
+BOILERPLATE_TAGS = ("nav", "header", "footer", "script", "style", "noscript", "template", "iframe", "svg")
+MAIN_SELECTORS = ("main", "[role=main]", "article")
+
+
+def extract_selectolax(url, html):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    links = [urljoin(url, a.attributes["href"]) for a in tree.css("a[href]") if a.attributes.get("href")]
+    tree.strip_tags(list(BOILERPLATE_TAGS))
+    root = None
+    for selector in MAIN_SELECTORS:
+        root = tree.css_first(selector)
+        if root is not None:
+            break
+    root = root or tree.body or tree.root
+    text = root.text(separator="\n", strip=True) if root is not None else ""
+    return text, links
+
+
+def extract_lxml(url, html):
+    import lxml.html
+    from lxml import etree
+
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        return "", []
+    main = doc.find(".//main")
+    if main is None:
+        main = next(iter(doc.xpath("//*[@role='main'] | //article")), None)
+    root = main if main is not None else doc
+
+    # One walk over the content root for text, skipping boilerplate subtrees
+    parts = []
+    skip = 0
+    for event, el in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+        tag = el.tag if isinstance(el.tag, str) else ""
+        if event in ("comment", "pi"):
+            if not skip and el.tail:
+                parts.append(el.tail)
+        elif event == "start":
+            if tag in BOILERPLATE_TAGS:
+                skip += 1
+            elif not skip and tag and el.text:
+                parts.append(el.text)
+        else:
+            if tag in BOILERPLATE_TAGS:
+                skip -= 1
+            if not skip and el is not root and el.tail:
+                parts.append(el.tail)
+    text = "\n".join(s for s in (p.strip() for p in parts) if s)
+
+    links = [urljoin(url, href) for href in doc.xpath("//a/@href") if href]
+    return text, links
+
+
+def extract_bs4(url, html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(url, a['href']) for a in soup.find_all("a", href=True)]
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find(attrs={"role": "main"}) or soup.find("article") or soup
+    text = root.get_text(separator="\n", strip=True)
+    return text, links
+
+
+BACKENDS = {
+    "selectolax": ("selectolax.lexbor", extract_selectolax),
+    "lxml": ("lxml.html", extract_lxml),
+    "bs4": ("bs4", extract_bs4),
+}
+
+
+def get_extractor(name="auto"):
+    """Return the extract(url, html) -> (text, links) function for a backend"""
+    import importlib
+
+    names = list(BACKENDS) if name == "auto" else [name]
+    for candidate in names:
+        module, extractor = BACKENDS[candidate]
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            if name != "auto":
+                raise
+            continue
+        return candidate, extractor
+    raise ImportError("No HTML extraction backend installed (pip install selectolax, lxml or beautifulsoup4)")
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# frontier.py - durable crawl frontier backed by SQLite in WAL mode
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from threading import Lock
+
+from url_canon import canonicalize
+
+FRONTIER_DB = "frontier.db"
+SCRAPED_FILE = "scraped_urls.txt"  # Pre-frontier crawl state, imported into a new frontier.db
+QUEUE_FILE = "queued_urls.txt"
+
+QUEUED = "queued"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    file_index INTEGER,
+    updated_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    fetched_at REAL,
+    simhash INTEGER,
+    alias_of TEXT
+);
+CREATE INDEX IF NOT EXISTS urls_by_status ON urls(status);
+"""
+
+# Columns added after the first release; older databases get them on open
+MIGRATIONS = {
+    "etag": "ALTER TABLE urls ADD COLUMN etag TEXT",
+    "last_modified": "ALTER TABLE urls ADD COLUMN last_modified TEXT",
+    "content_hash": "ALTER TABLE urls ADD COLUMN content_hash TEXT",
+    "fetched_at": "ALTER TABLE urls ADD COLUMN fetched_at REAL",
+    "simhash": "ALTER TABLE urls ADD COLUMN simhash INTEGER",
+    "alias_of": "ALTER TABLE urls ADD COLUMN alias_of TEXT",
+}
+
+
+def _signed64(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value is not None and value >= 1 << 63 else value
+
+
+class Frontier:
+    """Per-URL crawl state (queued/in_flight/done/failed) with O(1) transitions.
+
+    Every transition is its own small WAL transaction, so there is no
+    periodic full rewrite and a crash loses at most the in-flight URLs,
+    which resume() puts back in the queue.
+    """
+
+    def __init__(self, path=FRONTIER_DB):
+        self.path = path
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(urls)")}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self.conn.execute(statement)
+
+    def close(self):
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+    def enqueue(self, urls):
+        """Add URLs not seen before as queued; returns the ones that were new"""
+        added = []
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for url in urls:
+                    cur = self.conn.execute(
+                        "INSERT OR IGNORE INTO urls (url, status, updated_at) VALUES (?, ?, ?)",
+                        (url, QUEUED, now),
+                    )
+                    if cur.rowcount:
+                        added.append(url)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def claim(self, url):
+        """Mark a queued URL in flight and count the attempt; False if it is not queued"""
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE urls SET status = ?, attempts = attempts + 1, updated_at = ? WHERE url = ? AND status = ?",
+                (IN_FLIGHT, time.time(), url, QUEUED),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, url, file_index=None, etag=None, last_modified=None, content_hash=None, simhash=None):
+        """Mark a URL done, recording its page index and the validators for conditional recrawls
+
+        Storing a page (file_index given) clears any earlier alias.
+        """
+        with self.lock:
+            self.conn.execute(
+                "UPDATE urls SET status = ?, file_index = COALESCE(?, file_index), etag = COALESCE(?, etag),"
+                " last_modified = COALESCE(?, last_modified), content_hash = COALESCE(?, content_hash),"
+                " simhash = COALESCE(?, simhash), alias_of = CASE WHEN ? IS NULL THEN alias_of END,"
+                " fetched_at = ?, updated_at = ? WHERE url = ?",
+                (DONE, file_index, etag, last_modified, content_hash, _signed64(simhash), file_index,
+                 time.time(), time.time(), url),
+            )
+
+    def complete_alias(self, url, alias_of, etag=None, last_modified=None, content_hash=None, simhash=None):
+        """Mark a URL done as a near-duplicate of an already stored page (no page file of its own)"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE urls SET status = ?, alias_of = ?, etag = COALESCE(?, etag),"
+                " last_modified = COALESCE(?, last_modified), content_hash = ?, simhash = ?,"
+                " fetched_at = ?, updated_at = ? WHERE url = ?",
+                (DONE, alias_of, etag, last_modified, content_hash, _signed64(simhash),
+                 time.time(), time.time(), url),
+            )
+
+    def update_content(self, url, content_hash, simhash=None):
+        """Record re-extracted text of a stored page without touching its fetch state"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE urls SET content_hash = ?, simhash = ?, updated_at = ? WHERE url = ?",
+                (content_hash, _signed64(simhash), time.time(), url),
+            )
+
+    def fail(self, url):
+        self._set_status(url, FAILED)
+
+    def requeue(self, url):
+        self._set_status(url, QUEUED)
+
+    def _set_status(self, url, status, file_index=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE urls SET status = ?, file_index = COALESCE(?, file_index), updated_at = ? WHERE url = ?",
+                (status, file_index, time.time(), url),
+            )
+
+    def get(self, url):
+        """The URL's row as a dict, or None"""
+        with self.lock:
+            cur = self.conn.execute("SELECT * FROM urls WHERE url = ?", (url,))
+            row = cur.fetchone()
+            if row is None:
+                return None
+            return dict(zip((d[0] for d in cur.description), row))
+
+    def requeue_done(self, url):
+        """Queue a done URL again for a recrawl; False if it is not done"""
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE urls SET status = ?, attempts = 0, updated_at = ? WHERE url = ? AND status = ?",
+                (QUEUED, time.time(), url, DONE),
+            )
+            return cur.rowcount == 1
+
+    def iter_done(self):
+        """Stream (url, file_index, fetched_at, alias_of) for every done URL on a separate read connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            yield from conn.execute(
+                "SELECT url, file_index, fetched_at, alias_of FROM urls WHERE status = ?", (DONE,)
+            )
+        finally:
+            conn.close()
+
+    def iter_fingerprints(self):
+        """Stream (url, simhash) for every stored page that has a fingerprint"""
+        conn = sqlite3.connect(self.path)
+        try:
+            for url, simhash in conn.execute(
+                "SELECT url, simhash FROM urls WHERE status = ? AND alias_of IS NULL AND simhash IS NOT NULL",
+                (DONE,),
+            ):
+                yield url, simhash & 0xFFFFFFFFFFFFFFFF
+        finally:
+            conn.close()
+
+    def alias_count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM urls WHERE alias_of IS NOT NULL").fetchone()[0]
+
+    def set_file_indexes(self, pairs):
+        """Backfill (url, file_index) for imported URLs that have no page index yet"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                cur = self.conn.executemany(
+                    "UPDATE urls SET file_index = ? WHERE url = ? AND file_index IS NULL",
+                    ((index, url) for url, index in pairs),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount
+
+    def attempts(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT attempts FROM urls WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else 0
+
+    def resume(self):
+        """Return in-flight URLs from an interrupted run to the queue and list everything queued"""
+        with self.lock:
+            self.conn.execute("UPDATE urls SET status = ? WHERE status = ?", (QUEUED, IN_FLIGHT))
+            rows = self.conn.execute("SELECT url FROM urls WHERE status = ?", (QUEUED,)).fetchall()
+        return [row[0] for row in rows]
+
+    def iter_status(self, status):
+        """Stream the URLs with a status on a separate read connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            for (url,) in conn.execute("SELECT url FROM urls WHERE status = ?", (status,)):
+                yield url
+        finally:
+            conn.close()
+
+    def drop_queued(self, urls):
+        """Forget queued URLs (a later crawl may discover them again); returns how many were removed"""
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                cur = self.conn.executemany("DELETE FROM urls WHERE url = ? AND status = ?",
+                                            ((url, QUEUED) for url in urls))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount
+
+    def iter_urls(self):
+        """Stream every known URL on a separate read connection (no full list in memory)"""
+        conn = sqlite3.connect(self.path)
+        try:
+            for (url,) in conn.execute("SELECT url FROM urls"):
+                yield url
+        finally:
+            conn.close()
+
+    def total(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall()
+        counts = {QUEUED: 0, IN_FLIGHT: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return counts
+
+    def next_file_index(self):
+        """First utm_pages index not used yet (imported URLs count even without an index; aliases do not)"""
+        with self.lock:
+            max_index, done = self.conn.execute(
+                "SELECT MAX(file_index), SUM(status = ? AND alias_of IS NULL) FROM urls", (DONE,)
+            ).fetchone()
+        return max((max_index + 1) if max_index is not None else 0, done or 0)
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM urls LIMIT 1").fetchone() is None
+
+    def import_text_files(self, scraped_file, queue_file):
+        """One-time import of the old scraped_urls.txt / queued_urls.txt state, canonicalized as the crawler does"""
+        now = time.time()
+        counts = {}
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for filename, status in ((scraped_file, DONE), (queue_file, QUEUED)):
+                    if not os.path.exists(filename):
+                        continue
+                    with open(filename, "r") as f:
+                        urls = [(canonicalize(line), status, now) for line in f if line.strip()]
+                    cur = self.conn.executemany(
+                        "INSERT OR IGNORE INTO urls (url, status, updated_at) VALUES (?, ?, ?)", urls
+                    )
+                    counts[status] = cur.rowcount
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return counts
+
+    def export(self, status, filename):
+        """Write all URLs with a status to a text file, one per line"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT url FROM urls WHERE status = ? ORDER BY url", (status,)
+            ).fetchall()
+        with open(filename, "w") as f:
+            for (url,) in rows:
+                f.write(url + "\n")
+        return len(rows)
+
+
+def open_frontier(path=FRONTIER_DB, scraped_file=SCRAPED_FILE, queue_file=QUEUE_FILE):
+    """Open the frontier; a new one first imports the old text files"""
+    frontier = Frontier(path)
+    if frontier.is_empty():
+        imported = frontier.import_text_files(scraped_file, queue_file)
+        if imported:
+            print(f"📥 Imported {imported.get(DONE, 0)} scraped and {imported.get(QUEUED, 0)} queued URLs into {path}")
+    return frontier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export the crawl frontier")
+    parser.add_argument('--db', default=FRONTIER_DB, help='Frontier database path')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    subparsers.add_parser('stats', help='Show URL counts per status')
+
+    export_parser = subparsers.add_parser('export', help='Write URLs with a status to a text file')
+    export_parser.add_argument('status', choices=[QUEUED, IN_FLIGHT, DONE, FAILED])
+    export_parser.add_argument('filename', help='Output file (e.g. queued_urls.txt)')
+
+    import_parser = subparsers.add_parser('import', help='Import scraped/queued URL text files')
+    import_parser.add_argument('--scraped', default=SCRAPED_FILE)
+    import_parser.add_argument('--queued', default=QUEUE_FILE)
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    frontier = Frontier(args.db)
+    if args.command == 'stats':
+        for status, count in frontier.counts().items():
+            print(f"📊 {status}: {count}")
+        print(f"📊 near-duplicate aliases: {frontier.alias_count()}")
+    elif args.command == 'export':
+        count = frontier.export(args.status, args.filename)
+        print(f"✅ Wrote {count} {args.status} URLs to {args.filename}")
+    elif args.command == 'import':
+        counts = frontier.import_text_files(args.scraped, args.queued)
+        print(f"✅ Imported {counts.get(DONE, 0)} scraped and {counts.get(QUEUED, 0)} queued URLs")
+    frontier.close()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,184 @@
+"""Host-sharded crawl frontier with per-host politeness.
+
+Every netloc gets its own URL queue, token bucket and concurrency limit.
+Limits grow additively while a host answers normally and are halved when
+it returns 429/5xx or times out (AIMD), so each host is crawled at its own
+safe maximum instead of one global sleep for everyone.
+"""
+
+import heapq
+import itertools
+from collections import deque
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from time import monotonic, time
+from urllib.parse import urlparse
+
+INITIAL_RATE = 4.0  # requests/sec per host to start with
+MIN_RATE = 0.2
+MAX_RATE = 50.0
+RATE_STEP = 0.5  # added to the rate after each healthy response window
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+BURST = 4  # token bucket size
+DEFAULT_BACKOFF = 5.0  # seconds to pause a host when no Retry-After is given
+MAX_BACKOFF = 300.0
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (now if now is not None else time()))
+
+
+class HostState:
+    def __init__(self):
+        self.queue = deque()
+        self.delayed = []  # heap of (ready_at, seq, url)
+        self.in_flight = 0
+        self.rate = INITIAL_RATE
+        self.limit = float(INITIAL_CONCURRENCY)
+        self.tokens = float(BURST)
+        self.last_refill = monotonic()
+        self.paused_until = 0.0
+        self.backoffs = 0
+
+    def refill(self, now):
+        self.tokens = min(BURST, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def promote_delayed(self, now):
+        while self.delayed and self.delayed[0][0] <= now:
+            self.queue.append(heapq.heappop(self.delayed)[2])
+
+    def has_work(self):
+        return bool(self.queue or self.delayed)
+
+    def ready_in(self, now):
+        """Seconds until this host may start another request (inf if blocked on in-flight work)"""
+        self.promote_delayed(now)
+        if not self.queue:
+            return self.delayed[0][0] - now if self.delayed else float('inf')
+        if self.in_flight >= int(self.limit):
+            return float('inf')
+        self.refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+
+class HostScheduler:
+    """Thread-safe frontier that hands out URLs only when their host is ready"""
+
+    def __init__(self):
+        self.hosts = {}
+        self.lock = Lock()
+        self.seq = itertools.count()
+        self.pending = 0
+        self.in_flight = 0
+
+    def _host(self, url):
+        netloc = urlparse(url).netloc
+        state = self.hosts.get(netloc)
+        if state is None:
+            state = self.hosts[netloc] = HostState()
+        return state
+
+    def push(self, url, delay=0.0):
+        """Queue a URL, optionally not before `delay` seconds from now"""
+        with self.lock:
+            state = self._host(url)
+            if delay > 0:
+                heapq.heappush(state.delayed, (monotonic() + delay, next(self.seq), url))
+            else:
+                state.queue.append(url)
+            self.pending += 1
+
+    def next_ready(self):
+        """Claim a URL whose host is ready.
+
+        Returns (url, 0) on success, or (None, wait) where wait is how long
+        until some host could become ready (inf if only in-flight work remains).
+        """
+        with self.lock:
+            now = monotonic()
+            best_wait = float('inf')
+            for state in self.hosts.values():
+                if not state.has_work():
+                    continue
+                wait = state.ready_in(now)
+                if wait <= 0:
+                    url = state.queue.popleft()
+                    state.tokens -= 1
+                    state.in_flight += 1
+                    self.pending -= 1
+                    self.in_flight += 1
+                    return url, 0.0
+                best_wait = min(best_wait, wait)
+            return None, best_wait
+
+    def complete(self, url):
+        """Release a URL's slot after a healthy response and grow the host's limits"""
+        with self.lock:
+            state = self._host(url)
+            state.in_flight -= 1
+            self.in_flight -= 1
+            state.limit = min(MAX_CONCURRENCY, state.limit + 1 / state.limit)
+            state.rate = min(MAX_RATE, state.rate + RATE_STEP / max(state.rate, 1.0))
+            state.backoffs = 0
+
+    def backoff(self, url, retry_after=None, requeue=True):
+        """Release a URL's slot after a 429/5xx/timeout, halve the host's limits and pause it.
+
+        With requeue the URL is queued again for when the pause ends. The
+        re-queue happens under the same lock as the release so the frontier
+        never looks idle in between. Returns the pause in seconds.
+        """
+        with self.lock:
+            state = self._host(url)
+            state.in_flight -= 1
+            self.in_flight -= 1
+            state.limit = max(MIN_CONCURRENCY, state.limit / 2)
+            state.rate = max(MIN_RATE, state.rate / 2)
+            state.backoffs += 1
+            if retry_after is None:
+                retry_after = min(MAX_BACKOFF, DEFAULT_BACKOFF * 2 ** (state.backoffs - 1))
+            retry_after = min(MAX_BACKOFF, retry_after)
+            state.paused_until = max(state.paused_until, monotonic() + retry_after)
+            state.tokens = min(state.tokens, 0.0)
+            if requeue:
+                heapq.heappush(state.delayed, (state.paused_until, next(self.seq), url))
+                self.pending += 1
+            return retry_after
+
+    def release(self, url):
+        """Release a URL's slot without changing the host's limits (e.g. 404, non-HTML)"""
+        with self.lock:
+            self._host(url).in_flight -= 1
+            self.in_flight -= 1
+
+    def is_idle(self):
+        with self.lock:
+            return self.pending == 0 and self.in_flight == 0
+
+    def stats(self):
+        """Per-host (queued, in_flight, concurrency limit, rate) for status lines"""
+        with self.lock:
+            return {
+                netloc: (len(s.queue) + len(s.delayed), s.in_flight, int(s.limit), round(s.rate, 2))
+                for netloc, s in self.hosts.items()
+            }
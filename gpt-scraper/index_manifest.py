@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# index_manifest.py - what is indexed per URL, so re-indexing only touches new, changed and removed pages
+
+"""Manifest of indexed pages, keyed by canonical URL (url_canon), so a page
+file from before URLs were canonicalized and its recrawl are one page.
+
+Each row holds the content hash of the page text that was indexed, the
+indexing config (model, backend and chunk sizes; a change re-indexes
+every page) and the ids of the chunk rows the page has in the sink.
+
+plan_reindex() diffs the corpus against it, using the hashes page_store
+keeps in its record headers (no text is decompressed), into:
+
+- work: new pages, and pages whose text or config changed, each with the
+  chunk ids it had (None if new); chunks that keep their id are not
+  uploaded again, and ids that disappear are deleted once the new
+  version is stored;
+- unchanged pages, which are skipped;
+- removed URLs, whose rows are deleted.
+
+Entries recorded under a raw URL by earlier versions are folded into
+their canonical URL's work item: their chunks count as the page's old
+rows, and their keys are dropped once it is recorded.
+
+This replaces the index into the sorted file list in
+last_processed_file.txt, which shifted whenever a file was added or
+renamed: a page is marked indexed only when all of its chunks are
+stored, whatever order pages finish in, so a restart simply re-plans.
+
+    python index_manifest.py stats
+    python index_manifest.py plan    # what the next run would do (content changes only)
+    python index_manifest.py show https://www.utm.utoronto.ca/
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+from threading import Lock
+
+from url_canon import canonicalize
+
+INDEX_MANIFEST = "index_manifest.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    config TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+"""
+
+Entry = namedtuple("Entry", ["url", "content_hash", "config", "chunk_ids"])
+WorkItem = namedtuple("WorkItem", ["page_id", "url", "content_hash", "old_ids", "old_config", "old_urls"])
+
+
+class IndexManifest:
+    def __init__(self, path=INDEX_MANIFEST):
+        self.path = path
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT url, content_hash, config, chunk_ids FROM pages WHERE url = ?",
+                                    (url,)).fetchone()
+        return None if row is None else Entry(*row[:3], json.loads(row[3]))
+
+    def entries(self):
+        """url -> Entry for every indexed page"""
+        with self.lock:
+            rows = self.conn.execute("SELECT url, content_hash, config, chunk_ids FROM pages").fetchall()
+        return {row[0]: Entry(*row[:3], json.loads(row[3])) for row in rows}
+
+    def record(self, entries):
+        """Mark pages indexed (replacing earlier versions), in one transaction"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO pages (url, content_hash, config, chunk_ids, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(e.url, e.content_hash, e.config, json.dumps(e.chunk_ids), now) for e in entries],
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def remove(self, urls):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url in urls])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+
+def plan_reindex(manifest, corpus, config=None):
+    """Diff the corpus against the manifest; returns (work, unchanged count, removed entries).
+
+    config=None compares content only. Pages are compared by canonical URL;
+    one stored under several page ids (or spellings of its URL) is taken
+    from the highest id, the latest crawl of it. old_urls lists the other
+    manifest keys the page replaces.
+    """
+    latest = {}
+    for header in corpus.iter_headers():
+        if header.url:
+            latest[canonicalize(header.url)] = header
+    indexed = {}
+    for url, entry in manifest.entries().items():
+        indexed.setdefault(canonicalize(url), []).append(entry)
+    work = []
+    unchanged = 0
+    for url, header in latest.items():
+        entries = indexed.get(url, [])
+        if (len(entries) == 1 and entries[0].url == url and entries[0].content_hash == header.content_hash
+                and config in (None, entries[0].config)):
+            unchanged += 1
+            continue
+        old_ids = list(dict.fromkeys(row_id for entry in entries for row_id in entry.chunk_ids)) if entries else None
+        configs = {entry.config for entry in entries}
+        work.append(WorkItem(header.id, url, header.content_hash, old_ids,
+                             configs.pop() if len(configs) == 1 else None,
+                             [entry.url for entry in entries if entry.url != url]))
+    work.sort(key=lambda item: item.page_id)
+    removed = [entry for url, entries in indexed.items() if url not in latest for entry in entries]
+    return work, unchanged, removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the index manifest")
+    parser.add_argument('--manifest', default=INDEX_MANIFEST, help='Manifest database')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+    subparsers.add_parser('stats', help='Show indexed pages and chunks')
+    plan_parser = subparsers.add_parser('plan', help='Diff the corpus against the manifest')
+    plan_parser.add_argument('--corpus', default=None,
+                             help='Page store or utm_pages directory (default: whichever exists)')
+    show_parser = subparsers.add_parser('show', help='Print the entry for a URL')
+    show_parser.add_argument('url')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    manifest = IndexManifest(args.manifest)
+    success = True
+    if args.command == 'stats':
+        entries = manifest.entries()
+        configs = sorted({entry.config for entry in entries.values()})
+        print(f"📊 {len(entries)} pages, {sum(len(e.chunk_ids) for e in entries.values())} chunks indexed")
+        for config in configs:
+            print(f"   config {config}")
+    elif args.command == 'plan':
+        from page_store import open_corpus
+
+        corpus = open_corpus(args.corpus)
+        work, unchanged, removed = plan_reindex(manifest, corpus)
+        corpus.close()
+        changed = sum(1 for item in work if item.old_ids is not None)
+        print(f"📊 {len(work) - changed} new, {changed} changed, {unchanged} unchanged, {len(removed)} removed pages "
+              f"({sum(len(entry.chunk_ids) for entry in removed)} chunks to delete)")
+    elif args.command == 'show':
+        entry = manifest.get(canonicalize(args.url)) or manifest.get(args.url)
+        if entry is None:
+            print(f"❌ {args.url} is not indexed")
+            success = False
+        else:
+            print(f"🔗 {entry.url}\n   content {entry.content_hash}\n   config {entry.config}")
+            for chunk_id in entry.chunk_ids:
+                print(f"   {chunk_id}")
+    manifest.close()
+    return success
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
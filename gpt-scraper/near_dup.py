@@ -0,0 +1,119 @@
+"""SimHash fingerprints and a lookup index for near-duplicate pages.
+
+simhash() turns a page's text into a 64-bit fingerprint from weighted
+word 3-shingles; pages that share most of their shingles get fingerprints
+a few bits apart. SimHashIndex finds a stored fingerprint within
+max_distance bits by splitting the 64 bits into max_distance + 1 bands:
+two fingerprints that differ in at most that many bits must agree exactly
+on at least one band, so a lookup only compares against pages that share
+a band value instead of scanning every page.
+"""
+
+import hashlib
+import re
+from collections import Counter
+from threading import Lock
+
+SHINGLE_SIZE = 3
+MIN_TOKENS = 50  # Shorter pages are too small for a meaningful fingerprint
+DEFAULT_SIMILARITY = 0.95  # Fraction of the 64 fingerprint bits that must match
+
+WORD = re.compile(r"\w+")
+
+
+def simhash(text):
+    """64-bit SimHash of the text, or None if it has fewer than MIN_TOKENS words"""
+    tokens = WORD.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return None
+    shingles = Counter(" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1))
+
+    # Per-byte weight tables: 8 additions per shingle instead of 64 bit tests
+    tables = [[0] * 256 for _ in range(8)]
+    for shingle, weight in shingles.items():
+        digest = hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+        for position, value in enumerate(digest):
+            tables[position][value] += weight
+
+    total = sum(shingles.values())
+    out = bytearray(8)
+    for position, table in enumerate(tables):
+        for bit in range(8):
+            mask = 1 << bit
+            if 2 * sum(table[value] for value in range(256) if value & mask) > total:
+                out[position] |= mask
+    return int.from_bytes(out, "little")
+
+
+def max_distance(similarity):
+    """Largest Hamming distance between fingerprints that still counts as a near-duplicate"""
+    return max(0, min(63, int((1.0 - similarity) * 64)))
+
+
+class SimHashIndex:
+    """Fingerprints of stored pages keyed by URL, searchable by Hamming distance"""
+
+    def __init__(self, similarity=DEFAULT_SIMILARITY):
+        self.distance = max_distance(similarity)
+        bands = self.distance + 1
+        bounds = [64 * i // bands for i in range(bands + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.tables = [{} for _ in self.bands]
+        self.fingerprints = {}
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def _band_values(self, fingerprint):
+        return [(fingerprint >> shift) & mask for shift, mask in self.bands]
+
+    def _find(self, fingerprint):
+        for table, value in zip(self.tables, self._band_values(fingerprint)):
+            for key in table.get(value, ()):
+                if (self.fingerprints[key] ^ fingerprint).bit_count() <= self.distance:
+                    return key
+        return None
+
+    def _add(self, key, fingerprint):
+        self._remove(key)
+        self.fingerprints[key] = fingerprint
+        for table, value in zip(self.tables, self._band_values(fingerprint)):
+            table.setdefault(value, []).append(key)
+
+    def _remove(self, key):
+        fingerprint = self.fingerprints.pop(key, None)
+        if fingerprint is None:
+            return
+        for table, value in zip(self.tables, self._band_values(fingerprint)):
+            keys = table[value]
+            keys.remove(key)
+            if not keys:
+                del table[value]
+
+    def add(self, key, fingerprint):
+        """Index (or re-index) a stored page"""
+        with self.lock:
+            self._add(key, fingerprint)
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def find(self, fingerprint):
+        """Key of an indexed page within the distance, or None"""
+        with self.lock:
+            return self._find(fingerprint)
+
+    def claim(self, key, fingerprint):
+        """Return the key this page duplicates, or index it and return None.
+
+        The check and the insert are one step, so two near-identical pages
+        fetched at the same time cannot both be stored as originals.
+        """
+        with self.lock:
+            original = self._find(fingerprint)
+            if original is None or original == key:
+                self._add(key, fingerprint)
+                return None
+            return original
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# page_store.py - segmented, compressed page store with an offset index
+
+"""Append-only page store replacing one small .txt file per page.
+
+Layout of a store directory:
+  seg-00000.dat ...  records appended back to back, rolled at SEGMENT_SIZE
+  index.bin          one fixed 24-byte entry per page id: segment, offset,
+                     record length, 64-bit URL hash (length 0 = no page)
+
+A record is RECORD_HEADER (page id, url length, fetch time, sha256 of the
+text, compressed text length) followed by the URL and the zlib-compressed
+text. Segments are memory-mapped for reads, so random access by id or URL
+is one decompress, and a full scan is a few large sequential reads.
+Records are written before their index entry, so a crash leaves at worst
+some unreferenced bytes at the end of a segment.
+
+Page ids are the crawler's file indexes, so utm_pages/01234.txt imports
+as page 1234. open_corpus() gives downstream scripts the same interface
+over either a store or the old utm_pages directory.
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+from threading import Lock
+
+PAGE_STORE = "page_store"
+PAGES_FOLDER = "utm_pages"
+SEGMENT_SIZE = 64 * 1024 * 1024
+INDEX_FILE = "index.bin"
+
+RECORD_HEADER = struct.Struct("<IHd32sI")  # page_id, url_len, fetched_at, sha256, compressed_len
+INDEX_ENTRY = struct.Struct("<IQIQ")  # segment, offset, length, url_hash
+
+Page = namedtuple("Page", ["id", "url", "fetched_at", "content_hash", "text"])
+PageHeader = namedtuple("PageHeader", ["id", "url", "content_hash"])
+
+
+def url_hash(url):
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class PageStore:
+    def __init__(self, path=PAGE_STORE):
+        self.path = path
+        self.lock = Lock()
+        os.makedirs(path, exist_ok=True)
+        self.segments = array("I")
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.hashes = array("Q")
+        self.by_url = None  # url hash -> page id, built on first lookup
+        self.maps = {}
+        self._load_index()
+        self.active = max(self.segments) if len(self.segments) else 0
+        self.writer = open(self._segment_path(self.active), "ab")
+        index_path = os.path.join(path, INDEX_FILE)
+        self.index_file = open(index_path, "r+b" if os.path.exists(index_path) else "w+b")
+        self.index_file.truncate(len(self.lengths) * INDEX_ENTRY.size)  # drop a torn last entry
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"seg-{segment:05d}.dat")
+
+    def _load_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        sizes = {}
+        for page_id, (segment, offset, length, h) in enumerate(INDEX_ENTRY.iter_unpack(data[:usable])):
+            if length:
+                size = sizes.get(segment)
+                if size is None:
+                    seg_path = self._segment_path(segment)
+                    size = sizes[segment] = os.path.getsize(seg_path) if os.path.exists(seg_path) else 0
+                if offset + length > size:
+                    length = 0  # record never made it to disk
+            self.segments.append(segment)
+            self.offsets.append(offset)
+            self.lengths.append(length)
+            self.hashes.append(h)
+
+    def close(self):
+        with self.lock:
+            self.writer.close()
+            self.index_file.close()
+            for m in self.maps.values():
+                m.close()
+            self.maps.clear()
+
+    def __len__(self):
+        return sum(1 for length in self.lengths if length)
+
+    def ids(self):
+        """Page ids in ascending order"""
+        return [page_id for page_id, length in enumerate(self.lengths) if length]
+
+    def put(self, page_id, url, text, fetched_at=0.0, content_hash=None):
+        """Append a page record and point the id at it (replacing any earlier version)"""
+        data = text.encode("utf-8")
+        digest = bytes.fromhex(content_hash) if content_hash else hashlib.sha256(data).digest()
+        url_bytes = url.encode("utf-8")
+        compressed = zlib.compress(data, 6)
+        record = RECORD_HEADER.pack(page_id, len(url_bytes), fetched_at, digest, len(compressed)) + url_bytes + compressed
+        h = url_hash(url)
+        with self.lock:
+            if self.writer.tell() + len(record) > SEGMENT_SIZE and self.writer.tell() > 0:
+                self.writer.close()
+                self.active += 1
+                self.writer = open(self._segment_path(self.active), "ab")
+            offset = self.writer.tell()
+            self.writer.write(record)
+            self.writer.flush()
+
+            while len(self.lengths) <= page_id:
+                self.segments.append(0)
+                self.offsets.append(0)
+                self.lengths.append(0)
+                self.hashes.append(0)
+                self.index_file.seek(0, os.SEEK_END)
+                self.index_file.write(INDEX_ENTRY.pack(0, 0, 0, 0))
+            self.segments[page_id] = self.active
+            self.offsets[page_id] = offset
+            self.lengths[page_id] = len(record)
+            self.hashes[page_id] = h
+            self.index_file.seek(page_id * INDEX_ENTRY.size)
+            self.index_file.write(INDEX_ENTRY.pack(self.active, offset, len(record), h))
+            self.index_file.flush()
+            if self.by_url is not None:
+                self.by_url[h] = page_id
+
+    def _map(self, segment, end):
+        m = self.maps.get(segment)
+        if m is None or len(m) < end:
+            if m is not None:
+                m.close()
+            with open(self._segment_path(segment), "rb") as f:
+                m = self.maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return m
+
+    def get(self, page_id):
+        """The Page with this id, or None"""
+        if page_id >= len(self.lengths) or not self.lengths[page_id]:
+            return None
+        segment, offset, length = self.segments[page_id], self.offsets[page_id], self.lengths[page_id]
+        with self.lock:
+            m = self._map(segment, offset + length)
+            record = m[offset:offset + length]
+        return self._decode(record)
+
+    @staticmethod
+    def _decode(record):
+        page_id, url_len, fetched_at, digest, compressed_len = RECORD_HEADER.unpack_from(record)
+        start = RECORD_HEADER.size
+        url = record[start:start + url_len].decode("utf-8")
+        start += url_len
+        text = zlib.decompress(record[start:start + compressed_len]).decode("utf-8")
+        return Page(page_id, url, fetched_at, digest.hex(), text)
+
+    def get_by_url(self, url):
+        with self.lock:
+            if self.by_url is None:
+                self.by_url = {h: page_id for page_id, h in enumerate(self.hashes) if self.lengths[page_id]}
+            page_id = self.by_url.get(url_hash(url))
+        if page_id is None:
+            return None
+        page = self.get(page_id)
+        return page if page is not None and page.url == url else None
+
+    def iter_pages(self, start=0):
+        """Stream pages in id order (offset order for imported and crawled pages)"""
+        for page_id in self.ids()[start:]:
+            yield self.get(page_id)
+
+    def iter_headers(self):
+        """PageHeader of every page, read from the record headers without decompressing any text"""
+        for page_id in self.ids():
+            segment, offset = self.segments[page_id], self.offsets[page_id]
+            with self.lock:
+                m = self._map(segment, offset + self.lengths[page_id])
+                _, url_len, _, digest, _ = RECORD_HEADER.unpack_from(m, offset)
+                start = offset + RECORD_HEADER.size
+                url = m[start:start + url_len].decode("utf-8")
+            yield PageHeader(page_id, url, digest.hex())
+
+
+class PageDirectory:
+    """The old utm_pages/NNNNN.txt layout behind the PageStore read interface"""
+
+    def __init__(self, path=PAGES_FOLDER):
+        self.path = path
+        self.files = {}
+        for filename in os.listdir(path):
+            stem = filename[:-4]
+            if filename.endswith(".txt") and stem.isdigit():
+                self.files[int(stem)] = filename
+
+    def __len__(self):
+        return len(self.files)
+
+    def ids(self):
+        return sorted(self.files)
+
+    def get(self, page_id):
+        filename = self.files.get(page_id)
+        if filename is None:
+            return None
+        path = os.path.join(self.path, filename)
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        lines = content.splitlines()
+        if not lines or not lines[0].startswith("URL:"):
+            return Page(page_id, None, os.path.getmtime(path), None, content)
+        text = "\n".join(lines[2:])
+        return Page(page_id, lines[0][5:].strip(), os.path.getmtime(path),
+                    hashlib.sha256(text.encode("utf-8")).hexdigest(), text)
+
+    def iter_pages(self, start=0):
+        for page_id in self.ids()[start:]:
+            yield self.get(page_id)
+
+    def iter_headers(self):
+        # No stored hash here: every file is read and hashed
+        for page in self.iter_pages():
+            yield PageHeader(page.id, page.url, page.content_hash)
+
+    def close(self):
+        pass
+
+
+def open_corpus(path=None):
+    """Open the page store if one exists (or path is a store), else the utm_pages directory"""
+    if path is None:
+        path = PAGE_STORE if os.path.exists(os.path.join(PAGE_STORE, INDEX_FILE)) else PAGES_FOLDER
+    if os.path.exists(os.path.join(path, INDEX_FILE)):
+        return PageStore(path)
+    return PageDirectory(path)
+
+
+def import_directory(folder, store):
+    """One-time import of utm_pages/NNNNN.txt files into a page store"""
+    source = PageDirectory(folder)
+    imported = skipped = 0
+    for page in source.iter_pages():
+        if page.url is None:
+            skipped += 1
+            continue
+        store.put(page.id, page.url, page.text, page.fetched_at, page.content_hash)
+        imported += 1
+        if imported % 5000 == 0:
+            print(f"📥 Imported {imported} pages...")
+    return imported, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the segmented page store")
+    parser.add_argument('--store', default=PAGE_STORE, help='Page store directory')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    import_parser = subparsers.add_parser('import', help='Import a utm_pages directory')
+    import_parser.add_argument('folder', nargs='?', default=PAGES_FOLDER)
+
+    subparsers.add_parser('stats', help='Show page count and on-disk size')
+
+    show_parser = subparsers.add_parser('show', help='Print one page by id or URL')
+    show_parser.add_argument('key', help='Page id or URL')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    store = PageStore(args.store)
+    if args.command == 'import':
+        imported, skipped = import_directory(args.folder, store)
+        print(f"✅ Imported {imported} pages into {args.store} ({skipped} without a URL header skipped)")
+    elif args.command == 'stats':
+        size = sum(os.path.getsize(os.path.join(args.store, f)) for f in os.listdir(args.store))
+        print(f"📊 {len(store)} pages, {size / 1e6:.1f} MB on disk")
+    elif args.command == 'show':
+        page = store.get(int(args.key)) if args.key.isdigit() else store.get_by_url(args.key)
+        if page is None:
+            print(f"❌ No page for {args.key}")
+            store.close()
+            return False
+        print(f"URL: {page.url}\n\n{page.text}")
+    store.close()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,51 @@
+"""Parse stage of the crawler, run in a process pool.
+
+The crawler starts the pool with the spawn start method, since the pool
+is first used from a fetch thread and forking a threaded process can
+deadlock. Spawned workers import the script they were started from, so
+these functions live in their own module, and utm-crawler.py keeps its
+startup (frontier, seen-set, session) in open_state(), called from
+main(). Workers return only plain values: the page text, its content
+hash, its SimHash fingerprint, and the outlinks that pass url_rules.toml,
+already canonicalized and de-duplicated within the page.
+"""
+
+import hashlib
+
+from extract import get_extractor
+from near_dup import simhash
+from response_cache import decompress_body
+from url_canon import canonicalize
+from url_rules import UrlRules
+
+extractor = None
+url_rules = None
+
+
+def init_worker(backend="auto"):
+    """Process pool initializer: pick the extraction backend and compile the URL rules once"""
+    global extractor, url_rules
+    _, extractor = get_extractor(backend)
+    url_rules = UrlRules.load()
+
+
+def parse_page(url, html):
+    """Return (text, content_hash, fingerprint, candidate_links) for a fetched page"""
+    if extractor is None:
+        init_worker()
+    text, links = extractor(url, html)
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    candidates = []
+    on_page = set()
+    for link in links:
+        if url_rules.is_valid(link):
+            link = canonicalize(link)
+            if link not in on_page:
+                on_page.add(link)
+                candidates.append(link)
+    return text, content_hash, simhash(text), candidates
+
+
+def parse_cached(url, blob):
+    """parse_page for a compressed response_cache body, decompressed here rather than in the crawler"""
+    return parse_page(url, decompress_body(blob))
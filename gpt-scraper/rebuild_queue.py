@@ -1,27 +1,23 @@
-import os
+from frontier import open_frontier
+from url_canon import SeenSet, canonicalize
+from page_store import open_corpus
 
 # Folders and file paths
-DATA_FOLDER = "utm_pages"
-SCRAPED_FILE = "scraped_urls.txt"
-QUEUE_FILE = "queued_urls.txt"
+DATA_FOLDER = None  # page_store/ if it exists, else utm_pages/
 
-# Load scraped URLs
-scraped = set()
-if os.path.exists(SCRAPED_FILE):
-    with open(SCRAPED_FILE, "r") as f:
-        scraped = set(line.strip() for line in f if line.strip())
+# Every URL the frontier knows, by scheme-insensitive key
+frontier = open_frontier()
+known = SeenSet(frontier.iter_urls(), capacity=frontier.total() * 2)
 
 # Extract URLs from utm_pages/
 discovered = set()
 
-for filename in os.listdir(DATA_FOLDER):
-    path = os.path.join(DATA_FOLDER, filename)
-    with open(path, "r", encoding="utf-8") as f:
-        first_line = f.readline()
-        if first_line.startswith("URL:"):
-            url = first_line[5:].strip()
-            if url and url not in scraped:
-                discovered.add(url)
+corpus = open_corpus(DATA_FOLDER)
+for page in corpus.iter_pages():
+    if page.url:
+        url = canonicalize(page.url)
+        if url and known.add(url):
+            discovered.add(url)
 
 # Optional: Add seed roots if you want to restart crawling from high-level pages
 seed_urls = [
@@ -31,12 +27,12 @@ seed_urls = [
     "https://www.utm.utoronto.ca/about-utm"
 ]
 for seed in seed_urls:
-    if seed not in scraped:
+    seed = canonicalize(seed)
+    if known.add(seed):
         discovered.add(seed)
 
-# Save to queued_urls.txt
-with open(QUEUE_FILE, "w") as f:
-    for url in sorted(discovered):
-        f.write(url + "\n")
+# Queue them in frontier.db, where the crawler reads its queue
+added = frontier.enqueue(sorted(discovered))
+frontier.close()
 
-print(f"✅ Rebuilt queue with {len(discovered)} starting URLs.")
+print(f"✅ Queued {len(added)} starting URLs in the frontier.")
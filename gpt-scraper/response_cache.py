@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# response_cache.py - compressed cache of fetched HTML for re-extraction without re-crawling
+
+"""Raw HTTP response cache keyed by canonical URL.
+
+Each row holds the status, the response headers (JSON) and the decoded
+HTML body exactly as the parser saw it, zlib-compressed. Keeping the
+decoded text rather than the wire bytes means re-extraction does not
+repeat charset detection and gets the same input the crawl did.
+
+utm-crawler.py --cache-responses fills it; utm-crawler.py --reextract
+re-runs extraction over it in the parse pool. Rows are streamed still
+compressed, so decompression happens in the parse workers.
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+import zlib
+from collections import namedtuple
+from threading import Lock
+
+from url_canon import canonicalize
+
+RESPONSE_CACHE = "response_cache.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+CachedResponse = namedtuple("CachedResponse", ["url", "status", "headers", "body", "fetched_at"])
+
+
+def compress_body(html):
+    return zlib.compress(html.encode("utf-8"), 6)
+
+
+def decompress_body(blob):
+    return zlib.decompress(blob).decode("utf-8")
+
+
+class ResponseCache:
+    def __init__(self, path=RESPONSE_CACHE):
+        self.path = path
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+
+    def put(self, url, status, headers, html):
+        """Store (or replace) the latest response for a URL"""
+        blob = compress_body(html)  # zlib releases the GIL; compress outside the lock
+        header_text = json.dumps({k.lower(): v for k, v in headers.items()})
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (url, status, headers, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, status, header_text, blob, time.time()),
+            )
+
+    def get(self, url):
+        """The cached response for a URL (any spelling), or None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, status, headers, body, fetched_at FROM responses WHERE url = ?", (canonicalize(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, fetched_at = row
+        return CachedResponse(url, status, json.loads(headers), decompress_body(body), fetched_at)
+
+    def iter_compressed(self, batch_size=256):
+        """Stream lists of (url, compressed_body) on a separate read connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            cur = conn.execute("SELECT url, body FROM responses WHERE status < 400 ORDER BY rowid")
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()
+        return count, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the raw response cache")
+    parser.add_argument('--cache', default=RESPONSE_CACHE, help='Response cache database')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+    subparsers.add_parser('stats', help='Show cached response count and compressed size')
+    show_parser = subparsers.add_parser('show', help='Print the cached response for a URL')
+    show_parser.add_argument('url')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    cache = ResponseCache(args.cache)
+    success = True
+    if args.command == 'stats':
+        count, size = cache.stats()
+        print(f"📊 {count} cached responses, {size / 1e6:.1f} MB compressed")
+    elif args.command == 'show':
+        response = cache.get(args.url)
+        if response is None:
+            print(f"❌ No cached response for {args.url}")
+            success = False
+        else:
+            print(f"HTTP {response.status}  (fetched {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(response.fetched_at))})")
+            for name, value in response.headers.items():
+                print(f"{name}: {value}")
+            print()
+            print(response.body)
+    cache.close()
+    return success
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
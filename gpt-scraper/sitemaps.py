@@ -0,0 +1,86 @@
+"""Sitemap discovery for incremental recrawls.
+
+Reads robots.txt `Sitemap:` lines (falling back to /sitemap.xml) for each
+host, follows sitemap indexes, and returns (loc, lastmod) pairs with
+lastmod as a Unix timestamp or None.
+"""
+
+import gzip
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+MAX_SITEMAPS_PER_HOST = 200
+
+
+def parse_lastmod(value):
+    """W3C datetime (YYYY-MM-DD or full ISO 8601) to a Unix timestamp, or None"""
+    if not value:
+        return None
+    value = value.strip().replace("Z", "+00:00")
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+def sitemap_urls_for_host(session, host, timeout=15):
+    """Sitemap URLs advertised in robots.txt, or the conventional /sitemap.xml"""
+    base = f"https://{host}"
+    try:
+        response = session.get(f"{base}/robots.txt", timeout=timeout)
+        if response.status_code == 200:
+            urls = [
+                line.split(":", 1)[1].strip()
+                for line in response.text.splitlines()
+                if line.lower().startswith("sitemap:")
+            ]
+            if urls:
+                return urls
+    except Exception:
+        pass
+    return [f"{base}/sitemap.xml"]
+
+
+def parse_sitemap(content):
+    """Split one sitemap document into (child sitemap URLs, [(loc, lastmod)])"""
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    root = ET.fromstring(content)
+    children, entries = [], []
+    for node in root:
+        loc = node.findtext(f"{SITEMAP_NS}loc")
+        if not loc:
+            continue
+        lastmod = parse_lastmod(node.findtext(f"{SITEMAP_NS}lastmod"))
+        if node.tag == f"{SITEMAP_NS}sitemap":
+            children.append(loc.strip())
+        else:
+            entries.append((loc.strip(), lastmod))
+    return children, entries
+
+
+def fetch_sitemap_entries(session, host, timeout=15):
+    """All (loc, lastmod) entries reachable from a host's sitemaps"""
+    pending = sitemap_urls_for_host(session, host, timeout)
+    visited = set()
+    entries = []
+    while pending and len(visited) < MAX_SITEMAPS_PER_HOST:
+        url = pending.pop()
+        if url in visited:
+            continue
+        visited.add(url)
+        try:
+            response = session.get(url, timeout=timeout)
+            if response.status_code != 200:
+                continue
+            children, found = parse_sitemap(response.content)
+        except Exception as e:
+            print(f"⚠️ Sitemap {url} failed: {str(e)[:50]}")
+            continue
+        pending.extend(children)
+        entries.extend(found)
+    return entries
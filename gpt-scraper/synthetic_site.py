@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# synthetic_site.py - deterministic fake UTM site for offline crawler benchmarks
+
+"""A local HTTP server that stands in for the UTM hosts.
+
+It serves a fixed graph of `pages` pages spread over HOSTS (the real
+domain names, so url_rules.toml still applies). A page's host, size,
+outlinks, latency and failures all derive from SEED and its id, so two
+runs with the same options serve byte-identical sites in the same way.
+
+The server answers both direct requests (Host header) and proxy-style
+requests (absolute URL in the request line). The crawler is pointed at
+it with HTTP_PROXY and seeded with http:// URLs, so no DNS or code
+changes are needed:
+
+    python synthetic_site.py --port 8765 --pages 5000
+    HTTP_PROXY=http://127.0.0.1:8765 python utm-crawler.py   # in a scratch directory
+
+Failures are per page and deterministic: an `error_rate` fraction of
+pages answer 503 on their first request and a `rate_limit_rate` fraction
+answer 429 with Retry-After: 1, then both serve normally on retry. A
+`binary_rate` fraction are extensionless links that serve a large PDF,
+like the download pages url_rules.toml cannot recognise from the URL.
+"""
+
+import argparse
+import random
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import urlsplit
+
+SEED = 20250620
+BINARY_SIZE = 2 * 1024 * 1024  # Bytes served for a binary page
+HOSTS = (
+    "www.utm.utoronto.ca",
+    "student.utm.utoronto.ca",
+    "library.utm.utoronto.ca",
+    "artsci.calendar.utoronto.ca",
+)
+
+# A small vocabulary so generated text has realistic word lengths and repeats
+WORDS = (
+    "student", "course", "campus", "mississauga", "research", "faculty", "program", "library",
+    "registration", "department", "undergraduate", "graduate", "deadline", "tuition", "housing",
+    "exam", "schedule", "lecture", "tutorial", "credit", "requirement", "advising", "services",
+    "the", "and", "of", "to", "in", "for", "with", "on", "at", "by", "from", "is", "are", "will",
+    "be", "your", "this", "all", "please", "information", "contact", "office", "hours", "room",
+)
+
+
+class SiteConfig:
+    def __init__(self, pages=2000, fanout=8, page_size=6000, latency_ms=20.0, slow_rate=0.01,
+                 error_rate=0.02, rate_limit_rate=0.02, binary_rate=0.02, seed=SEED):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size  # Approximate bytes of body text per page
+        self.latency = latency_ms / 1000.0
+        self.slow_rate = slow_rate  # Pages served 10x slower, for a latency tail
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.binary_rate = binary_rate
+        self.seed = seed
+
+
+def page_url(page_id):
+    host = HOSTS[page_id % len(HOSTS)]
+    # Calendar pages are only followed with a UTM indicator in the URL (see url_rules.toml)
+    path = f"/course/utm{page_id}" if "calendar" in host else f"/p/{page_id}"
+    return f"http://{host}{path}"
+
+
+def seed_urls():
+    """One root page per host; every page is reachable from these"""
+    return [page_url(page_id) for page_id in range(len(HOSTS))]
+
+
+def parse_page_id(path):
+    tail = path.rstrip("/").rsplit("/", 1)[-1]
+    digits = tail[3:] if tail.startswith("utm") else tail
+    return int(digits) if digits.isdigit() else None
+
+
+class SyntheticSite:
+    def __init__(self, config):
+        self.config = config
+        self.lock = Lock()
+        self.attempts = {}  # page id -> requests served
+        self.requests = 0
+        self.binary_body = b"%PDF-1.4\n" + bytes(BINARY_SIZE)
+
+    def rng(self, page_id):
+        return random.Random(self.config.seed * 1_000_003 + page_id)
+
+    def links(self, page_id, rng):
+        config = self.config
+        # A spanning edge to page_id * fanout + k keeps the whole graph reachable from the roots
+        targets = [page_id * config.fanout + k for k in range(1, config.fanout + 1)]
+        targets = [t for t in targets if t < config.pages]
+        while len(targets) < config.fanout:
+            targets.append(rng.randrange(config.pages))
+        return targets
+
+    def render(self, page_id):
+        config = self.config
+        rng = self.rng(page_id)
+        paragraphs = []
+        size = 0
+        while size < config.page_size:
+            paragraph = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120)))
+            paragraphs.append(f"<p>{paragraph}</p>")
+            size += len(paragraph) + 7
+        links = "".join(f'<li><a href="{page_url(t)}">Page {t}</a></li>' for t in self.links(page_id, rng))
+        nav = "".join(f'<a href="{page_url(h)}">Home {h}</a>' for h in range(len(HOSTS)))
+        return (
+            "<!DOCTYPE html><html><head><title>Page {id}</title><style>body{{margin:0}}</style></head><body>"
+            "<header><nav>{nav}</nav></header>"
+            "<main><h1>Page {id}</h1>{paragraphs}<ul>{links}</ul>"
+            '<a href="/files/form{id}.pdf">Form</a><a href="mailto:info@utm.utoronto.ca">Email</a></main>'
+            "<footer>University of Toronto Mississauga</footer><script>var x = 1;</script></body></html>"
+        ).format(id=page_id, nav=nav, paragraphs="".join(paragraphs), links=links).encode("utf-8")
+
+    def respond(self, page_id):
+        """(status, headers, body, delay) for one request"""
+        config = self.config
+        with self.lock:
+            self.requests += 1
+            attempt = self.attempts.get(page_id, 0)
+            self.attempts[page_id] = attempt + 1
+        rng = self.rng(page_id)
+        roll, slow_roll, binary_roll = rng.random(), rng.random(), rng.random()
+        delay = config.latency * (10 if slow_roll < config.slow_rate else 1)
+        if attempt == 0 and roll < config.error_rate:
+            return 503, {}, b"", delay
+        if attempt == 0 and roll < config.error_rate + config.rate_limit_rate:
+            return 429, {"Retry-After": "1"}, b"", delay
+        if binary_roll < config.binary_rate and page_id >= len(HOSTS):
+            return 200, {"Content-Type": "application/pdf"}, self.binary_body, delay
+        return 200, {"Content-Type": "text/html; charset=utf-8", "ETag": f'"{page_id}"'}, self.render(page_id), delay
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # Client went away: abandoned a body (e.g. a crawler skipping non-HTML) or an idle keep-alive
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            host = parts.hostname or (self.headers.get("Host") or "").split(":")[0]
+            page_id = parse_page_id(parts.path)
+            if host not in HOSTS or page_id is None or page_id >= site.config.pages \
+                    or page_url(page_id) != f"http://{host}{parts.path}":
+                status, headers, body, delay = 404, {}, b"", site.config.latency
+            else:
+                status, headers, body, delay = site.respond(page_id)
+            time.sleep(delay)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_server(config, port=0, host="127.0.0.1"):
+    """Serve the site from a daemon thread; returns (server, site). Port 0 picks a free port."""
+    site = SyntheticSite(config)
+    server = ThreadingHTTPServer((host, port), make_handler(site))
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True, name="synthetic-site").start()
+    return server, site
+
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=2000, help='Pages in the site graph')
+    parser.add_argument('--fanout', type=int, default=8, help='Content links per page')
+    parser.add_argument('--page-size', type=int, default=6000, help='Approximate text bytes per page')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Server delay per response')
+    parser.add_argument('--slow-rate', type=float, default=0.01, help='Fraction of pages served 10x slower')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='Fraction of pages failing once with 503')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.02, help='Fraction of pages answering 429 once')
+    parser.add_argument('--binary-rate', type=float, default=0.02,
+                        help='Fraction of pages serving a large PDF behind an HTML-looking URL')
+    parser.add_argument('--seed', type=int, default=SEED, help='Site generation seed')
+
+
+def site_config(args):
+    return SiteConfig(args.pages, args.fanout, args.page_size, args.latency_ms, args.slow_rate,
+                      args.error_rate, args.rate_limit_rate, args.binary_rate, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a deterministic synthetic UTM site")
+    parser.add_argument('--port', type=int, default=8765)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    server, site = start_server(site_config(args), args.port)
+    print(f"🌐 Serving {args.pages} pages over {len(HOSTS)} hosts on http://127.0.0.1:{args.port}")
+    print(f"   Seeds: {' '.join(seed_urls())}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"📊 {site.requests} requests served")
+    except KeyboardInterrupt:
+        server.shutdown()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,24 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+SCRAPER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPER_DIR)
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    """utm-crawler.py loaded as a module, with its frontier and page folder in tmp_path"""
+    from frontier import Frontier
+
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location("utm_crawler", os.path.join(SCRAPER_DIR, "utm-crawler.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.OUTPUT_FOLDER = str(tmp_path / "utm_pages")
+    os.makedirs(module.OUTPUT_FOLDER)
+    module.frontier = Frontier(str(tmp_path / "frontier.db"))
+    yield module
+    module.frontier.close()
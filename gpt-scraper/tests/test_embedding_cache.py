@@ -0,0 +1,27 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+def test_commit_moves_pending_rows_into_the_index(tmp_path):
+    rng = np.random.default_rng(0)
+    cache = EmbeddingCache("model", 4, path=str(tmp_path))
+    texts = [f"chunk {i}" for i in range(50)]
+    stored = {}
+    for batch in (texts[:20], texts[20:35], texts[35:]):
+        keys, _ = cache.lookup(batch)
+        vectors = rng.standard_normal((len(batch), 4), dtype=np.float32)
+        cache.put(keys, vectors)
+        stored.update(zip(batch, vectors))
+        cache.commit()
+        assert not cache.pending
+
+    _, found = cache.lookup(texts)
+    assert all(np.array_equal(vector, stored[text]) for text, vector in zip(texts, found))
+    cache.close()
+
+    # The merged index is the one a fresh open builds from the files
+    reopened = EmbeddingCache("model", 4, path=str(tmp_path))
+    assert np.array_equal(reopened.order, cache.order)
+    assert np.array_equal(reopened.sorted_prefixes, cache.sorted_prefixes)
+    reopened.close()
@@ -0,0 +1,40 @@
+from index_manifest import Entry, IndexManifest, plan_reindex
+from page_store import PageHeader
+
+
+class Corpus:
+    def __init__(self, headers):
+        self.headers = headers
+
+    def iter_headers(self):
+        return iter(self.headers)
+
+
+def test_raw_and_canonical_page_files_are_one_page(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "manifest.db"))
+    manifest.record([Entry("https://www.utm.utoronto.ca/foo/", "old", "cfg", ["a", "b"])])
+    corpus = Corpus([
+        PageHeader(0, "https://www.utm.utoronto.ca/foo/", "old"),  # File from before canonicalization
+        PageHeader(7, "https://www.utm.utoronto.ca/foo", "new"),  # Its recrawl
+    ])
+
+    work, unchanged, removed = plan_reindex(manifest, corpus, "cfg")
+
+    assert unchanged == 0 and removed == []
+    assert len(work) == 1
+    item = work[0]
+    assert (item.page_id, item.url) == (7, "https://www.utm.utoronto.ca/foo")
+    assert item.old_ids == ["a", "b"] and item.old_config == "cfg"
+    assert item.old_urls == ["https://www.utm.utoronto.ca/foo/"]
+    manifest.close()
+
+
+def test_canonical_entry_with_same_content_is_unchanged(tmp_path):
+    manifest = IndexManifest(str(tmp_path / "manifest.db"))
+    manifest.record([Entry("https://www.utm.utoronto.ca/search?a=1&b=2", "h", "cfg", ["a"])])
+    corpus = Corpus([PageHeader(3, "https://www.utm.utoronto.ca/search?b=2&a=1", "h")])
+
+    work, unchanged, removed = plan_reindex(manifest, corpus, "cfg")
+
+    assert (work, unchanged, removed) == ([], 1, [])
+    manifest.close()
@@ -0,0 +1,32 @@
+from url_canon import canonicalize
+
+
+def write_page(folder, index, url, text="Some page text"):
+    with open(f"{folder}/{index:05d}.txt", "w", encoding="utf-8") as f:
+        f.write(f"URL: {url}\n\n{text}")
+
+
+def test_backfill_links_pages_whose_url_is_not_canonical(crawler, tmp_path):
+    raw_urls = [
+        "https://www.utm.utoronto.ca/foo/",  # trailing slash
+        "https://www.utm.utoronto.ca/search?b=2&a=1",  # query out of order
+        "https://www.utm.utoronto.ca/plain",
+    ]
+    for index, url in enumerate(raw_urls):
+        write_page(crawler.OUTPUT_FOLDER, index, url)
+    (tmp_path / "scraped.txt").write_text("\n".join(raw_urls) + "\n")
+    crawler.frontier.import_text_files(str(tmp_path / "scraped.txt"), str(tmp_path / "missing.txt"))
+
+    assert crawler.backfill_page_indexes() == 3
+    for index, url in enumerate(raw_urls):
+        assert crawler.frontier.get(canonicalize(url))["file_index"] == index
+
+
+def test_backfill_prefers_the_latest_file_of_a_url(crawler, tmp_path):
+    write_page(crawler.OUTPUT_FOLDER, 0, "https://www.utm.utoronto.ca/foo/")
+    write_page(crawler.OUTPUT_FOLDER, 1, "https://www.utm.utoronto.ca/foo")
+    (tmp_path / "scraped.txt").write_text("https://www.utm.utoronto.ca/foo\n")
+    crawler.frontier.import_text_files(str(tmp_path / "scraped.txt"), str(tmp_path / "missing.txt"))
+
+    assert crawler.backfill_page_indexes() == 1
+    assert crawler.frontier.get("https://www.utm.utoronto.ca/foo")["file_index"] == 1
@@ -0,0 +1,147 @@
+"""HTTP transport for the crawler: pooled sessions, compression and streamed, capped bodies.
+
+Both engines fetch through here. Responses are streamed: the status and
+headers are checked first, and a non-HTML Content-Type (a PDF or video
+that url_rules.toml did not catch) or a body over MAX_BODY_BYTES aborts
+the request by closing the connection instead of downloading the rest.
+HTML is decoded once, from the Content-Type charset, a <meta charset>
+in the first bytes, or UTF-8, in that order.
+
+Connection pools are sized to the scheduler's per-host concurrency cap,
+so fetch threads never wait to check out a connection. gzip and deflate
+are always accepted; br is added when the brotli package is installed
+(urllib3 and aiohttp both decode it then).
+
+FETCH_TIMEOUT limits connecting and each wait for data, as requests'
+timeout does, rather than the whole request: the async engine may hold
+a response while it waits for a parse slot, and that wait is not the
+host's fault. read_html() separately caps the body read itself.
+"""
+
+import asyncio
+import codecs
+import re
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from host_scheduler import MAX_CONCURRENCY
+
+FETCH_TIMEOUT = 15  # Seconds to connect, per read, and for reading a body
+MAX_BODY_BYTES = 5 * 1024 * 1024  # Decompressed HTML larger than this is abandoned
+CHUNK_SIZE = 64 * 1024
+HOST_POOLS = 256  # Per-host connection pools kept open by the threaded engine
+SNIFF_BYTES = 2048  # Where to look for <meta charset>
+
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+CHARSET = re.compile(r"charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+META_CHARSET = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+# html is None when the body was skipped; skipped then says why
+FetchResult = namedtuple("FetchResult", ["status", "headers", "html", "nbytes", "skipped"])
+
+
+def _codec(name):
+    try:
+        return codecs.lookup(name.decode("ascii") if isinstance(name, bytes) else name).name
+    except (LookupError, UnicodeDecodeError):
+        return None
+
+
+def decode_html(body, content_type=""):
+    """Decode an HTML body using the header charset, then <meta charset>, then UTF-8"""
+    encoding = None
+    match = CHARSET.search(content_type or "")
+    if match:
+        encoding = _codec(match.group(1))
+    if encoding is None:
+        match = META_CHARSET.search(body[:SNIFF_BYTES])
+        if match:
+            encoding = _codec(match.group(1))
+    return body.decode(encoding or "utf-8", errors="replace")
+
+
+def skip_reason(content_type, content_length=None):
+    """Why a response should not be downloaded, judging by its headers; None to read it"""
+    if "text/html" not in content_type:
+        return f"non-HTML content: {content_type or 'no content-type'}"
+    if content_length is not None and content_length > MAX_BODY_BYTES:
+        return f"body too large: {content_length} bytes"
+    return None
+
+
+def make_session(pool_size=MAX_CONCURRENCY):
+    """requests.Session whose per-host pools hold pool_size connections"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    return session
+
+
+def fetch(session, url, headers=None, timeout=FETCH_TIMEOUT):
+    """GET a page, streaming the body only if it is HTML under the size cap"""
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        content_type = response.headers.get("content-type", "").lower()
+        if response.status_code >= 300:
+            return FetchResult(response.status_code, response.headers, None, 0, None)
+        length = response.headers.get("content-length")
+        reason = skip_reason(content_type, int(length) if length and length.isdigit() else None)
+        if reason:
+            return FetchResult(response.status_code, response.headers, None, 0, reason)
+
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                return FetchResult(response.status_code, response.headers, None, size,
+                                   f"body too large: over {MAX_BODY_BYTES} bytes")
+            chunks.append(chunk)
+        html = decode_html(b"".join(chunks), content_type)
+        return FetchResult(response.status_code, response.headers, html, size, None)
+
+
+def make_connector(concurrency):
+    """aiohttp connector: `concurrency` connections overall, the scheduler's cap per host"""
+    import aiohttp
+
+    return aiohttp.TCPConnector(limit=concurrency, limit_per_host=MAX_CONCURRENCY, ttl_dns_cache=300)
+
+
+def make_client_session(concurrency):
+    import aiohttp
+
+    return aiohttp.ClientSession(
+        connector=make_connector(concurrency),
+        timeout=aiohttp.ClientTimeout(sock_connect=FETCH_TIMEOUT, sock_read=FETCH_TIMEOUT),
+        headers={"Accept-Encoding": ACCEPT_ENCODING},
+        trust_env=True,  # Honour HTTP(S)_PROXY like requests does
+    )
+
+
+async def read_html(response):
+    """Stream an aiohttp response body within FETCH_TIMEOUT; returns (html, nbytes), html None if it passed the cap"""
+    return await asyncio.wait_for(read_body(response), FETCH_TIMEOUT)
+
+
+async def read_body(response):
+    chunks = []
+    size = 0
+    async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None, size
+        chunks.append(chunk)
+    return decode_html(b"".join(chunks), response.headers.get("content-type", "")), size
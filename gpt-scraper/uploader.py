@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# uploader.py - idempotent, retrying batch upserts of embedded chunks to Supabase
+
+"""Upload of embedded chunk rows that is safe to repeat.
+
+Row ids are uuid5 of the chunk fingerprint (sha256 of text and URL), not
+random, and batches are upserted on id. Sending a batch twice, whether
+from a retry after a timeout that actually landed, a crash before the
+index manifest was updated or a full re-index, overwrites the same rows
+instead of adding duplicates.
+
+Uploader is shared by the pipeline's upload threads. They all go through
+one Supabase client, whose PostgREST session is a single httpx client,
+so concurrent batches reuse its pool of keep-alive connections rather
+than opening a connection per insert. Upserts ask for return=minimal, so
+the embeddings are not echoed back.
+
+Rows of changed or removed pages are deleted by id (delete()), with the
+same retries; a delete that still fails is reported to the caller, which
+keeps the ids to try again next run.
+
+A failed batch is retried with exponential backoff (full jitter, capped
+at MAX_BACKOFF) up to MAX_ATTEMPTS times, then appended, rows and error,
+to a dead-letter file so the run can move on without losing it:
+
+    python uploader.py stats
+    python uploader.py replay   # re-send dead-lettered batches, keep the ones that fail again
+    python uploader.py --sink postgres replay
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from threading import Lock
+
+CHUNKS_TABLE = "utmgpt_chunks"
+DEAD_LETTER = "failed_uploads.jsonl"  # One JSON line per batch that exhausted its retries
+MAX_ATTEMPTS = 5
+BASE_BACKOFF = 1.0  # seconds before the first retry; doubles per attempt
+MAX_BACKOFF = 30.0
+DELETE_BATCH = 100  # Ids per delete request (they travel in the URL)
+CHUNK_NAMESPACE = uuid.UUID("aaa7936c-964d-4e49-b6b6-e5b92c836246")  # Never change: ids of existing rows depend on it
+
+
+def dead_letter_file(sink):
+    return DEAD_LETTER if sink == "supabase" else f"failed_uploads.{sink}.jsonl"
+
+
+def chunk_id(hash_id):
+    """Stable row id for a chunk fingerprint (hex sha256 of text + URL)"""
+    return str(uuid.uuid5(CHUNK_NAMESPACE, hash_id))
+
+
+def plain_rows(rows):
+    """Rows with NumPy embeddings turned into float lists, as JSON needs"""
+    return [{**row, "embedding": row["embedding"].tolist()} if hasattr(row["embedding"], "tolist") else row
+            for row in rows]
+
+
+def backoff_delay(attempt):
+    """Seconds to wait before retry number attempt (1-based): full jitter under a capped exponential"""
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1)))
+
+
+class Uploader:
+    """Supabase sink; vector_sinks.py has the others, with the same upload/flush/close interface"""
+
+    name = "supabase"
+    checkpoint_rows = None  # Rows are stored once upload() returns, so the pipeline's SAVE_EVERY applies
+
+    def __init__(self, client, table=CHUNKS_TABLE, dead_letter=DEAD_LETTER, max_attempts=MAX_ATTEMPTS):
+        self.client = client
+        self.table = table
+        self.dead_letter = dead_letter
+        self.max_attempts = max_attempts
+        self.lock = Lock()
+        self.retries = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+        if client is not None:
+            # Build the PostgREST session now, so worker threads share one instead of racing to create it
+            client.table(table)
+
+    def send(self, rows):
+        self.client.table(self.table).upsert(plain_rows(rows), on_conflict="id", returning="minimal").execute()
+
+    def send_delete(self, ids):
+        self.client.table(self.table).delete(returning="minimal").in_("id", ids).execute()
+
+    def retry(self, action, what):
+        """Call action() until it succeeds or MAX_ATTEMPTS are used up; returns the last error, or None"""
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                action()
+                return None
+            except Exception as e:
+                error = e
+            if attempt < self.max_attempts:
+                delay = backoff_delay(attempt)
+                with self.lock:
+                    self.retries += 1
+                print(f"🔁 {what} failed ({error}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})")
+                time.sleep(delay)
+        return error
+
+    def upload(self, rows):
+        """Upsert one batch, retrying; returns False once it has been dead-lettered instead"""
+        error = self.retry(lambda: self.send(rows), f"Upload of {len(rows)} rows")
+        if error is None:
+            return True
+        print(f"⚠️ Upload of {len(rows)} rows failed {self.max_attempts} times ({error}); saved to {self.dead_letter}")
+        self.save_failed(rows, error)
+        return False
+
+    def delete(self, ids):
+        """Delete rows by id, retrying; returns False if some could not be (the caller keeps them listed)"""
+        for start in range(0, len(ids), DELETE_BATCH):
+            part = ids[start:start + DELETE_BATCH]
+            error = self.retry(lambda: self.send_delete(part), f"Delete of {len(part)} rows")
+            if error is not None:
+                print(f"⚠️ Delete of {len(part)} rows failed {self.max_attempts} times ({error})")
+                return False
+        return True
+
+    def save_failed(self, rows, error):
+        record = {"table": self.table, "error": str(error), "failed_at": time.time(), "rows": plain_rows(rows)}
+        with self.lock:
+            with open(self.dead_letter, "a") as f:
+                f.write(json.dumps(record) + "\n")
+            self.failed_batches += 1
+            self.failed_rows += len(rows)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def read_dead_letter(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(uploader, path):
+    """Re-send every dead-lettered batch; those that fail again are written back. Returns (sent, failed) batches"""
+    records = read_dead_letter(path)
+    # Failures are collected in a new file while the old one is read, then swapped in
+    uploader.dead_letter = path + ".tmp"
+    if os.path.exists(uploader.dead_letter):
+        os.remove(uploader.dead_letter)
+    sent = 0
+    for record in records:
+        uploader.table = record.get("table", CHUNKS_TABLE)
+        sent += uploader.upload(record["rows"])
+    if uploader.failed_batches:
+        os.replace(uploader.dead_letter, path)
+    elif os.path.exists(path):
+        os.remove(path)
+    uploader.dead_letter = path
+    return sent, uploader.failed_batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay chunk uploads that exhausted their retries")
+    parser.add_argument('--sink', default='supabase', choices=['supabase', 'postgres'],
+                        help='Sink the batches failed on')
+    parser.add_argument('--dead-letter', default=None, help='Dead-letter file (default: the sink\'s)')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+    subparsers.add_parser('stats', help='Show dead-lettered batches and rows')
+    subparsers.add_parser('replay', help='Upsert dead-lettered batches again')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    args.dead_letter = args.dead_letter or dead_letter_file(args.sink)
+    records = read_dead_letter(args.dead_letter)
+    if args.command == 'stats':
+        rows = sum(len(record["rows"]) for record in records)
+        print(f"📊 {len(records)} failed batches, {rows} rows in {args.dead_letter}")
+        for record in records[-5:]:
+            print(f"   {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['failed_at']))} "
+                  f"{len(record['rows'])} rows: {record['error'][:120]}")
+    elif args.command == 'replay':
+        if not records:
+            print(f"✅ Nothing to replay in {args.dead_letter}")
+            return True
+        from dotenv import load_dotenv
+        from vector_sinks import open_sink
+
+        load_dotenv()
+        uploader = open_sink(args.sink, len(records[0]["rows"][0]["embedding"]), dead_letter=args.dead_letter)
+        sent, failed = replay(uploader, args.dead_letter)
+        uploader.close()
+        print(f"✅ Replayed {sent} batches; {failed} still failing")
+        return failed == 0
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
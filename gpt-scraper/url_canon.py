@@ -0,0 +1,119 @@
+"""Shared URL canonicalization and a compact seen-set for crawl dedup.
+
+canonicalize() gives every spelling of a page one form (lowercase host,
+no default port, no fragment, no trailing slash, sorted query without
+tracking params). url_key() additionally ignores http vs https, and
+SeenSet stores those keys as 64-bit hashes in a flat array instead of a
+Python set of strings, so memory stays at ~16 bytes per URL.
+"""
+
+import hashlib
+from array import array
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "fbclid", "gclid"}
+
+
+def canonicalize(url):
+    """Normalize a URL so equivalent spellings compare equal"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port is not None and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/")
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query = urlencode(sorted((k, v) for k, v in query if k.lower() not in TRACKING_PARAMS))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def url_key(url):
+    """Dedup key for a URL: its canonical form without the scheme"""
+    canonical = canonicalize(url)
+    return canonical.split("://", 1)[-1]
+
+
+def url_hash(url):
+    """64-bit hash of url_key(url); never 0, which marks empty SeenSet slots"""
+    digest = hashlib.blake2b(url_key(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class BloomFilter:
+    """Bit-array Bloom filter over 64-bit hashes (k probes by double hashing)"""
+
+    def __init__(self, capacity, bits_per_item=10, probes=7):
+        self.size = max(64, capacity * bits_per_item)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.probes = probes
+
+    def _positions(self, h):
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.probes)]
+
+    def add(self, h):
+        for pos in self._positions(h):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, h):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(h))
+
+
+class SeenSet:
+    """Open-addressing hash table of 64-bit URL hashes backed by array('Q').
+
+    With bloom_capacity set, a Bloom filter sized for that many URLs sits in
+    front of the table and answers most never-seen lookups without probing.
+    Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, urls=(), capacity=1 << 16, bloom_capacity=None):
+        size = 1
+        while size < capacity * 2:
+            size <<= 1
+        self.table = array("Q", bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+        self.bloom = BloomFilter(bloom_capacity) if bloom_capacity else None
+        for url in urls:
+            self.add(url)
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, h):
+        i = h & self.mask
+        table = self.table
+        while table[i] and table[i] != h:
+            i = (i + 1) & self.mask
+        return i
+
+    def __contains__(self, url):
+        h = url_hash(url)
+        if self.bloom is not None and h not in self.bloom:
+            return False
+        return self.table[self._slot(h)] == h
+
+    def add(self, url):
+        """Insert a URL; returns True if it was not seen before"""
+        h = url_hash(url)
+        if self.bloom is not None and h not in self.bloom:
+            self.bloom.add(h)
+        else:
+            i = self._slot(h)
+            if self.table[i] == h:
+                return False
+        if (self.count + 1) * 2 > len(self.table):
+            self._grow()
+        self.table[self._slot(h)] = h
+        self.count += 1
+        return True
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", bytes(16 * len(old)))
+        self.mask = len(self.table) - 1
+        for h in old:
+            if h:
+                self.table[self._slot(h)] = h
@@ -1,305 +1,720 @@
 import os
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+import argparse
+import asyncio
+import multiprocessing
+from urllib.parse import urlparse
+import time
 from time import sleep
 from threading import Thread, Lock, current_thread
-import threading
-from queue import Queue
+from host_scheduler import HostScheduler, RETRY_STATUSES, MAX_CONCURRENCY, parse_retry_after
+from frontier import open_frontier, DONE, FAILED, QUEUED
+from url_canon import SeenSet, canonicalize, url_key
+from concurrent.futures import ThreadPoolExecutor
+from sitemaps import fetch_sitemap_entries
+from url_rules import UrlRules
+from extract import BACKENDS, get_extractor
+from concurrent.futures import ProcessPoolExecutor
+import parse_worker
+from page_store import PAGE_STORE, PageDirectory, PageStore
+from near_dup import SimHashIndex
+from crawl_metrics import CrawlMetrics, METRICS_FILE, METRICS_PORT, serve as serve_metrics
+from response_cache import RESPONSE_CACHE, ResponseCache
+import transport
 
 BASE_URL = "https://www.utm.utoronto.ca"
 DOMAIN = urlparse(BASE_URL).netloc
 OUTPUT_FOLDER = "utm_pages"
 QUEUE_FILE = "queued_urls.txt"
 SCRAPED_FILE = "scraped_urls.txt"
-CHECKPOINT_FILE = "checkpoint.txt"
+FRONTIER_DB = "frontier.db"
 THREADS = 24  # Increase for faster crawling
-
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-print(f"📁 Created/verified output folder: {OUTPUT_FOLDER}")
+ASYNC_CONCURRENCY = 1000  # Requests in flight for --engine async
+PARSE_WORKERS = os.cpu_count() or 1  # Parse processes; 0 parses in the fetching thread
+PARSE_QUEUE_SIZE = 4 * PARSE_WORKERS  # Fetched pages allowed to wait for a parse worker (async engine)
+REEXTRACT_BATCH = 256  # Cached responses handed to the parse pool at a time by --reextract
+MAX_FETCH_ATTEMPTS = 5  # Retries for 429/5xx/timeouts before a URL is dropped
+SEEN_BLOOM_CAPACITY = None  # Set (e.g. 5_000_000) to put a Bloom filter in front of the seen-set
+METRICS_INTERVAL = 30  # Seconds between crawl_metrics.json snapshots
+NEAR_DUP_SIMILARITY = 0.95  # SimHash similarity at which a new page is recorded as an alias (0 disables)
 
 # Thread-safe data
-url_queue = Queue()
+scheduler = HostScheduler()  # Per-host queues, rate limits and backoff
 visited_lock = Lock()
 counter_lock = Lock()
 
-# Load and save
-def load_set(filename):
-    if not os.path.exists(filename):
-        return set()
-    with open(filename, "r") as f:
-        return set(line.strip() for line in f if line.strip())
-
-def save_set(filename, data_set):
-    with open(filename, "w") as f:
-        for item in sorted(data_set):
-            f.write(item + "\n")
-
-# Shared state
-scraped = load_set(SCRAPED_FILE)
-queued = load_set(QUEUE_FILE)
-queued_set = set()  # Track URLs currently in queue
-counter = len(scraped)
-session = requests.Session()
-
-print(f"📊 Loaded {len(scraped)} already scraped URLs")
-print(f"📊 Loaded {len(queued)} queued URLs")
-print(f"📊 Starting counter at: {counter}")
-
-if not queued:
-    queued.add(BASE_URL)
-    queued.add("https://utm.calendar.utoronto.ca")
-    queued.add("https://artsci.calendar.utoronto.ca")
-    print(f"🌱 Starting fresh - added base URLs including calendars")
-
-# Load initial queue
-for url in queued:
-    url_queue.put(url)
-    queued_set.add(url)
-print(f"🔄 Loaded {url_queue.qsize()} URLs into processing queue")
+# Shared state, opened by open_state() from main(): spawned parse workers re-import this script,
+# and must not open the frontier or rebuild the seen-set
+frontier = None  # Durable per-URL state (queued/in_flight/done/failed); replaces rewriting the .txt files
+metrics = None  # Counters and per-host latency histograms for /metrics and crawl_metrics.json
+seen_urls = None  # 64-bit hashes of every URL the frontier knows (canonical, scheme-insensitive)
+counter = 0
+session = None  # Per-host pools as large as the scheduler's concurrency cap
+url_rules = UrlRules.load()  # Compiled from url_rules.toml
+parse_pool = None  # ProcessPoolExecutor for the parse stage, started in main()
+parse_slots = None  # Bounds fetched-but-unparsed pages in the async engine
+page_store = None  # PageStore when run with --store segments; None writes utm_pages/*.txt
+response_cache = None  # ResponseCache when run with --cache-responses (or --reextract)
+near_dups = None  # SimHashIndex of stored pages, built in main(); None disables near-duplicate checks
+expand_duplicates = True  # Follow links found on near-duplicate pages
+
+def open_state():
+    """Create the output folder and open the frontier, seen-set, metrics and HTTP session"""
+    global frontier, metrics, seen_urls, counter, session
+
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    print(f"📁 Created/verified output folder: {OUTPUT_FOLDER}")
+
+    frontier = open_frontier(FRONTIER_DB, SCRAPED_FILE, QUEUE_FILE)
+
+    metrics = CrawlMetrics(frontier_counts=frontier.counts, host_stats=scheduler.stats)
+    # The seen-set lets link dedup skip the database
+    seen_urls = SeenSet(frontier.iter_urls(), capacity=frontier.total() * 2, bloom_capacity=SEEN_BLOOM_CAPACITY)
+    counter = frontier.next_file_index()
+    session = transport.make_session(MAX_CONCURRENCY)
+
+    print(f"📊 Tracking {len(seen_urls)} known URLs")
+    print(f"📊 Starting counter at: {counter}")
+
+def load_queue():
+    """Push every queued frontier URL into the scheduler, seeding a fresh crawl if there are none"""
+    queued = frontier.resume()  # In-flight URLs from an interrupted run go back in the queue
+    print(f"📊 Loaded {len(queued)} queued URLs")
+
+    if not queued:
+        seeds = [canonicalize(url) for url in (BASE_URL, "https://utm.calendar.utoronto.ca", "https://artsci.calendar.utoronto.ca")]
+        queued = frontier.enqueue(seeds)
+        for url in queued:
+            seen_urls.add(url)
+        print(f"🌱 Starting fresh - added base URLs including calendars")
+
+    # Load initial queue
+    for url in queued:
+        scheduler.push(url)
+    print(f"🔄 Loaded {len(queued)} URLs into processing queue")
 
 def is_valid(link):
-    link_lower = link.lower()
-    parsed = urlparse(link)
-
-    # Allow UTM-specific domains
-    is_utm_domain = (parsed.netloc.endswith('.utm.utoronto.ca') or
-                     parsed.netloc == 'utm.utoronto.ca')
-
-    # Allow UofT calendar domains for course information
-    is_calendar_domain = parsed.netloc in ['artsci.calendar.utoronto.ca', 'calendar.utoronto.ca']
-
-    # For calendar domains, check if it's UTM-related content
-    utm_related_calendar = False
-    if is_calendar_domain:
-        # Check for UTM campus indicators in the URL
-        utm_indicators = ['/utm', 'utm.', 'mississauga', 'campus/utm']
-        utm_related_calendar = any(indicator in link_lower for indicator in utm_indicators)
-
-        # Also allow course pages that might be relevant to UTM students
-        if '/course/' in link_lower:
-            utm_related_calendar = True
-
-    return (
-        (is_utm_domain or utm_related_calendar)
-        and "#" not in link
-        and not any(ext in link_lower for ext in [".pdf", ".jpg", ".jpeg", ".png", ".svg", ".zip", ".doc", ".docx", ".mp3", ".csv", ".xls", ".xlsx", ".ppt", ".pptx", ".txt", ".rtf", ".odt", ".ods", ".odp", ".gif", ".bmp", ".tiff", ".webp", ".ico", ".mp4", ".avi", ".mov", ".wmv", ".flv", ".webm", ".mkv", ".wav", ".flac", ".aac", ".ogg", ".wma", ".m4a", ".tar", ".gz", ".rar", ".7z", ".bz2", ".exe", ".msi", ".dmg", ".deb", ".rpm", ".apk", ".ipa", ".swf", ".fla", ".psd", ".ai", ".eps", ".indd", ".sketch", ".fig", ".xml", ".json", ".yaml", ".yml", ".sql", ".db", ".sqlite", ".mdb", ".accdb", ".log", ".tmp", ".bak", ".old", ".orig", ".backup"])
-        and not link_lower.endswith(".pdf")
-        and "download?inline" not in link_lower
-        and not link_lower.endswith(".doc")
-        and ".docx" not in link_lower
-        and link.startswith("http")
-        and not link.startswith("https://www.utm.utoronto.ca/~w3pkota")
-        and not link.startswith("https://www.utm.utoronto.ca/milsteinlab")
-        and not link.startswith("http://library.utm.utoronto.ca/calendar-field_date")
-        and not link.startswith("https://library.utm.utoronto.ca/calendar-field_date")
-        and not link.startswith("http://library.utm.utoronto.ca/book-collection-displays")
-        and not link.startswith("http://www.utm.utoronto.ca/mscsm")
-        and not link.startswith("https://library2.utm.utoronto.ca")
-        # Filter out non-UTM campus content
-        and "scarborough" not in link_lower
-        and "/utsc" not in link_lower
-        and "st-george" not in link_lower
-        and "/stg" not in link_lower
-    )
-
-def save_state():
-    save_set(SCRAPED_FILE, scraped)
-    remaining_urls = {url_queue.queue[i] for i in range(url_queue.qsize())}
-    save_set(QUEUE_FILE, remaining_urls)
-    print(f"💾 Saved state: {len(scraped)} scraped, {len(remaining_urls)} remaining")
-
-def save_checkpoint():
-    """Save current stats to checkpoint file"""
-    with open(CHECKPOINT_FILE, "w") as f:
-        f.write(f"Scraped: {len(scraped)}\n")
-        f.write(f"Queue: {url_queue.qsize()}\n")
-        f.write(f"Active threads: {threading.active_count()}\n")
-        f.write(f"Counter: {counter}\n")
-        import time
-        f.write(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-    print(f"📋 Checkpoint: {len(scraped)} scraped, {url_queue.qsize()} queued")
+    """Allow/deny check from url_rules.toml (domains, calendar indicators, extensions, prefixes)"""
+    return url_rules.is_valid(link)
+
+def save_metrics():
+    """Write the crawl_metrics.json snapshot (replaces the old checkpoint.txt)"""
+    snapshot = metrics.write_snapshot(METRICS_FILE)
+    counts = snapshot["frontier"]
+    print(f"📋 Metrics: {counts[DONE]} scraped, {counts[QUEUED]} queued, {snapshot['pages_per_second']} pages/s")
+
+def describe_status(status_code):
+    """Short label for an HTTP error status"""
+    if status_code == 429:
+        return f"{status_code} (Too many requests)"
+    elif status_code == 403:
+        return f"{status_code} (Forbidden)"
+    elif status_code == 404:
+        return f"{status_code} (Not found)"
+    elif status_code == 500:
+        return f"{status_code} (Server error)"
+    elif status_code == 502:
+        return f"{status_code} (Bad gateway)"
+    elif status_code == 503:
+        return f"{status_code} (Service unavailable)"
+    elif status_code == 504:
+        return f"{status_code} (Gateway timeout)"
+    return f"{status_code} (HTTP error)"
+
+def describe_error(e):
+    """Short label for a failed fetch"""
+    if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
+        return describe_status(e.response.status_code)
+    elif "timeout" in str(e).lower() or isinstance(e, asyncio.TimeoutError):
+        return "Timeout"
+    elif "connection" in str(e).lower():
+        return "Connection error"
+    elif "ssl" in str(e).lower():
+        return "SSL error"
+    return str(e)[:50]  # First 50 chars of error
+
+def parse(url, html):
+    """Run the parse stage for a page: in the process pool if there is one, else in this thread"""
+    start = time.perf_counter()
+    if parse_pool is None:
+        parsed = parse_worker.parse_page(url, html)
+    else:
+        parsed = parse_pool.submit(parse_worker.parse_page, url, html).result()
+    metrics.observe_parse(urlparse(url).netloc, time.perf_counter() - start)
+    return parsed
+
+def page_path(file_index):
+    """Path of a page file, keeping the padding of an existing file (see rename_files.py)"""
+    for width in (5, 6):
+        filename = os.path.join(OUTPUT_FOLDER, f"{file_index:0{width}d}.txt")
+        if os.path.exists(filename):
+            return filename
+    return os.path.join(OUTPUT_FOLDER, f"{file_index:05d}.txt")
+
+def write_page(file_index, url, text, content_hash=None):
+    """Write page text to OUTPUT_FOLDER or the page store"""
+    if page_store is not None:
+        page_store.put(file_index, url, text, time.time(), content_hash)
+    else:
+        with open(page_path(file_index), "w", encoding="utf-8") as f:
+            f.write(f"URL: {url}\n\n{text}")
+
+def save_page(url, text, file_index=None, etag=None, last_modified=None, content_hash=None, simhash=None):
+    """Write the page to OUTPUT_FOLDER (or the page store) and mark it scraped, returning its file index.
+
+    A recrawled page passes its existing file_index and is rewritten in place.
+    """
+    global counter
+    is_new = file_index is None
+    if is_new:
+        with counter_lock:
+            file_index = counter
+            counter += 1
+    write_page(file_index, url, text, content_hash)
+    frontier.complete(url, file_index, etag, last_modified, content_hash, simhash)
+    if is_new:
+        with visited_lock:
+            # Keep the plain-text list for the downstream scripts
+            with open(SCRAPED_FILE, "a") as sf:
+                sf.write(url + "\n")
+    return file_index
+
+def conditional_headers(url):
+    """If-None-Match / If-Modified-Since from the validators stored on the last fetch"""
+    row = frontier.get(url)
+    headers = {}
+    if row and (row["file_index"] is not None or row["alias_of"]):
+        if row["etag"]:
+            headers["If-None-Match"] = row["etag"]
+        if row["last_modified"]:
+            headers["If-Modified-Since"] = row["last_modified"]
+    return headers
+
+def claim_new_links(links):
+    """Filter valid, canonical links down to ones the frontier has never seen, and enqueue them"""
+    candidates = []
+    with visited_lock:
+        for link in links:
+            if seen_urls.add(link):
+                candidates.append(link)
+
+    # One transaction for the whole page's new links
+    if not candidates:
+        return []
+    return frontier.enqueue(candidates)
+
+def retry_fetch(url, retry_after, label, reason):
+    """Back off the URL's host and re-queue the URL after the pause, up to MAX_FETCH_ATTEMPTS"""
+    attempts = frontier.attempts(url)
+    requeue = attempts < MAX_FETCH_ATTEMPTS
+    if requeue:
+        frontier.requeue(url)
+    else:
+        frontier.fail(url)
+    delay = scheduler.backoff(url, retry_after, requeue=requeue)
+    if requeue:
+        metrics.count_page("retried")
+        print(f"🔁 [{label}] {reason}, retrying in {delay:.0f}s (attempt {attempts})")
+    else:
+        metrics.count_page("failed")
+        print(f"⚠️ [{label}] Failed: {reason} (gave up after {attempts} attempts)")
+
+def store_page(url, parsed, label, etag=None, last_modified=None):
+    """Save and expand a parsed page; new links go to the scheduler before the slot is released"""
+    text, content_hash, fingerprint, links = parsed
+    row = frontier.get(url)
+    file_index = row["file_index"] if row else None
+    if file_index is not None and row["content_hash"] == content_hash:
+        # Recrawled without a usable 304 but the text is identical; leave the page file alone
+        frontier.complete(url, etag=etag, last_modified=last_modified)
+        metrics.count_page("unchanged")
+        print(f"💤 [{label}] #{file_index} unchanged")
+        return
+
+    original = None
+    if near_dups is not None:
+        if file_index is None and fingerprint is not None:
+            original = near_dups.claim(url, fingerprint)
+        elif fingerprint is not None:
+            near_dups.add(url, fingerprint)  # A recrawled page keeps its file; match against its new text
+        else:
+            near_dups.remove(url)
+
+    if original is not None:
+        frontier.complete_alias(url, original, etag, last_modified, content_hash, fingerprint)
+        metrics.count_page("alias")
+        if not expand_duplicates:
+            print(f"🪞 [{label}] Near-duplicate of {original}, links not followed")
+            return
+    else:
+        file_index = save_page(url, text, file_index, etag, last_modified, content_hash, fingerprint)
+        metrics.count_page("stored")
+
+    # Find new links
+    new_links_to_add = claim_new_links(links)
+    for link in new_links_to_add:
+        scheduler.push(link)
+
+    if original is not None:
+        print(f"🪞 [{label}] Near-duplicate of {original} +{len(new_links_to_add)} links")
+        return
+    print(f"✅ [{label}] #{file_index} +{len(new_links_to_add)} links")
+
+    if file_index % 50 == 0:
+        print(f"🎯 Milestone [{file_index}] - Queue: {scheduler.pending}")
 
 def worker():
-    global counter
     thread_id = current_thread().name.replace("Worker-", "W")
 
     while True:
-        try:
-            url = url_queue.get(timeout=1)  # Add timeout to prevent hanging
-        except:
-            break
+        url, wait = scheduler.next_ready()
+        if url is None:
+            if scheduler.is_idle():
+                break
+            sleep(min(wait, 0.5))  # no host is ready yet
+            continue
 
-        with visited_lock:
-            # Remove from queued set when processing
-            queued_set.discard(url)
-            if url in scraped:
-                url_queue.task_done()
-                continue
+        if not frontier.claim(url):
+            scheduler.release(url)  # already handled elsewhere
+            continue
 
+        host = urlparse(url).netloc
+        start = time.perf_counter()
         try:
-            response = session.get(url, timeout=15)  # Increased timeout
-            response.raise_for_status()
-
-            # Check content-type header
-            content_type = response.headers.get('content-type', '').lower()
-            if 'text/html' not in content_type:
-                print(f"⚠️ [{thread_id}] Skipping non-HTML content: {content_type}")
-                url_queue.task_done()
-                continue
-
+            result = transport.fetch(session, url, conditional_headers(url))
         except Exception as e:
-            error_msg = "Unknown error"
-            if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
-                status_code = e.response.status_code
-                if status_code == 429:
-                    error_msg = f"{status_code} (Too many requests)"
-                elif status_code == 403:
-                    error_msg = f"{status_code} (Forbidden)"
-                elif status_code == 404:
-                    error_msg = f"{status_code} (Not found)"
-                elif status_code == 500:
-                    error_msg = f"{status_code} (Server error)"
-                elif status_code == 502:
-                    error_msg = f"{status_code} (Bad gateway)"
-                elif status_code == 503:
-                    error_msg = f"{status_code} (Service unavailable)"
-                elif status_code == 504:
-                    error_msg = f"{status_code} (Gateway timeout)"
-                else:
-                    error_msg = f"{status_code} (HTTP error)"
-            elif "timeout" in str(e).lower():
-                error_msg = "Timeout"
-            elif "connection" in str(e).lower():
-                error_msg = "Connection error"
-            elif "ssl" in str(e).lower():
-                error_msg = "SSL error"
+            error_msg = describe_error(e)
+            metrics.observe_fetch(host, time.perf_counter() - start, error_msg)
+            if error_msg in ("Timeout", "Connection error"):
+                retry_fetch(url, None, thread_id, error_msg)
             else:
-                error_msg = str(e)[:50]  # First 50 chars of error
+                frontier.fail(url)
+                scheduler.release(url)
+                metrics.count_page("failed")
+                print(f"⚠️ [{thread_id}] Failed: {error_msg}")
+            continue
+        metrics.observe_fetch(host, time.perf_counter() - start, result.status, result.nbytes)
 
-            print(f"⚠️ [{thread_id}] Failed: {error_msg}")
-            url_queue.task_done()
+        if result.status in RETRY_STATUSES:
+            retry_after = parse_retry_after(result.headers.get('retry-after'))
+            retry_fetch(url, retry_after, thread_id, describe_status(result.status))
             continue
 
         try:
-            soup = BeautifulSoup(response.text, "html.parser")
-            text = soup.get_text(separator="\n", strip=True)
-
-            # Save text file
-            with counter_lock:
-                file_index = counter
-                counter += 1
-            filename = os.path.join(OUTPUT_FOLDER, f"{file_index:05d}.txt")
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(f"URL: {url}\n\n{text}")
-            with visited_lock:
-                scraped.add(url)
-                # Immediately write to scraped file
-                with open(SCRAPED_FILE, "a") as sf:
-                    sf.write(url + "\n")
-
-            # Find new links
-            links_found = soup.find_all("a", href=True)
-            new_links_added = 0
-            new_links_to_add = []
-
-            for a in links_found:
-                link = urljoin(url, a['href'])
-                parsed = urlparse(link)
-                # Check if it's a UTM-specific domain or relevant calendar domain
-                is_utm_domain = (parsed.netloc.endswith('.utm.utoronto.ca') or
-                                 parsed.netloc == 'utm.utoronto.ca')
-
-                is_calendar_domain = parsed.netloc in ['artsci.calendar.utoronto.ca', 'calendar.utoronto.ca']
-
-                if is_utm_domain or is_calendar_domain:
-                    # Apply all URL filtering logic here before adding to queue
-                    if is_valid(link):
-                        with visited_lock:
-                            if link not in scraped and link not in queued_set:
-                                new_links_to_add.append(link)
-                                new_links_added += 1
-
-            # Add new links outside the visited_lock
-            for link in new_links_to_add:
-                url_queue.put(link)
-                with visited_lock:
-                    queued_set.add(link)
+            if result.status == 304:
+                frontier.complete(url)
+                metrics.count_page("not_modified")
+                print(f"💤 [{thread_id}] Not modified")
+                continue
 
-            # Write to queue file in batch
-            if new_links_to_add:
-                with open(QUEUE_FILE, "a") as qf:
-                    for link in new_links_to_add:
-                        qf.write(link + "\n")
+            if result.status >= 400:
+                frontier.fail(url)
+                metrics.count_page("failed")
+                print(f"⚠️ [{thread_id}] Failed: {describe_status(result.status)}")
+                continue
 
-            print(f"✅ [{thread_id}] #{file_index} +{new_links_added} links")
+            # Non-HTML or oversized bodies were abandoned after the headers
+            if result.html is None:
+                frontier.complete(url)
+                metrics.count_page("skipped")
+                print(f"⚠️ [{thread_id}] Skipping {result.skipped}")
+                continue
 
-            if file_index % 50 == 0:
-                with visited_lock:
-                    save_state()
-                print(f"🎯 Milestone [{file_index}] - Queue: {url_queue.qsize()}")
+            if response_cache is not None:
+                response_cache.put(url, result.status, result.headers, result.html)
+
+            # Blocks this thread only; the CPU work runs in a parse process
+            parsed = parse(url, result.html)
+            store_page(url, parsed, thread_id,
+                       result.headers.get('etag'), result.headers.get('last-modified'))
 
         except Exception as e:
+            frontier.fail(url)
+            metrics.count_page("failed")
             print(f"❌ [{thread_id}] Error: {e}")
         finally:
-            url_queue.task_done()
-
-        sleep(0.2)  # be polite
+            scheduler.complete(url)
 
-# Start threads
-print(f"🚀 Starting {THREADS} worker threads...")
-threads = []
-for i in range(THREADS):
-    t = Thread(target=worker, daemon=True, name=f"Worker-{i+1}")
-    t.start()
-    threads.append(t)
+def run_threaded():
+    # Start threads
+    print(f"🚀 Starting {THREADS} worker threads...")
+    threads = []
+    for i in range(THREADS):
+        t = Thread(target=worker, daemon=True, name=f"Worker-{i+1}")
+        t.start()
+        threads.append(t)
 
-print(f"🚀 Started {THREADS} workers")
+    print(f"🚀 Started {THREADS} workers")
 
-print("⏳ Waiting for all workers to complete...")
+    print("⏳ Waiting for all workers to complete...")
 
-# Initial checkpoint
-save_checkpoint()
+    # Initial metrics snapshot
+    save_metrics()
 
-# Add periodic status updates and checkpoints
-import time
-start_time = time.time()
-last_status = start_time
-last_checkpoint = start_time
+    # Add periodic status updates and metrics snapshots
+    start_time = time.time()
+    last_status = start_time
+    last_snapshot = start_time
 
-try:
-    while not url_queue.empty():
+    while not scheduler.is_idle():
         current_time = time.time()
 
         # Status update every 60 seconds
         if current_time - last_status > 60:
-            remaining = url_queue.qsize()
-            elapsed = current_time - start_time
-            print(f"📊 Queue: {remaining} | Scraped: {len(scraped)} | Time: {elapsed:.0f}s")
+            print_status(current_time - start_time)
             last_status = current_time
 
-        # Checkpoint every 3 minutes (180 seconds)
-        if current_time - last_checkpoint > 180:
-            save_checkpoint()
-            last_checkpoint = current_time
+        # Metrics snapshot every METRICS_INTERVAL seconds
+        if current_time - last_snapshot > METRICS_INTERVAL:
+            save_metrics()
+            last_snapshot = current_time
 
         sleep(1)
 
-    url_queue.join()
+    for t in threads:
+        t.join()
+
+def print_status(elapsed):
+    busy_hosts = sorted(scheduler.stats().items(), key=lambda item: -item[1][0])[:5]
+    counts = frontier.counts()
+    pages_per_sec, bytes_per_sec = metrics.rates()
+    print(f"📊 Queue: {counts[QUEUED]} | Scraped: {counts[DONE]} | Failed: {counts[FAILED]} | "
+          f"{pages_per_sec:.1f} pages/s, {bytes_per_sec / 1e6:.2f} MB/s | Time: {elapsed:.0f}s")
+    for netloc, (host_queued, in_flight, limit, rate) in busy_hosts:
+        print(f"   🌐 {netloc}: {host_queued} queued, {in_flight}/{limit} in flight, {rate} req/s")
+
+async def async_fetch(http, url, label):
+    """Fetch, extract and save one page on the event loop"""
+    import aiohttp
+
+    # Frontier reads and writes are SQLite calls; like the file writes, they run off the loop
+    if not await asyncio.to_thread(frontier.claim, url):
+        scheduler.release(url)  # already handled elsewhere
+        return
+    headers = await asyncio.to_thread(conditional_headers, url)
+
+    host = urlparse(url).netloc
+    start = time.perf_counter()
+    try:
+        async with http.get(url, headers=headers) as response:
+            fetch_seconds = time.perf_counter() - start  # Time to headers; body read time added below
+            nbytes = 0
+            status = response.status
+            etag = response.headers.get('etag')
+            last_modified = response.headers.get('last-modified')
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            content_type = response.headers.get('content-type', '').lower()
+            parsed = None
+            skipped = transport.skip_reason(content_type, response.content_length) if status < 300 else None
+            if status < 300 and skipped is None:
+                # Wait for parse capacity before reading the body, so pending HTML stays bounded; the
+                # session's timeouts are per socket read, so this wait is not mistaken for a slow host
+                async with parse_slots:
+                    read_start = time.perf_counter()
+                    html, nbytes = await transport.read_html(response)
+                    parse_start = time.perf_counter()
+                    fetch_seconds += parse_start - read_start
+                    if html is None:
+                        skipped = f"body too large: over {transport.MAX_BODY_BYTES} bytes"
+                    else:
+                        if response_cache is not None:
+                            await asyncio.to_thread(response_cache.put, url, status, response.headers, html)
+                        if parse_pool is None:
+                            parsed = await asyncio.to_thread(parse_worker.parse_page, url, html)
+                        else:
+                            loop = asyncio.get_running_loop()
+                            parsed = await loop.run_in_executor(parse_pool, parse_worker.parse_page, url, html)
+                        metrics.observe_parse(host, time.perf_counter() - parse_start)
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+        metrics.observe_fetch(host, time.perf_counter() - start, describe_error(e))
+        await asyncio.to_thread(retry_fetch, url, None, label, describe_error(e))
+        return
+    except aiohttp.ClientError as e:
+        metrics.observe_fetch(host, time.perf_counter() - start, describe_error(e))
+        await asyncio.to_thread(frontier.fail, url)
+        scheduler.release(url)
+        metrics.count_page("failed")
+        print(f"⚠️ [{label}] Failed: {describe_error(e)}")
+        return
+    except Exception as e:
+        await asyncio.to_thread(frontier.fail, url)
+        scheduler.release(url)
+        metrics.count_page("failed")
+        print(f"❌ [{label}] Error: {e}")
+        return
+    metrics.observe_fetch(host, fetch_seconds, status, nbytes)
+
+    if status in RETRY_STATUSES:
+        await asyncio.to_thread(retry_fetch, url, retry_after, label, describe_status(status))
+        return
+
+    try:
+        if status == 304:
+            await asyncio.to_thread(frontier.complete, url)
+            metrics.count_page("not_modified")
+            print(f"💤 [{label}] Not modified")
+        elif status >= 400:
+            await asyncio.to_thread(frontier.fail, url)
+            metrics.count_page("failed")
+            print(f"⚠️ [{label}] Failed: {describe_status(status)}")
+        elif parsed is None:
+            # Non-HTML or oversized bodies were abandoned after the headers
+            await asyncio.to_thread(frontier.complete, url)
+            metrics.count_page("skipped")
+            print(f"⚠️ [{label}] Skipping {skipped}")
+        else:
+            await asyncio.to_thread(store_page, url, parsed, label, etag, last_modified)
+    except Exception as e:
+        await asyncio.to_thread(frontier.fail, url)
+        metrics.count_page("failed")
+        print(f"❌ [{label}] Error: {e}")
+    finally:
+        scheduler.complete(url)
+
+async def async_monitor():
+    """Print status every 60 seconds and snapshot metrics every METRICS_INTERVAL seconds"""
+    start_time = time.time()
+    last_status = start_time
+    last_snapshot = start_time
+    while True:
+        await asyncio.sleep(1)
+        current_time = time.time()
+        if current_time - last_status > 60:
+            await asyncio.to_thread(print_status, current_time - start_time)  # frontier.counts() is a SQLite scan
+            last_status = current_time
+        if current_time - last_snapshot > METRICS_INTERVAL:
+            await asyncio.to_thread(save_metrics)
+            last_snapshot = current_time
 
-except KeyboardInterrupt:
-    print("\n🛑 Interrupted by user, saving current state...")
-    with visited_lock:
-        save_state()
-    save_checkpoint()
-    print("💾 State and checkpoint saved, exiting...")
-    exit(0)
-
-# Final save
-print("💾 Performing final state save...")
-with visited_lock:
-    save_state()
-save_checkpoint()
-
-print(f"🎉 Done crawling! Total pages scraped: {len(scraped)}")
-print(f"📊 Final stats: {counter} files saved to {OUTPUT_FOLDER}")
+async def crawl_async(concurrency):
+    global parse_slots
+
+    parse_slots = asyncio.Semaphore(PARSE_QUEUE_SIZE)
+    slots = asyncio.Semaphore(concurrency)
+    wakeup = asyncio.Event()
+    tasks = set()
+    task_ids = iter(range(1, 1 << 62))
+
+    async def run_one(url):
+        try:
+            await async_fetch(http, url, f"A{next(task_ids)}")
+        finally:
+            slots.release()
+            wakeup.set()
+
+    async with transport.make_client_session(concurrency) as http:
+        print(f"🚀 Dispatching up to {concurrency} requests on one event loop...")
+        monitor = asyncio.create_task(async_monitor())
+        save_metrics()
+        try:
+            while True:
+                await slots.acquire()
+                url, wait = scheduler.next_ready()
+                if url is None:
+                    slots.release()
+                    if scheduler.is_idle():
+                        break
+                    # Sleep until a host's token/pause expires or a request finishes
+                    wakeup.clear()
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=min(wait, 1.0))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task = asyncio.create_task(run_one(url))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in list(tasks) + [monitor]:
+                task.cancel()
+            await asyncio.gather(*tasks, monitor, return_exceptions=True)
+
+def backfill_page_indexes():
+    """Map imported URLs to their existing utm_pages files so a recrawl rewrites them in place"""
+    corpus = page_store if page_store is not None else PageDirectory(OUTPUT_FOLDER)
+    # Frontier rows are canonical; page headers hold the URL as it was first crawled.
+    # The latest file (highest id) of a URL wins.
+    latest = {}
+    for header in corpus.iter_headers():
+        if header.url:
+            latest[canonicalize(header.url)] = header.id
+    return frontier.set_file_indexes(latest.items())
+
+def plan_recrawl(use_sitemaps=True):
+    """Queue done pages again, skipping those whose sitemap lastmod predates our last fetch"""
+    done = list(frontier.iter_done())
+    if any(file_index is None and alias_of is None for _, file_index, _, alias_of in done):
+        print(f"🗂️ Linked {backfill_page_indexes()} imported URLs to their utm_pages files")
+        done = list(frontier.iter_done())
+
+    sitemap_lastmod = {}
+    if use_sitemaps:
+        hosts = sorted({urlparse(url).netloc for url, _, _, _ in done})
+        print(f"🗺️ Reading sitemaps for {len(hosts)} hosts...")
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            host_entries = list(pool.map(lambda host: fetch_sitemap_entries(session, host), hosts))
+        new_urls = []
+        for entries in host_entries:
+            for loc, lastmod in entries:
+                if not is_valid(loc):
+                    continue
+                loc = canonicalize(loc)
+                sitemap_lastmod[url_key(loc)] = lastmod
+                with visited_lock:
+                    if seen_urls.add(loc):
+                        new_urls.append(loc)
+        added = frontier.enqueue(new_urls)
+        print(f"🗺️ {len(sitemap_lastmod)} sitemap entries, {len(added)} new URLs")
+
+    requeued = unchanged = 0
+    for url, _, fetched_at, _ in done:
+        lastmod = sitemap_lastmod.get(url_key(url))
+        if lastmod is not None and fetched_at is not None and lastmod <= fetched_at:
+            unchanged += 1
+            continue
+        if frontier.requeue_done(url):
+            requeued += 1
+    print(f"🔁 Recrawl: {requeued} pages queued for conditional fetch, {unchanged} unchanged per sitemap")
+
+def reextract():
+    """Regenerate stored page text from the response cache and queue newly found links, without fetching"""
+    count, size = response_cache.stats()
+    print(f"♻️ Re-extracting {count} cached responses ({size / 1e6:.1f} MB compressed)...")
+    rewritten = unchanged = uncached = 0
+    new_links = 0
+    start_time = time.time()
+    for batch in response_cache.iter_compressed(REEXTRACT_BATCH):
+        urls = [url for url, _ in batch]
+        blobs = [blob for _, blob in batch]
+        if parse_pool is not None:
+            results = parse_pool.map(parse_worker.parse_cached, urls, blobs, chunksize=16)
+        else:
+            results = map(parse_worker.parse_cached, urls, blobs)
+        for url, (text, content_hash, fingerprint, links) in zip(urls, results):
+            new_links += len(claim_new_links(links))
+            row = frontier.get(url)
+            if row is None or row["file_index"] is None:
+                uncached += 1  # Not a stored page (alias, failed or unknown to this frontier)
+                continue
+            if row["content_hash"] == content_hash:
+                unchanged += 1
+                continue
+            write_page(row["file_index"], url, text, content_hash)
+            frontier.update_content(url, content_hash, fingerprint)
+            rewritten += 1
+        done = rewritten + unchanged + uncached
+        print(f"♻️ {done}/{count} pages ({done / max(time.time() - start_time, 1e-6):.0f}/s): "
+              f"{rewritten} rewritten, {unchanged} unchanged, +{new_links} new links queued")
+    print(f"✅ Re-extraction done in {time.time() - start_time:.0f}s: {rewritten} pages rewritten, {unchanged} unchanged, "
+          f"{uncached} without a page file, {new_links} new URLs queued for the next crawl")
+
+def run_async(concurrency):
+    asyncio.run(crawl_async(concurrency))
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl UTM pages into utm_pages/")
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads',
+                        help='threads: blocking worker pool; async: single event loop with many requests in flight')
+    parser.add_argument('--concurrency', type=int, default=ASYNC_CONCURRENCY,
+                        help='Requests in flight for --engine async')
+    parser.add_argument('--recrawl', action='store_true',
+                        help='Refresh already scraped pages with conditional requests, rewriting only changed files')
+    parser.add_argument('--no-sitemaps', action='store_true',
+                        help='With --recrawl, do not seed from sitemap.xml lastmod values')
+    parser.add_argument('--parser', choices=['auto'] + list(BACKENDS), default='auto',
+                        help='HTML extraction backend (auto picks the fastest installed)')
+    parser.add_argument('--store', choices=['files', 'segments'], default='files',
+                        help='files: one utm_pages/NNNNN.txt per page; segments: compressed page_store/ (see page_store.py)')
+    parser.add_argument('--parse-workers', type=int, default=PARSE_WORKERS,
+                        help='Processes for text extraction and link discovery (0 = parse in the fetch threads)')
+    parser.add_argument('--near-dup-similarity', type=float, default=NEAR_DUP_SIMILARITY,
+                        help='SimHash similarity (0-1) at which a new page is recorded as an alias of a stored one; 0 disables')
+    parser.add_argument('--skip-duplicate-links', action='store_true',
+                        help='Do not follow links found on near-duplicate pages')
+    parser.add_argument('--cache-responses', action='store_true',
+                        help=f'Keep compressed HTML, headers and status of every page in {RESPONSE_CACHE}')
+    parser.add_argument('--reextract', action='store_true',
+                        help=f'Re-run text and link extraction over {RESPONSE_CACHE} instead of crawling')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help='Serve /metrics (Prometheus) and /metrics.json on 127.0.0.1 at this port; 0 disables')
+    args = parser.parse_args()
+
+    open_state()
+    global parse_pool, page_store, near_dups, expand_duplicates, response_cache
+    if args.store == 'segments':
+        page_store = PageStore(PAGE_STORE)
+        print(f"🗄️ Writing pages to the segmented store in {PAGE_STORE}/")
+    parser_name, _ = get_extractor(args.parser)
+    if args.parse_workers > 0:
+        # Spawned, not forked: the pool starts from a fetch thread while other threads are running
+        parse_pool = ProcessPoolExecutor(max_workers=args.parse_workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=parse_worker.init_worker, initargs=(args.parser,))
+        print(f"🧩 Extracting with {parser_name} in {args.parse_workers} parse processes")
+    else:
+        parse_worker.init_worker(args.parser)
+        print(f"🧩 Extracting with {parser_name} in the fetch threads")
+
+    if args.cache_responses or args.reextract:
+        response_cache = ResponseCache(RESPONSE_CACHE)
+    if args.reextract:
+        reextract()
+        response_cache.close()
+        frontier.close()
+        if page_store is not None:
+            page_store.close()
+        if parse_pool is not None:
+            parse_pool.shutdown()
+        return
+    if args.cache_responses:
+        print(f"🗃️ Caching raw responses in {RESPONSE_CACHE}")
+
+    if args.near_dup_similarity > 0:
+        near_dups = SimHashIndex(args.near_dup_similarity)
+        for url, fingerprint in frontier.iter_fingerprints():
+            near_dups.add(url, fingerprint)
+        expand_duplicates = not args.skip_duplicate_links
+        print(f"🪞 Near-duplicate check at {args.near_dup_similarity:.0%} similarity "
+              f"(≤{near_dups.distance} bits) against {len(near_dups)} fingerprinted pages")
+
+    if args.metrics_port:
+        try:
+            serve_metrics(metrics, args.metrics_port)
+            print(f"📈 Metrics at http://127.0.0.1:{args.metrics_port}/metrics (snapshots in {METRICS_FILE})")
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint not started ({e}); snapshots still go to {METRICS_FILE}")
+
+    if args.recrawl:
+        plan_recrawl(use_sitemaps=not args.no_sitemaps)
+    load_queue()
+
+    try:
+        if args.engine == 'async':
+            run_async(args.concurrency)
+        else:
+            run_threaded()
+
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted by user, saving current state...")
+        save_metrics()
+        frontier.close()  # in-flight URLs are re-queued on the next start
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+        print("💾 State and metrics saved, exiting...")
+        exit(0)
+
+    # Final save
+    print("💾 Performing final state save...")
+    save_metrics()
+    done = frontier.counts()[DONE]
+    frontier.close()
+    if page_store is not None:
+        page_store.close()
+    if response_cache is not None:
+        response_cache.close()
+    if parse_pool is not None:
+        parse_pool.shutdown()
+
+    print(f"🎉 Done crawling! Total pages scraped: {done}")
+    print(f"📊 Final stats: {counter} files saved to {PAGE_STORE if page_store is not None else OUTPUT_FOLDER}")
+
+if __name__ == "__main__":
+    main()
@@ -1,194 +1,343 @@
 import os
-import json
 import hashlib
-import uuid
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import perf_counter
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
-from supabase import create_client
-from time import sleep
-
-# Load environment variables
-load_dotenv()
-NEXT_PUBLIC_SUPABASE_URL: str = os.getenv("SUPABASE_URL")
-SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
-supabase = create_client(NEXT_PUBLIC_SUPABASE_URL, SUPABASE_KEY)
-
-model = SentenceTransformer("all-MiniLM-L6-v2")
-input_folder = "utm_pages"
-CHUNK_SIZE = 200
-seen_file = "seen.json"
-progress_file = "last_processed_file.txt"
-BATCH_EMBED = 32
-BATCH_UPLOAD = 50
-FILES_PER_PASS = 500
-MAX_FILES = None  # Maximum total files to process (set to None for no limit)
-
-print("🚀 Starting vectorization pipeline...")
-
-# Load or initialize seen cache
-if os.path.exists(seen_file):
-    with open(seen_file, "r") as f:
-        seen_hashes = set(json.load(f))
-else:
-    seen_hashes = set()
-
-def clean_text(text):
-    text = text.replace('\u0000', '')
-    text = ''.join(char for char in text if ord(char) >= 32 or char in '\n\r\t')
-    return ' '.join(text.split())
-
-def chunk_text(text, max_words=CHUNK_SIZE):
-    text = clean_text(text)
-    words = text.split()
-    return [" ".join(words[i:i + max_words]) for i in range(0, len(words), max_words)]
+from page_store import open_corpus
+from chunker import Chunker
+from index_manifest import Entry, IndexManifest, plan_reindex
+from embedding_cache import EmbeddingCache, encode_cached
+from embed_engine import EmbeddingEngine
+from embed_backends import cache_name, load_model
+from uploader import chunk_id
+from vector_sinks import open_sink
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+SINK = "supabase"  # "supabase" (REST), "postgres" (COPY to DATABASE_URL) or "parquet" (offline staging files)
+EMBED_BACKEND = "torch"  # "torch", "onnx" or "onnx-int8"; python bench_backends.py compares them
+input_folder = None  # page_store/ if it exists, else utm_pages/
+CHUNK_TOKENS = None  # Target tokens per chunk; None fills the model's window (max_seq_length)
+CHUNK_OVERLAP = 32  # Tokens of trailing sentences repeated at the start of the next chunk
+manifest_file = "index_manifest.db"  # index_manifest.py: indexed pages and their chunk ids, one per sink
+TOKENS_PER_BATCH = 8192  # Padded tokens per forward pass; chunks are bucketed by length to fill it
+BATCH_UPLOAD = 50  # Chunks per work item and per upsert
+MAX_FILES = None  # Maximum new or changed pages to process per run (set to None for no limit)
+MAX_REMOVED_FRACTION = 0.2  # Refuse to delete removed pages above this share of the index (a missing corpus)
+
+# Pipeline: read/chunk -> embed -> upload, each stage with its own workers and a bounded queue in front
+READ_WORKERS = 1
+EMBED_WORKERS = 1  # Threads feeding the encoder; the parallelism is in ENCODE_PROCESSES
+ENCODE_PROCESSES = os.cpu_count() or 1  # Model copies encoding in parallel; 0 encodes in this process (e.g. on a GPU)
+UPLOAD_WORKERS = 8  # Upserts are network-bound; they share one pooled HTTP client
+QUEUE_DEPTH = 8  # Work items (of BATCH_UPLOAD chunks) allowed to wait between stages
+SAVE_EVERY = 100  # Flush the sink and record finished pages after this many uploaded chunks (parquet sets its own)
+USE_EMBEDDING_CACHE = True  # Reuse vectors of identical chunks from embedding_cache/ (any page, any run)
 
 def fingerprint(text, url):
     return hashlib.sha256((text + url).encode("utf-8")).hexdigest()
 
-def save_seen():
-    with open(seen_file, "w") as f:
-        json.dump(list(seen_hashes), f)
-
-def load_last_processed_index():
-    if os.path.exists(progress_file):
-        with open(progress_file, "r") as f:
-            return int(f.read().strip())
-    return 0
-
-def save_last_processed_index(index):
-    with open(progress_file, "w") as f:
-        f.write(str(index))
-
-# Get ALL files, sort them for consistent ordering
-all_filenames = sorted(os.listdir(input_folder))
-total_available_files = len(all_filenames)
-
-# Load last processed file index
-last_processed_idx = load_last_processed_index()
-print(f"📄 Last processed file index: {last_processed_idx}")
-
-# Start from where we left off
-all_filenames = all_filenames[last_processed_idx:]
-
-if MAX_FILES is not None:
-    all_filenames = all_filenames[:MAX_FILES]
-    print(f"🎯 Limited to {MAX_FILES} files (out of {total_available_files} total)")
-
-total_files = len(all_filenames)
-start_idx = 0
-print(f"📊 Will process {total_files} files starting from index {last_processed_idx}")
-
-uploaded_total = 0
-
-while start_idx < total_files:
-    new_chunks = []
-    batch_files = all_filenames[start_idx:start_idx + FILES_PER_PASS]
-
-    if not batch_files:
-        break
-
-    actual_file_indices = range(last_processed_idx + start_idx + 1, last_processed_idx + start_idx + len(batch_files) + 1)
-    print(f"\n📦 Processing batch: files {actual_file_indices.start}–{actual_file_indices.stop - 1} of {total_available_files}")
-
-    for file_idx, filename in enumerate(batch_files, start=start_idx + 1):
-        actual_file_idx = last_processed_idx + file_idx
-        print(f"📄 File {actual_file_idx}/{total_available_files}: {filename}")
-        path = os.path.join(input_folder, filename)
-        with open(path, "r", encoding="utf-8") as f:
-            content = f.read()
-            lines = content.splitlines()
-            if not lines or not lines[0].startswith("URL:"):
-                continue
-            url = lines[0][5:].strip()
-            body = "\n".join(lines[2:])
-            for chunk in chunk_text(body):
-                hash_id = fingerprint(chunk, url)
-                if hash_id not in seen_hashes:
-                    new_chunks.append((chunk, url, hash_id))
-
-    print(f"✅ {len(new_chunks)} new chunks to embed and upload...")
-
-    if not new_chunks:
-        print("🟡 No new data found in this batch. Moving to next batch...\n")
-        # Still need to update progress even when no new chunks found
-        last_processed_idx += len(batch_files)
-        save_last_processed_index(last_processed_idx)
-        start_idx += FILES_PER_PASS
-        continue
-
-    # Step 2: Embed & Upload
-    batch_embed, batch_hashes, batch_urls = [], [], []
-    uploaded_count = 0
-
-    for chunk, url, hash_id in new_chunks:
-        batch_embed.append(chunk)
-        batch_hashes.append(hash_id)
-        batch_urls.append(url)
-
-        if len(batch_embed) >= BATCH_EMBED:
-            try:
-                vectors = model.encode(batch_embed, batch_size=BATCH_EMBED, show_progress_bar=False)
-                upload_batch = []
-                for i in range(len(batch_embed)):
-                    upload_batch.append({
-                        "id": str(uuid.uuid4()),
-                        "content": batch_embed[i],
-                        "url": batch_urls[i],
-                        "embedding": vectors[i].tolist()
-                    })
-                    seen_hashes.add(batch_hashes[i])
-
-                for i in range(0, len(upload_batch), BATCH_UPLOAD):
-                    sub_batch = upload_batch[i:i + BATCH_UPLOAD]
-                    supabase.table("utmgpt_chunks").insert(sub_batch).execute()
-                    uploaded_count += len(sub_batch)
-                    uploaded_total += len(sub_batch)
-                    print(f"⬆️ Uploaded {uploaded_total} total chunks")
-
-                batch_embed.clear()
-                batch_hashes.clear()
-                batch_urls.clear()
-
-                if uploaded_total % 100 == 0:
-                    save_seen()
-
-            except Exception as e:
-                print(f"⚠️ Error during batch upload: {e}")
-                sleep(1)
-                continue
-
-    # Upload any leftovers
-    if batch_embed:
+def sink_file(path):
+    """Per-sink name for a state file: what one sink has stored says nothing about another"""
+    if SINK == "supabase":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{SINK}{ext}"
+
+def checkpoint():
+    """Make what has been uploaded durable: the sink first, then the manifest.
+
+    Pages are taken before the flush, so they only cover rows (and deletes)
+    the sink had already accepted, which the flush stores.
+    """
+    global indexed_pages
+    with checkpoint_lock:
+        with count_lock:
+            pages = pending_pages[:]
+            pending_pages.clear()
+            removed = pending_removed[:]
+            pending_removed.clear()
+        sink.flush()
+        manifest.record(pages)
+        manifest.remove(removed)
+        indexed_pages += len(pages)
+        if embedding_cache is not None:
+            embedding_cache.commit()
+
+def complete_page(update):
+    """All new chunks of a page are stored: delete the rows it no longer has, then queue its manifest entry"""
+    global deleted_total
+    entry, stale_ids, replaced_urls = update
+    if stale_ids and not sink.delete(stale_ids):
+        return  # The manifest keeps the old version, so the next run deletes them
+    with count_lock:
+        pending_pages.append(entry)
+        pending_removed.extend(replaced_urls)  # Keys of the page's old, non-canonical entries
+        deleted_total += len(stale_ids)
+
+class PageTracker:
+    """Count each page's chunks through the pipeline and hand the page on once all are stored.
+
+    Pages finish out of order once stages overlap. A page that lost a chunk
+    (an embedding error or a dead-lettered batch) is not handed on, so the
+    manifest keeps its old entry and the next run tries it again.
+    """
+
+    def __init__(self, on_done):
+        self.lock = Lock()
+        self.on_done = on_done
+        self.pending = {}  # position -> [chunks not yet stored, all stored so far, update]
+
+    def register(self, position, chunk_count, update):
+        if not chunk_count:
+            self.on_done(update)
+            return
+        with self.lock:
+            self.pending[position] = [chunk_count, True, update]
+
+    def finish(self, positions, ok=True):
+        """Mark one chunk done (stored if ok) for each position in the list"""
+        done = []
+        with self.lock:
+            for position in positions:
+                state = self.pending[position]
+                state[0] -= 1
+                state[1] = state[1] and ok
+                if not state[0]:
+                    del self.pending[position]
+                    if state[1]:
+                        done.append(state[2])
+        for update in done:
+            self.on_done(update)
+
+class StageTimer:
+    def __init__(self):
+        self.lock = Lock()
+        self.busy = {}
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.busy[stage] = self.busy.get(stage, 0.0) + seconds
+
+def read_stage(work, chunk_queue):
+    """Read new and changed pages, chunk them and queue batches of chunks not stored yet"""
+    batch = []
+    while True:
+        with work_lock:
+            item = next(work, None)
+        if item is None:
+            break
+        position, planned = item
+        start = perf_counter()
+        new_chunks = []
+        chunk_ids = []
+        page_ids = set()
+        # Rows of the indexed version can be kept only if it was indexed the same way
+        stored = set(planned.old_ids or ()) if planned.old_config == config else set()
+        page = corpus.get(planned.page_id)
+        if page is not None and page.url:
+            for chunk in chunker.chunk(page.text):
+                row_id = chunk_id(fingerprint(chunk, page.url))
+                if row_id in page_ids:
+                    continue  # A chunk repeated within a page is one row
+                page_ids.add(row_id)
+                chunk_ids.append(row_id)
+                if row_id not in stored:
+                    new_chunks.append((chunk, page.url, row_id, position))
+        content_hash = page.content_hash if page is not None else planned.content_hash
+        stale_ids = [old_id for old_id in planned.old_ids or () if old_id not in page_ids]
+        tracker.register(position, len(new_chunks),
+                         (Entry(planned.url, content_hash, config, chunk_ids), stale_ids, planned.old_urls))
+        timer.add("read", perf_counter() - start)
+        if (position + 1) % 500 == 0:
+            print(f"📄 Read {position + 1}/{total_files} pages")
+
+        for chunk in new_chunks:
+            batch.append(chunk)
+            if len(batch) >= BATCH_UPLOAD:
+                chunk_queue.put(batch)  # Blocks while the embedders are behind
+                batch = []
+    if batch:
+        chunk_queue.put(batch)
+
+def take_batches(chunk_queue):
+    """Wait for one work item, then take any others already queued (up to QUEUE_DEPTH).
+
+    Returns (batches, stop); stop is True once this worker's None has been taken.
+    More chunks per encode call give the engine more to bucket by length.
+    """
+    first = chunk_queue.get()
+    if first is None:
+        return [], True
+    batches = [first]
+    while len(batches) < QUEUE_DEPTH:
         try:
-            vectors = model.encode(batch_embed, batch_size=BATCH_EMBED, show_progress_bar=False)
-            upload_batch = [{
-                "id": str(uuid.uuid4()),
-                "content": batch_embed[i],
-                "url": batch_urls[i],
-                "embedding": vectors[i].tolist()
-            } for i in range(len(batch_embed))]
-
-            for i in range(0, len(upload_batch), BATCH_UPLOAD):
-                sub_batch = upload_batch[i:i + BATCH_UPLOAD]
-                supabase.table("utmgpt_chunks").insert(sub_batch).execute()
-                uploaded_count += len(sub_batch)
-                uploaded_total += len(sub_batch)
-                print(f"⬆️ Uploaded {uploaded_total} total chunks")
-
-            for hash_id in batch_hashes:
-                seen_hashes.add(hash_id)
-
+            item = chunk_queue.get_nowait()
+        except Empty:
+            break
+        if item is None:
+            return batches, True
+        batches.append(item)
+    return batches, False
+
+def embed_stage(chunk_queue, upload_queue):
+    stop = False
+    while not stop:
+        batches, stop = take_batches(chunk_queue)
+        if not batches:
+            continue
+        start = perf_counter()
+        texts = [chunk for batch in batches for chunk, _, _, _ in batch]
+        try:
+            if embedding_cache is not None:
+                vectors = encode_cached(encoder, embedding_cache, texts)
+            else:
+                vectors = encoder.encode(texts)
         except Exception as e:
-            print(f"⚠️ Error during final batch upload: {e}")
-
-    save_seen()
-    # Update the last processed file index
-    last_processed_idx += len(batch_files)
-    save_last_processed_index(last_processed_idx)
-    start_idx += FILES_PER_PASS
-
-print(f"\n🎉 All done. Total chunks uploaded: {uploaded_total}")
-if MAX_FILES is not None:
-    print(f"📊 Processed {total_files} files (limited by MAX_FILES={MAX_FILES})")
-print(f"📍 Last processed file index: {last_processed_idx}")
-print(f"💡 Next run will start from file index {last_processed_idx}")
+            print(f"⚠️ Error during embedding: {e}")
+            tracker.finish([position for batch in batches for _, _, _, position in batch], ok=False)
+            continue
+        timer.add("embed", perf_counter() - start)
+        offset = 0
+        for batch in batches:
+            rows = [{
+                "id": row_id,
+                "content": chunk,
+                "url": url,
+                "embedding": vector  # NumPy row; each sink serializes it its own way
+            } for (chunk, url, row_id, _), vector in zip(batch, vectors[offset:offset + len(batch)])]
+            offset += len(batch)
+            upload_queue.put((rows, batch))
+
+def upload_stage(upload_queue):
+    global uploaded_total
+    while True:
+        item = upload_queue.get()
+        if item is None:
+            break
+        rows, batch = item
+        start = perf_counter()
+        ok = False
+        try:
+            # Retries with backoff, then dead-letters the batch; ids are stable, so a resend never duplicates
+            ok = sink.upload(rows)
+            if not ok:
+                continue
+            with count_lock:
+                uploaded_total += len(rows)
+                total = uploaded_total
+            print(f"⬆️ Uploaded {total} total chunks")
+            save_every = sink.checkpoint_rows or SAVE_EVERY
+            if total // save_every != (total - len(rows)) // save_every:
+                checkpoint()
+        finally:
+            timer.add("upload", perf_counter() - start)
+            tracker.finish([position for _, _, _, position in batch], ok)
+
+def start_workers(count, target, args, name):
+    threads = [Thread(target=target, args=args, daemon=True, name=f"{name}-{i + 1}") for i in range(count)]
+    for t in threads:
+        t.start()
+    return threads
+
+def stop_workers(threads, queue):
+    for _ in threads:
+        queue.put(None)
+    for t in threads:
+        t.join()
+
+if __name__ == "__main__":
+    # Guarded: ENCODE_PROCESSES workers are spawned and re-import this file
+    # Load environment variables
+    load_dotenv()
+
+    model = load_model(MODEL_NAME, EMBED_BACKEND)
+    dim = model.get_sentence_embedding_dimension()
+    sink = open_sink(SINK, dim)
+    print(f"🚀 Starting vectorization pipeline (sink: {SINK})...")
+
+    embedding_cache = None
+    if USE_EMBEDDING_CACHE:
+        embedding_cache = EmbeddingCache(cache_name(MODEL_NAME, EMBED_BACKEND), dim)
+        print(f"🧠 Embedding cache holds {len(embedding_cache)} vectors")
+
+    encoder = EmbeddingEngine(model, MODEL_NAME, ENCODE_PROCESSES, TOKENS_PER_BATCH, EMBED_BACKEND)
+
+    chunker = Chunker.for_model(model, CHUNK_TOKENS, CHUNK_OVERLAP)
+    print(f"✂️ Chunks of up to {chunker.budget} tokens with {chunker.overlap} tokens of overlap")
+
+    # Diff the corpus against what is indexed: only new and changed pages are read
+    manifest = IndexManifest(sink_file(manifest_file))
+    config = f"{cache_name(MODEL_NAME, EMBED_BACKEND)} {chunker.budget}/{chunker.overlap}"
+    corpus = open_corpus(input_folder)
+    planned_pages, unchanged, removed = plan_reindex(manifest, corpus, config)
+    changed = sum(1 for planned in planned_pages if planned.old_ids is not None)
+    print(f"📊 {len(planned_pages) - changed} new, {changed} changed, {unchanged} unchanged, "
+          f"{len(removed)} removed pages")
+
+    if MAX_FILES is not None:
+        planned_pages = planned_pages[:MAX_FILES]
+        print(f"🎯 Limited to {MAX_FILES} pages this run")
+
+    total_files = len(planned_pages)
+    print(f"🧵 Workers: {READ_WORKERS} read, {EMBED_WORKERS} embed ({ENCODE_PROCESSES} encode processes), "
+          f"{UPLOAD_WORKERS} upload (queue depth {QUEUE_DEPTH})")
+
+    uploaded_total = 0
+    deleted_total = 0
+    indexed_pages = 0
+    pending_pages = []  # Manifest entries of finished pages, recorded at the next checkpoint
+    pending_removed = []  # URLs of removed pages whose rows are deleted
+    count_lock = Lock()
+    checkpoint_lock = Lock()
+    work_lock = Lock()
+    tracker = PageTracker(complete_page)
+    timer = StageTimer()
+    work = iter(enumerate(planned_pages))
+    chunk_queue = Queue(maxsize=QUEUE_DEPTH)
+    upload_queue = Queue(maxsize=QUEUE_DEPTH)
+
+    started = perf_counter()
+    uploaders = start_workers(UPLOAD_WORKERS, upload_stage, (upload_queue,), "upload")
+    embedders = start_workers(EMBED_WORKERS, embed_stage, (chunk_queue, upload_queue), "embed")
+    readers = start_workers(READ_WORKERS, read_stage, (work, chunk_queue), "read")
+    interrupted = False
+    try:
+        for t in readers:
+            t.join()
+        stop_workers(embedders, chunk_queue)
+        stop_workers(uploaders, upload_queue)
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n🛑 Interrupted, recording fully uploaded pages...")
+
+    if removed and not interrupted:
+        if len(removed) > MAX_REMOVED_FRACTION * len(manifest):
+            print(f"⚠️ Not deleting {len(removed)} removed pages: over {MAX_REMOVED_FRACTION:.0%} of the index, "
+                  f"check that {input_folder or 'the corpus'} is complete (raise MAX_REMOVED_FRACTION if it is)")
+        else:
+            removed_ids = [row_id for entry in removed for row_id in entry.chunk_ids]
+            if sink.delete(removed_ids):
+                pending_removed.extend(entry.url for entry in removed)
+                deleted_total += len(removed_ids)
+
+    encoder.close()
+    checkpoint()
+    sink.close()
+    if embedding_cache is not None:
+        embedding_cache.close()
+    elapsed = perf_counter() - started
+
+    print(f"\n🎉 All done. Total chunks uploaded: {uploaded_total}, rows deleted: {deleted_total}")
+    busy = ", ".join(f"{stage} {seconds:.0f}s" for stage, seconds in timer.busy.items())
+    print(f"⏱️ {elapsed:.0f}s wall; busy time per stage (summed over workers): {busy}")
+    if embedding_cache is not None:
+        print(f"🧠 Embedding cache: {embedding_cache.lookups} chunks, {embedding_cache.encoded} encoded "
+              f"({embedding_cache.hit_rate():.1%} hit rate)")
+    if sink.failed_rows:
+        print(f"⚠️ {sink.failed_rows} chunks could not be uploaded and were saved to {sink.dead_letter}; "
+              f"python uploader.py --sink {SINK} replay re-sends them")
+    if MAX_FILES is not None:
+        print(f"📊 Processed {total_files} pages (limited by MAX_FILES={MAX_FILES})")
+    print(f"📍 {indexed_pages} pages indexed this run; {len(manifest)} in {sink_file(manifest_file)}")
+    manifest.close()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# vector_index.py - local exact and IVF similarity search over the pipeline's embeddings
+
+"""On-disk vector index for retrieval without the hosted database.
+
+The same top-k cosine search as Supabase's match_documents_uuid RPC, over
+the rows the pipeline produced (staged Parquet files or a Postgres
+table), so retrieval can be served, tested and tuned offline.
+
+Layout of an index directory (all written to a temporary directory and
+swapped in when complete):
+
+  vectors.npy        unit-length rows, float32 or float16, grouped by IVF list
+  ivf_centroids.npy  one unit-length centroid per list (float32)
+  ivf_offsets.npy    row where each list starts, plus the row count
+  docs.jsonl         id, url and content of each row, in row order
+  doc_offsets.npy    byte offset of each docs.jsonl line, plus its size
+  meta.json          model, dimension, dtype, row and list counts
+
+Opening an index memory-maps the arrays, so it takes milliseconds and
+pages are only read as searches touch them.
+
+Exact search multiplies the queries against blocks of BLOCK_ROWS rows at
+a time and merges each block's top k, so memory stays flat however large
+the index is. float16 halves the file and the page cache it needs, with
+the same top k in practice, but NumPy widens each block to float32
+before multiplying, which makes exact search several times slower; it
+pays off with IVF search, which only widens the lists it probes.
+
+The approximate search is an inverted file (IVF): spherical k-means
+splits the rows into about 4*sqrt(n) lists, and a query scans only the
+nprobe lists whose centroids are closest to it. Rows are stored grouped
+by list, so each probe is one contiguous slice of vectors.npy and exact
+search is unaffected by the grouping. bench_vector_index.py measures
+recall against exact search, and latency, for each nprobe.
+
+    python vector_index.py build                      # from embeddings_parquet/
+    python vector_index.py build --dsn postgresql://... --dtype float16
+    python vector_index.py search "When is the tuition deadline?" --nprobe 16
+    python vector_index.py stats
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+VECTOR_INDEX = "vector_index"
+TOP_K = 15  # What utmgpt-chat's retriever asks for (retrieval_agents/route.ts)
+NPROBE = 16  # IVF lists scanned per query by default
+BLOCK_ROWS = 65536  # Rows per block in exact search and list assignment
+TRAIN_PER_LIST = 64  # k-means training sample per list
+KMEANS_ITERATIONS = 15
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Column indices of the k highest scores in each row, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+def exact_search(vectors, queries, k=TOP_K, block_rows=BLOCK_ROWS):
+    """Blocked brute-force top k by inner product; returns (scores, rows), each (queries, k)"""
+    queries = np.asarray(queries, dtype=np.float32)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        scores = queries @ block.T
+        picked = top_k(scores, k)
+        candidate_scores = np.concatenate([best_scores, np.take_along_axis(scores, picked, axis=1)], axis=1)
+        candidate_rows = np.concatenate([best_rows, picked + start], axis=1)
+        keep = top_k(candidate_scores, k)
+        best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+        best_rows = np.take_along_axis(candidate_rows, keep, axis=1)
+    return best_scores, best_rows
+
+
+def assign_lists(vectors, centroids, block_rows=BLOCK_ROWS):
+    """Nearest centroid (highest inner product) of every row"""
+    lists = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        lists[start:start + len(block)] = (block @ centroids.T).argmax(axis=1)
+    return lists
+
+
+def train_centroids(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means on a sample of the rows; returns (nlist, dim) unit centroids"""
+    rng = np.random.default_rng(seed)
+    size = min(len(vectors), nlist * TRAIN_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), size=size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        lists = assign_lists(sample, centroids)
+        counts = np.bincount(lists, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.empty_like(centroids)
+        sums[filled] = np.add.reduceat(sample[np.argsort(lists, kind="stable")], starts[filled], axis=0)
+        sums[~filled] = sample[rng.choice(len(sample), size=int((~filled).sum()))]  # Reseed empty lists
+        centroids = normalize(sums)
+    return centroids
+
+
+def default_nlist(count):
+    return max(1, min(count, int(round(4 * math.sqrt(count)))))
+
+
+def build_index(path, ids, urls, contents, vectors, dtype="float32", nlist=None, model=MODEL_NAME):
+    """Write an index directory for these rows; returns the number of IVF lists (at most one per row)"""
+    vectors = normalize(vectors)
+    nlist = min(nlist or default_nlist(len(vectors)), max(len(vectors), 1))
+    centroids = train_centroids(vectors, nlist) if len(vectors) else np.zeros((0, vectors.shape[1]), np.float32)
+    lists = assign_lists(vectors, centroids) if len(vectors) else np.zeros(0, dtype=np.int64)
+    order = np.argsort(lists, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=nlist))]).astype(np.int64)
+
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "vectors.npy"), vectors[order].astype(dtype))
+    np.save(os.path.join(tmp, "ivf_centroids.npy"), centroids)
+    np.save(os.path.join(tmp, "ivf_offsets.npy"), offsets)
+    doc_offsets = [0]
+    with open(os.path.join(tmp, "docs.jsonl"), "wb") as f:
+        for row in order:
+            line = json.dumps({"id": ids[row], "url": urls[row], "content": contents[row]}).encode("utf-8") + b"\n"
+            f.write(line)
+            doc_offsets.append(doc_offsets[-1] + len(line))
+    np.save(os.path.join(tmp, "doc_offsets.npy"), np.array(doc_offsets, dtype=np.int64))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"model": model, "dim": int(vectors.shape[1]), "dtype": dtype, "rows": len(vectors),
+                   "lists": nlist, "built_at": time.time()}, f, indent=2)
+
+    # Swap in: a reader sees either the old index or the new one
+    if os.path.exists(path):
+        os.replace(path, path + ".old")
+    os.replace(tmp, path)
+    shutil.rmtree(path + ".old", ignore_errors=True)
+    return nlist
+
+
+class VectorIndex:
+    def __init__(self, path=VECTOR_INDEX):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+        self.offsets = np.load(os.path.join(path, "ivf_offsets.npy"))
+        self.doc_offsets = np.load(os.path.join(path, "doc_offsets.npy"), mmap_mode="r")
+        self.docs = open(os.path.join(path, "docs.jsonl"), "rb")
+
+    def close(self):
+        self.docs.close()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def doc(self, row):
+        """{id, url, content} of a row"""
+        start, end = int(self.doc_offsets[row]), int(self.doc_offsets[row + 1])
+        self.docs.seek(start)
+        return json.loads(self.docs.read(end - start))
+
+    def search(self, queries, k=TOP_K, nprobe=None):
+        """Top k rows for each query vector: exact when nprobe is None, else over the nprobe nearest lists.
+
+        Returns (scores, rows), each (queries, k); scores are cosine similarities.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        if nprobe is None or nprobe >= len(self.centroids):
+            return exact_search(self.vectors, queries, k)
+        probes = top_k(queries @ self.centroids.T, nprobe)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            starts, ends = self.offsets[probes[i]], self.offsets[probes[i] + 1]
+            candidate_rows = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+            block = np.concatenate([self.vectors[start:end] for start, end in zip(starts, ends)])
+            candidate_scores = np.asarray(block, dtype=np.float32) @ query
+            picked = top_k(candidate_scores[None, :], k)[0]
+            scores[i, :len(picked)] = candidate_scores[picked]
+            rows[i, :len(picked)] = candidate_rows[picked]
+        return scores, rows
+
+
+def load_parquet_rows(directory):
+    """Latest version of every staged row (re-staged ids replaced, deletes applied), in staging order"""
+    from vector_sinks import iter_staged, staged_files, staged_ids
+
+    rows = {}
+    for path in staged_files(directory):
+        if os.path.basename(path).startswith("deletes-"):
+            for row_id in staged_ids(path):
+                rows.pop(row_id, None)
+            continue
+        for batch in iter_staged(path, 10000):
+            for row in batch:
+                rows[row["id"]] = row
+    return list(rows.values())
+
+
+def load_postgres_rows(dsn, table):
+    import psycopg
+
+    with psycopg.connect(dsn) as conn:
+        cursor = conn.execute(f"SELECT id::text, url, content, embedding::text FROM {table}")
+        return [{"id": row_id, "url": url, "content": content,
+                 "embedding": np.array(embedding[1:-1].split(","), dtype=np.float32)}
+                for row_id, url, content, embedding in cursor]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a local vector index of the embedded chunks")
+    parser.add_argument('--index', default=VECTOR_INDEX, help='Index directory')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    build_parser = subparsers.add_parser('build', help='Build the index from staged Parquet files or Postgres')
+    build_parser.add_argument('--parquet', default=None, help='Staging directory (default: embeddings_parquet)')
+    build_parser.add_argument('--dsn', default=None, help='Read the chunks table from this Postgres instead')
+    build_parser.add_argument('--table', default='utmgpt_chunks', help='Chunks table for --dsn')
+    build_parser.add_argument('--dtype', default='float32', choices=['float32', 'float16'])
+    build_parser.add_argument('--lists', type=int, default=None, help='IVF lists (default: about 4*sqrt(rows))')
+    build_parser.add_argument('--model', default=MODEL_NAME, help='Model the vectors came from (used by search)')
+
+    search_parser = subparsers.add_parser('search', help='Embed a question and print the closest chunks')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-k', type=int, default=TOP_K)
+    search_parser.add_argument('--nprobe', type=int, default=NPROBE, help='IVF lists to scan; 0 for exact search')
+
+    subparsers.add_parser('stats', help='Show rows, lists, size and load time')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        if args.dsn:
+            rows = load_postgres_rows(args.dsn, args.table)
+        else:
+            from vector_sinks import PARQUET_DIR
+
+            rows = load_parquet_rows(args.parquet or PARQUET_DIR)
+        if not rows:
+            print("❌ No embedded chunks found")
+            return False
+        loaded = time.perf_counter() - started
+        nlist = build_index(args.index, [row["id"] for row in rows], [row["url"] for row in rows],
+                            [row["content"] for row in rows], np.stack([row["embedding"] for row in rows]),
+                            args.dtype, args.lists, args.model)
+        print(f"✅ Indexed {len(rows)} chunks into {nlist} lists ({args.dtype}) in {args.index}: "
+              f"{loaded:.1f}s loading, {time.perf_counter() - started - loaded:.1f}s building")
+    elif args.command == 'stats':
+        started = time.perf_counter()
+        index = VectorIndex(args.index)
+        opened = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(args.index, f)) for f in os.listdir(args.index))
+        print(f"📊 {len(index)} rows of {index.meta['dim']} {index.meta['dtype']}, {index.meta['lists']} lists, "
+              f"{size / 1e6:.1f} MB, opened in {opened * 1000:.1f} ms (model {index.meta['model']})")
+        index.close()
+    elif args.command == 'search':
+        from embed_backends import load_model
+
+        index = VectorIndex(args.index)
+        query = load_model(index.meta["model"]).encode([args.query], show_progress_bar=False)
+        started = time.perf_counter()
+        scores, rows = index.search(query, args.k, args.nprobe or None)
+        elapsed = time.perf_counter() - started
+        print(f"🔍 Top {args.k} of {len(index)} chunks in {elapsed * 1000:.1f} ms "
+              f"({'exact' if not args.nprobe else f'nprobe {args.nprobe}'})")
+        for score, row in zip(scores[0], rows[0]):
+            if row < 0:
+                continue
+            doc = index.doc(row)
+            print(f"  {score:.3f}  {doc['url']}\n         {doc['content'][:160]}")
+        index.close()
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
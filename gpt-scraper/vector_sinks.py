@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# vector_sinks.py - where embedded chunks go: Supabase REST, Postgres COPY or Parquet files
+
+"""Destinations for embedded chunk rows ({id, content, url, embedding}).
+
+Every sink has the interface of uploader.Uploader, which the pipeline's
+upload threads call concurrently:
+
+- upload(rows) stores a batch and returns False if it could not;
+- delete(ids) removes rows of changed or removed pages, False if it
+  could not;
+- flush() makes everything accepted so far durable (the pipeline calls
+  it before recording pages in the index manifest);
+- close(); plus name, checkpoint_rows (rows between flushes, None for
+  the pipeline's SAVE_EVERY) and failed_rows.
+
+The sinks:
+
+- "supabase": uploader.Uploader, JSON upserts through the REST API.
+- "postgres": straight to the database (DATABASE_URL, e.g. Supabase's
+  own connection string or a local Postgres with pgvector). Each batch
+  is COPYed into a temporary staging table, then upserted into the
+  chunks table in the same transaction, so COPY's speed comes with the
+  same idempotence as the REST upserts. COPY_FORMAT "binary" sends the
+  vectors as raw float32 (pgvector's binary input), "text" as literals.
+  Each upload thread has its own connection; retries and the dead-letter
+  file are Uploader's.
+- "parquet": offline staging. Rows are buffered and each flush() writes
+  one zstd Parquet file under embeddings_parquet/ (written to a
+  temporary name, then renamed, so a file is either complete or absent)
+  with the vectors as fixed-size float32 lists. Deletes are staged the
+  same way, as files of ids.
+
+Staged files are published to either online sink later, rows and deletes
+in the order they were staged:
+
+    python vector_sinks.py stats
+    python vector_sinks.py publish --sink postgres
+    python vector_sinks.py publish --sink supabase --batch-size 50
+
+The postgres sink needs `pip install "psycopg[binary]"`, the parquet
+sink `pip install pyarrow`.
+"""
+
+import argparse
+import glob
+import io
+import os
+import struct
+import sys
+import time
+import uuid
+from threading import Lock, local
+
+import numpy as np
+
+from uploader import CHUNKS_TABLE, MAX_ATTEMPTS, Uploader, dead_letter_file
+
+SINKS = ("supabase", "postgres", "parquet")
+DATABASE_URL_ENV = "DATABASE_URL"  # Postgres connection string for the postgres sink
+COPY_FORMAT = "binary"  # "binary" or "text"
+PARQUET_DIR = "embeddings_parquet"
+ROWS_PER_FILE = 50000  # Parquet rows buffered per file (about 80 MB of 384-dim vectors)
+PUBLISH_BATCH = 500  # Rows per upload when publishing staged files
+
+COLUMNS = ("id", "content", "url", "embedding")
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+
+
+def copy_binary(rows):
+    """COPY ... (FORMAT binary) payload for rows; a pgvector value is dim, 0, then big-endian float32s"""
+    out = io.BytesIO()
+    out.write(PGCOPY_HEADER)
+    for row in rows:
+        content = row["content"].encode("utf-8")
+        url = row["url"].encode("utf-8")
+        vector = np.asarray(row["embedding"], dtype=">f4")
+        out.write(struct.pack(">hi16si", len(COLUMNS), 16, uuid.UUID(row["id"]).bytes, len(content)))
+        out.write(content)
+        out.write(struct.pack(">i", len(url)))
+        out.write(url)
+        out.write(struct.pack(">iHH", 4 + 4 * len(vector), len(vector), 0))
+        out.write(vector.tobytes())
+    out.write(PGCOPY_TRAILER)
+    return out.getvalue()
+
+
+def copy_escape(text):
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_text(rows):
+    """COPY ... (FORMAT text) payload for rows; %.9g keeps float32 values exact"""
+    lines = []
+    for row in rows:
+        vector = ",".join(f"{x:.9g}" for x in np.asarray(row["embedding"], dtype=np.float32).tolist())
+        lines.append(f"{row['id']}\t{copy_escape(row['content'])}\t{copy_escape(row['url'])}\t[{vector}]\n")
+    return "".join(lines).encode("utf-8")
+
+
+class PostgresSink(Uploader):
+    name = "postgres"
+
+    def __init__(self, dsn, dim, table=CHUNKS_TABLE, copy_format=COPY_FORMAT,
+                 dead_letter=None, max_attempts=MAX_ATTEMPTS):
+        import psycopg
+
+        super().__init__(None, table, dead_letter or dead_letter_file(self.name), max_attempts)
+        self.psycopg = psycopg
+        self.dsn = dsn
+        self.copy_format = copy_format
+        self.local = local()
+        self.connections = []
+        if dim is not None:  # None when only deleting, from a table that must already exist
+            with psycopg.connect(dsn, autocommit=True) as conn:
+                conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id uuid PRIMARY KEY, content text, url text, "
+                             f"embedding vector({dim}))")
+
+    def connection(self):
+        """This thread's connection, with its staging table; a broken one is replaced"""
+        conn = getattr(self.local, "conn", None)
+        if conn is None or conn.closed or conn.broken:
+            conn = self.psycopg.connect(self.dsn, autocommit=True)
+            conn.execute(f"CREATE TEMP TABLE staging (LIKE {self.table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def send(self, rows):
+        payload = copy_binary(rows) if self.copy_format == "binary" else copy_text(rows)
+        columns = ", ".join(COLUMNS)
+        conn = self.connection()
+        with conn.transaction():
+            with conn.cursor() as cur:
+                with cur.copy(f"COPY staging ({columns}) FROM STDIN WITH (FORMAT {self.copy_format})") as copy:
+                    copy.write(payload)
+                # DISTINCT ON: ON CONFLICT cannot update the same row twice in one statement
+                cur.execute(f"INSERT INTO {self.table} ({columns}) SELECT DISTINCT ON (id) {columns} FROM staging "
+                            f"ON CONFLICT (id) DO UPDATE SET content = EXCLUDED.content, url = EXCLUDED.url, "
+                            f"embedding = EXCLUDED.embedding")
+
+    def send_delete(self, ids):
+        self.connection().execute(f"DELETE FROM {self.table} WHERE id = ANY(%s::uuid[])", (ids,))
+
+    def close(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections = []
+
+
+class ParquetSink:
+    name = "parquet"
+
+    def __init__(self, dim, directory=PARQUET_DIR, rows_per_file=ROWS_PER_FILE):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.dim = dim
+        self.directory = directory
+        self.checkpoint_rows = rows_per_file
+        self.dead_letter = None
+        self.failed_rows = 0
+        self.lock = Lock()
+        self.buffer = []
+        self.deletes = []
+        self.files = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, rows):
+        with self.lock:
+            self.buffer.extend(rows)
+        return True
+
+    def delete(self, ids):
+        with self.lock:
+            self.deletes.extend(ids)
+        return True
+
+    def write(self, table, kind):
+        """Write a staged file atomically: fsynced under a temporary name, then renamed"""
+        path = os.path.join(self.directory, f"{kind}-{time.time_ns()}.parquet")
+        self.pq.write_table(table, path + ".tmp", compression="zstd")
+        with open(path + ".tmp", "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.files += 1
+
+    def flush(self):
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+            deletes, self.deletes = self.deletes, []
+        if rows:
+            self.write_rows(rows)
+        if deletes:
+            # After the rows: publishing replays files in time order
+            self.write(self.pa.table({"id": deletes}), "deletes")
+
+    def write_rows(self, rows):
+        vectors = np.stack([np.asarray(row["embedding"], dtype=np.float32) for row in rows])
+        table = self.pa.table({
+            "id": [row["id"] for row in rows],
+            "content": [row["content"] for row in rows],
+            "url": [row["url"] for row in rows],
+            "embedding": self.pa.FixedSizeListArray.from_arrays(self.pa.array(vectors.ravel()), self.dim),
+        })
+        self.write(table, "part")
+
+    def close(self):
+        self.flush()
+
+
+def open_sink(name, dim, **kwargs):
+    """Sink by name; Supabase and Postgres credentials come from the environment (.env)"""
+    if name == "supabase":
+        from supabase import create_client
+
+        return Uploader(create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")), **kwargs)
+    if name == "postgres":
+        dsn = os.getenv(DATABASE_URL_ENV)
+        if not dsn:
+            raise ValueError(f"The postgres sink needs {DATABASE_URL_ENV} set to a Postgres connection string")
+        return PostgresSink(dsn, dim, **kwargs)
+    if name == "parquet":
+        return ParquetSink(dim, **kwargs)
+    raise ValueError(f"Unknown sink {name!r} (choose from {', '.join(SINKS)})")
+
+
+def staged_files(directory):
+    """Row (part-) and delete (deletes-) files in the order they were written"""
+    paths = [path for kind in ("part", "deletes") for path in glob.glob(os.path.join(directory, f"{kind}-*.parquet"))]
+    return sorted(paths, key=lambda path: int(os.path.basename(path).split("-")[1].split(".")[0]))
+
+
+def staged_ids(path):
+    import pyarrow.parquet
+
+    return pyarrow.parquet.read_table(path).column("id").to_pylist()
+
+
+def iter_staged(path, batch_size):
+    """Row dicts from one staged file, batch_size at a time"""
+    import pyarrow.parquet
+
+    for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+        dim = batch.schema.field("embedding").type.list_size
+        vectors = batch.column("embedding").flatten().to_numpy().reshape(-1, dim)
+        yield [{"id": id_, "content": content, "url": url, "embedding": vector}
+               for id_, content, url, vector in zip(batch.column("id").to_pylist(), batch.column("content").to_pylist(),
+                                                    batch.column("url").to_pylist(), vectors)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and publish embeddings staged as Parquet files")
+    parser.add_argument('--dir', default=PARQUET_DIR, help='Staging directory')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+    subparsers.add_parser('stats', help='Show staged files, rows and size')
+    publish_parser = subparsers.add_parser('publish', help='Upsert staged rows into an online sink')
+    publish_parser.add_argument('--sink', default='postgres', choices=['supabase', 'postgres'])
+    publish_parser.add_argument('--batch-size', type=int, default=PUBLISH_BATCH, help='Rows per upload')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return False
+
+    import pyarrow.parquet
+
+    files = staged_files(args.dir)
+    if not files:
+        print(f"❌ No staged files in {args.dir}")
+        return False
+    parts = [path for path in files if os.path.basename(path).startswith("part-")]
+    if args.command == 'stats':
+        rows = sum(pyarrow.parquet.ParquetFile(path).metadata.num_rows for path in parts)
+        deletes = sum(pyarrow.parquet.ParquetFile(path).metadata.num_rows for path in files if path not in parts)
+        size = sum(os.path.getsize(path) for path in files)
+        print(f"📊 {len(files)} files, {rows} rows, {deletes} deletes, {size / 1e6:.1f} MB in {args.dir}")
+    elif args.command == 'publish':
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        # Without staged rows there is no dimension, and no table to create: only deletes are sent
+        dim = pyarrow.parquet.ParquetFile(parts[0]).schema_arrow.field("embedding").type.list_size if parts else None
+        sink = open_sink(args.sink, dim)
+        started = time.perf_counter()
+        published = deleted = 0
+        for path in files:
+            if path not in parts:
+                ids = staged_ids(path)
+                if not sink.delete(ids):
+                    print(f"❌ Deletes in {os.path.basename(path)} failed; stopping so later files stay in order")
+                    sink.close()
+                    return False
+                deleted += len(ids)
+                continue
+            for rows in iter_staged(path, args.batch_size):
+                published += len(rows) if sink.upload(rows) else 0
+            print(f"⬆️ {os.path.basename(path)}: {published} rows published")
+        sink.close()
+        elapsed = time.perf_counter() - started
+        print(f"✅ Published {published} rows and {deleted} deletes to {args.sink} in {elapsed:.0f}s "
+              f"({published / max(elapsed, 1e-9):.0f} rows/sec)")
+        if sink.failed_rows:
+            print(f"⚠️ {sink.failed_rows} rows saved to {sink.dead_letter}; "
+                  f"python uploader.py --sink {args.sink} replay re-sends them")
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)